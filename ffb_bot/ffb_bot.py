@@ -1,13 +1,178 @@
-import requests
+import contextvars
+import gzip
+import hashlib
+import hmac
+import importlib
 import json
 import os
+import pickle
 import random
+import socket
+import sqlite3
+import sys
+import threading
+import time
 import logging
-from apscheduler.schedulers.blocking import BlockingScheduler
-from espn_api.football import League
+import uuid
+import zlib
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+#the standard library above is already loaded or cheap, the cold start clock covers everything heavier
+IMPORT_STARTED_AT = time.time()
 
 logging.basicConfig()
 logging.getLogger('apscheduler').setLevel(logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+class LazyModule(object):
+    #Stands in for a heavy module and imports it the first time one of its attributes is used
+    def __init__(self, name):
+        self.name = name
+        self.module = None
+
+    def __repr__(self):
+        return "LazyModule(%s)" % self.name
+
+    def __getattr__(self, attr):
+        if self.module is None:
+            self.module = importlib.import_module(self.name)
+        return getattr(self.module, attr)
+
+requests = LazyModule('requests')
+asyncio = LazyModule('asyncio')
+np = LazyModule('numpy')
+
+def League(*args, **kwargs):
+    #espn_api is only imported once a league is actually built, base_url sends its requests
+    #somewhere other than ESPN, e.g. a local stub
+    from espn_api.football import League
+    base_url = kwargs.pop('base_url', None)
+    if base_url is None:
+        return League(*args, **kwargs)
+    fetch_league = kwargs.pop('fetch_league', True)
+    league = League(*args, fetch_league=False, **kwargs)
+    league.espn_request.ENDPOINT = '%s/seasons/%s' % (base_url, league.year)
+    league.espn_request.LEAGUE_ENDPOINT = '%s/seasons/%s/segments/0/leagues/%s' % (base_url, league.year,
+                                                                                   league.league_id)
+    if fetch_league:
+        league.fetch_league()
+    return league
+
+startup_metrics = {}
+
+HISTOGRAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900)
+
+class Metrics(object):
+    #Counters and histograms rendered in the Prometheus text format
+    def __init__(self, buckets=HISTOGRAM_BUCKETS):
+        self.buckets = buckets
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "Metrics(%s series)" % (len(self.counters) + len(self.histograms) + len(self.gauges))
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            counts, total, count = self.histograms.get(key, ([0] * len(self.buckets), 0, 0))
+            counts = [c + 1 if value <= bucket else c for c, bucket in zip(counts, self.buckets)]
+            self.histograms[key] = (counts, total + value, count + 1)
+
+    @staticmethod
+    def format_labels(labels, extra=()):
+        labels = list(labels) + list(extra)
+        if not labels:
+            return ''
+        return '{%s}' % ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                                 for k, v in labels)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for kind, series in (('counter', self.counters), ('gauge', self.gauges)):
+                for name in sorted({name for name, labels in series}):
+                    lines.append('# TYPE %s %s' % (name, kind))
+                    for (series_name, labels), value in sorted(series.items()):
+                        if series_name == name:
+                            lines.append('%s%s %s' % (name, self.format_labels(labels), value))
+            for name in sorted({name for name, labels in self.histograms}):
+                lines.append('# TYPE %s histogram' % name)
+                for (series_name, labels), (counts, total, count) in sorted(self.histograms.items()):
+                    if series_name != name:
+                        continue
+                    for bucket, c in zip(self.buckets, counts):
+                        lines.append('%s_bucket%s %s' % (name, self.format_labels(labels, [('le', bucket)]), c))
+                    lines.append('%s_bucket%s %s' % (name, self.format_labels(labels, [('le', '+Inf')]), count))
+                    lines.append('%s_sum%s %s' % (name, self.format_labels(labels), total))
+                    lines.append('%s_count%s %s' % (name, self.format_labels(labels), count))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+metrics = Metrics()
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def serve_metrics(port, host='127.0.0.1'):
+    #Serves /metrics from a daemon thread
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
+
+trace_logger = logging.getLogger(__name__ + '.trace')
+current_span = contextvars.ContextVar('current_span', default=None)
+
+@contextmanager
+def span(name, **attrs):
+    #Times a block as a trace span, nested spans share the trace id of the job that opened them
+    parent = current_span.get()
+    record = {'name': name, 'trace_id': parent['trace_id'] if parent else uuid.uuid4().hex,
+              'span_id': uuid.uuid4().hex[:16], 'parent_id': parent['span_id'] if parent else None,
+              'start': time.time(), 'status': 'ok', 'attrs': attrs}
+    token = current_span.set(record)
+    try:
+        yield record
+    except Exception as e:
+        record['status'] = type(e).__name__
+        raise
+    finally:
+        current_span.reset(token)
+        record['duration'] = time.time() - record['start']
+        trace_logger.info(json.dumps(record, default=str))
 
 class GroupMeException(Exception):
     pass
@@ -18,84 +183,1068 @@ class SlackException(Exception):
 class DiscordException(Exception):
     pass
 
+class CircuitOpenException(Exception):
+    pass
+
+class WeekCache(object):
+    #Stores finished weeks' scores on disk so they are only fetched from ESPN once
+    def __init__(self, path, league_id, year):
+        self.path = path
+        self.league_id = str(league_id)
+        self.year = int(year)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS weeks ('
+                          'league_id TEXT, year INTEGER, week INTEGER, '
+                          'matchups TEXT, '
+                          'PRIMARY KEY (league_id, year, week))')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS teams ('
+                          'league_id TEXT, year INTEGER, team_id INTEGER, team_name TEXT, '
+                          'PRIMARY KEY (league_id, year, team_id))')
+        self.conn.commit()
+
+    def __repr__(self):
+        return "WeekCache(%s, %s, %s)" % (self.path, self.league_id, self.year)
+
+    def put_teams(self, teams):
+        #Remembers the season's team names so history can be shown without the League
+        self.conn.executemany('INSERT OR REPLACE INTO teams VALUES (?, ?, ?, ?)',
+                              [(self.league_id, self.year, t.team_id, t.team_name) for t in teams])
+        self.conn.commit()
+
+    def get(self, week):
+        #Returns the matchups of a cached week or None
+        row = self.conn.execute('SELECT matchups FROM weeks '
+                                'WHERE league_id=? AND year=? AND week=?',
+                                (self.league_id, self.year, week)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def put(self, week, matchups):
+        #matchups are [home_id, home_score, away_id, away_score] rows
+        # caches written before top half wins came from SeasonStore have a nullable top_half column too
+        self.conn.execute('INSERT OR REPLACE INTO weeks (league_id, year, week, matchups) VALUES (?, ?, ?, ?)',
+                          (self.league_id, self.year, week, json.dumps(matchups, separators=(',', ':'))))
+        self.conn.commit()
+
+    def invalidate(self, week=None):
+        #Drops one week, or the whole season, e.g. after ESPN stat corrections
+        if week is None:
+            self.conn.execute('DELETE FROM weeks WHERE league_id=? AND year=?',
+                              (self.league_id, self.year))
+        else:
+            self.conn.execute('DELETE FROM weeks WHERE league_id=? AND year=? AND week=?',
+                              (self.league_id, self.year, week))
+        self.conn.commit()
+
+class RenderStore(object):
+    #Content addressed store of rendered messages, a week's artifacts are built once and posted from here
+    def __init__(self, path, league_id, year):
+        self.path = path
+        self.league_id = str(league_id)
+        self.year = int(year)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS artifacts (digest TEXT PRIMARY KEY, text TEXT)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS renders ('
+                          'league_id TEXT, year INTEGER, week INTEGER, name TEXT, '
+                          'digest TEXT, rendered_at REAL, '
+                          'PRIMARY KEY (league_id, year, week, name))')
+        self.conn.commit()
+
+    def __repr__(self):
+        return "RenderStore(%s, %s, %s)" % (self.path, self.league_id, self.year)
+
+    def get(self, week, name):
+        #Returns an artifact's text or None
+        row = self.conn.execute('SELECT text FROM renders JOIN artifacts USING (digest) '
+                                'WHERE league_id=? AND year=? AND week=? AND name=?',
+                                (self.league_id, self.year, week, name)).fetchone()
+        return row[0] if row else None
+
+    def put(self, week, artifacts):
+        #Stores {name: text} for a week and returns {name: digest}, identical text is only stored once
+        digests = {name: hashlib.sha256(text.encode('utf-8')).hexdigest() for name, text in artifacts.items()}
+        now = time.time()
+        self.conn.executemany('INSERT OR IGNORE INTO artifacts VALUES (?, ?)',
+                              [(digests[name], text) for name, text in artifacts.items()])
+        self.conn.executemany('INSERT OR REPLACE INTO renders VALUES (?, ?, ?, ?, ?, ?)',
+                              [(self.league_id, self.year, week, name, digest, now)
+                               for name, digest in digests.items()])
+        self.conn.commit()
+        return digests
+
+    def invalidate(self, week=None):
+        if week is None:
+            self.conn.execute('DELETE FROM renders WHERE league_id=? AND year=?',
+                              (self.league_id, self.year))
+        else:
+            self.conn.execute('DELETE FROM renders WHERE league_id=? AND year=? AND week=?',
+                              (self.league_id, self.year, week))
+        self.conn.execute('DELETE FROM artifacts WHERE digest NOT IN (SELECT digest FROM renders)')
+        self.conn.commit()
+
+class ActivityStore(object):
+    #High-water mark of the league's posted transactions: the newest topic date and the topic ids at that date
+    def __init__(self, path, league_id, year):
+        self.path = path
+        self.league_id = str(league_id)
+        self.year = int(year)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS activity ('
+                          'league_id TEXT, year INTEGER, date INTEGER, topic_ids TEXT, '
+                          'PRIMARY KEY (league_id, year))')
+        self.conn.commit()
+
+    def __repr__(self):
+        return "ActivityStore(%s, %s, %s)" % (self.path, self.league_id, self.year)
+
+    def get(self):
+        #Returns (date, topic_ids) or None before the first poll
+        row = self.conn.execute('SELECT date, topic_ids FROM activity WHERE league_id=? AND year=?',
+                                (self.league_id, self.year)).fetchone()
+        if row is None:
+            return None
+        return row[0], set(json.loads(row[1]))
+
+    def advance(self, topics):
+        #Moves the mark past topics, topics at the same millisecond as the old mark are added to it
+        cursor = self.get()
+        date = max((t['date'] for t in topics), default=0)
+        topic_ids = {t['id'] for t in topics if t['date'] == date}
+        if cursor is not None:
+            if cursor[0] > date:
+                return
+            if cursor[0] == date:
+                topic_ids |= cursor[1]
+        self.conn.execute('INSERT OR REPLACE INTO activity VALUES (?, ?, ?, ?)',
+                          (self.league_id, self.year, date, json.dumps(sorted(topic_ids))))
+        self.conn.commit()
+
+SNAPSHOT_MAGIC = b'FFBS1'
+
+class PlayerSnapshot(object):
+    #The lineup fields the builders read, without espn_api's stats dicts
+    __slots__ = ('playerId', 'name', 'slot_position', 'points', 'projected_points', 'game_played')
+
+    def __init__(self, playerId, name, slot_position, points, projected_points, game_played):
+        self.playerId = playerId
+        self.name = name
+        self.slot_position = slot_position
+        self.points = points
+        self.projected_points = projected_points
+        self.game_played = game_played
+
+    def __repr__(self):
+        return "PlayerSnapshot(%s, %s)" % (self.name, self.points)
+
+    @classmethod
+    def from_player(cls, player):
+        return cls(getattr(player, 'playerId', None), player.name, player.slot_position, player.points,
+                   player.projected_points, player.game_played)
+
+class TeamSnapshot(object):
+    #The team fields the builders read, schedule holds the opponents' TeamSnapshots
+    __slots__ = ('team_id', 'team_name', 'team_abbrev', 'wins', 'losses', 'streak_length', 'streak_type',
+                 'scores', 'mov', 'schedule')
+
+    def __init__(self, team_id, team_name, team_abbrev, wins, losses, streak_length, streak_type,
+                 scores, mov, schedule=None):
+        self.team_id = team_id
+        self.team_name = team_name
+        self.team_abbrev = team_abbrev
+        self.wins = wins
+        self.losses = losses
+        self.streak_length = streak_length
+        self.streak_type = streak_type
+        self.scores = tuple(scores)
+        self.mov = tuple(mov)
+        self.schedule = schedule or []
+
+    def __repr__(self):
+        return "TeamSnapshot(%s)" % self.team_name
+
+    @classmethod
+    def from_team(cls, team):
+        return cls(team.team_id, team.team_name, team.team_abbrev, team.wins, team.losses,
+                   team.streak_length, team.streak_type, team.scores, team.mov)
+
+    def to_tuple(self):
+        return (self.team_id, self.team_name, self.team_abbrev, self.wins, self.losses, self.streak_length,
+                self.streak_type, self.scores, self.mov, [opponent.team_id for opponent in self.schedule])
+
+class BoxScoreSnapshot(object):
+    #One matchup's scores and lineups, away_team is falsy on a bye like espn_api's
+    __slots__ = ('home_team', 'home_score', 'away_team', 'away_score', 'home_lineup', 'away_lineup')
+
+    def __init__(self, home_team, home_score, away_team, away_score, home_lineup=(), away_lineup=()):
+        self.home_team = home_team
+        self.home_score = home_score
+        self.away_team = away_team
+        self.away_score = away_score
+        self.home_lineup = home_lineup
+        self.away_lineup = away_lineup
+
+    def __repr__(self):
+        return "BoxScoreSnapshot(%s %s - %s %s)" % (getattr(self.home_team, 'team_abbrev', None), self.home_score,
+                                                    self.away_score, getattr(self.away_team, 'team_abbrev', None))
+
+    @classmethod
+    def from_box_score(cls, box_score, teams):
+        #teams maps team_id to TeamSnapshot, espn_api leaves a bare team id when it can't match one
+        def team(t):
+            return teams[t if isinstance(t, int) else t.team_id] if t else t
+        return cls(team(box_score.home_team), box_score.home_score, team(box_score.away_team), box_score.away_score,
+                   [PlayerSnapshot.from_player(p) for p in box_score.home_lineup],
+                   [PlayerSnapshot.from_player(p) for p in box_score.away_lineup])
+
+class SettingsSnapshot(object):
+    __slots__ = ('reg_season_count', 'playoff_team_count', 'matchup_periods')
+
+    def __init__(self, reg_season_count, playoff_team_count, matchup_periods=None):
+        self.reg_season_count = reg_season_count
+        self.playoff_team_count = playoff_team_count
+        self.matchup_periods = matchup_periods or {}
+
+    def __repr__(self):
+        return "SettingsSnapshot(%s, %s)" % (self.reg_season_count, self.playoff_team_count)
+
+class LeagueSnapshot(object):
+    #What the builders need from an espn_api League, converted once. The League itself is only kept,
+    #with its teams, draft, members and player map dropped, as a handle for fetching box scores and refreshing
+    __slots__ = ('league_id', 'year', 'current_week', 'current_matchup_period', 'settings', 'teams',
+                 'espn_s2', 'swid', 'base_url', 'espn_league')
+
+    def __init__(self, league_id, year, current_week, current_matchup_period, settings, teams,
+                 espn_s2=None, swid=None, base_url=None, espn_league=None):
+        self.league_id = league_id
+        self.year = year
+        self.current_week = current_week
+        self.current_matchup_period = current_matchup_period
+        self.settings = settings
+        self.teams = teams
+        self.espn_s2 = espn_s2
+        self.swid = swid
+        self.base_url = base_url
+        self.espn_league = espn_league
+
+    def __repr__(self):
+        return "LeagueSnapshot(%s, %s)" % (self.league_id, self.year)
+
+    def __getattr__(self, name):
+        #anything the snapshot doesn't keep, e.g. the settings espn_api's box_scores reads, comes from the League
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.get_espn_league(), name)
+
+    @classmethod
+    def from_league(cls, league, espn_s2=None, swid=None, base_url=None):
+        teams = [TeamSnapshot.from_team(t) for t in league.teams]
+        team_map = {t.team_id: t for t in teams}
+        for team, snapshot in zip(league.teams, teams):
+            snapshot.schedule = [team_map[getattr(opponent, 'team_id', opponent)] for opponent in team.schedule]
+        settings = SettingsSnapshot(league.settings.reg_season_count, league.settings.playoff_team_count,
+                                    dict(getattr(league.settings, 'matchup_periods', {})))
+        snapshot = cls(getattr(league, 'league_id', None), getattr(league, 'year', None),
+                       league.current_week, getattr(league, 'currentMatchupPeriod', league.current_week),
+                       settings, teams, espn_s2=espn_s2, swid=swid, base_url=base_url, espn_league=league)
+        snapshot.prune()
+        return snapshot
+
+    def prune(self):
+        #box_scores matches teams by id against league.teams, hand it the snapshots instead of full rosters.
+        #No builder reads members or the player universe, activity looks up only the names it posts
+        self.espn_league.teams = self.teams
+        self.espn_league.draft = []
+        self.espn_league.members = []
+        self.espn_league.player_map = {}
+
+    def get_espn_league(self):
+        #A snapshot loaded from disk gets a League that is never fetched, it is only used to make requests
+        if self.espn_league is None:
+            kwargs = {'base_url': self.base_url} if self.base_url else {}
+            if self.espn_s2 and self.swid:
+                league = League(league_id=self.league_id, year=self.year, espn_s2=self.espn_s2, swid=self.swid,
+                                fetch_league=False, **kwargs)
+            else:
+                league = League(league_id=self.league_id, year=self.year, fetch_league=False, **kwargs)
+            league.currentMatchupPeriod = self.current_matchup_period
+            league.current_week = self.current_week
+            league.settings = self.settings
+            self.espn_league = league
+            self.prune()
+        return self.espn_league
+
+    def box_scores(self, week=None):
+        teams = {t.team_id: t for t in self.teams}
+        return [BoxScoreSnapshot.from_box_score(box_score, teams)
+                for box_score in self.get_espn_league().box_scores(week=week)]
+
+    def scoreboard(self, week=None):
+        #Team scores without lineups, the only view espn_api has of seasons before 2019
+        teams = {t.team_id: t for t in self.teams}
+        return [BoxScoreSnapshot(teams.get(m._home_team_id), m.home_score, teams.get(m._away_team_id), m.away_score)
+                for m in self.get_espn_league().scoreboard(week=week)]
+
+    def refresh(self):
+        league = self.get_espn_league()
+        league.refresh()
+        snapshot = LeagueSnapshot.from_league(league, espn_s2=self.espn_s2, swid=self.swid, base_url=self.base_url)
+        for name in self.__slots__:
+            setattr(self, name, getattr(snapshot, name))
+
+    def to_bytes(self):
+        #Compressed json of plain tuples, the League handle isn't saved
+        data = [self.league_id, self.year, self.current_week, self.current_matchup_period,
+                [self.settings.reg_season_count, self.settings.playoff_team_count, self.settings.matchup_periods],
+                [t.to_tuple() for t in self.teams]]
+        return SNAPSHOT_MAGIC + zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+
+    @classmethod
+    def from_bytes(cls, data, espn_s2=None, swid=None, base_url=None):
+        if not data.startswith(SNAPSHOT_MAGIC):
+            raise ValueError('Not a league snapshot')
+        league_id, year, current_week, current_matchup_period, settings, teams = json.loads(
+            zlib.decompress(data[len(SNAPSHOT_MAGIC):]))
+        snapshots = [TeamSnapshot(*t[:-1]) for t in teams]
+        team_map = {t.team_id: t for t in snapshots}
+        for team, snapshot in zip(teams, snapshots):
+            snapshot.schedule = [team_map[team_id] for team_id in team[-1]]
+        return cls(league_id, year, current_week, current_matchup_period, SettingsSnapshot(*settings), snapshots,
+                   espn_s2=espn_s2, swid=swid, base_url=base_url)
+
+class LeagueContext(object):
+    #Keeps one LeagueSnapshot around between jobs and refreshes it once it is older than ttl seconds
+    def __init__(self, league_id, year, espn_s2=None, swid=None, ttl=900, snapshot_path=None, base_url=None):
+        self.league_id = league_id
+        self.year = year
+        self.espn_s2 = espn_s2
+        self.swid = swid
+        self.base_url = base_url
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        self.league = None
+        self.fetched_at = 0
+        self.score_watcher = ScoreWatcher(league=(str(league_id), int(year)), index=player_index)
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "LeagueContext(%s, %s)" % (self.league_id, self.year)
+
+    def load_snapshot(self):
+        #Loads the LeagueSnapshot saved by a previous process, it counts as fetched when the file was written
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                self.league = LeagueSnapshot.from_bytes(f.read(), espn_s2=self.espn_s2, swid=self.swid,
+                                                        base_url=self.base_url)
+            self.fetched_at = os.path.getmtime(self.snapshot_path)
+        except (OSError, ValueError, zlib.error) as e:
+            logger.warning('Could not load league snapshot %s: %s', self.snapshot_path, e)
+            self.league = None
+
+    def save_snapshot(self):
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self.league.to_bytes())
+        os.replace(tmp_path, self.snapshot_path)
+
+    def cached_league(self, max_age=None):
+        #The league as last fetched or saved by a previous process, None rather than going to ESPN.
+        #With max_age a league fetched longer ago than that counts as not cached
+        with self.lock:
+            if self.league is None and self.snapshot_path and os.path.exists(self.snapshot_path):
+                self.load_snapshot()
+            if max_age is not None and time.time() - self.fetched_at > max_age:
+                return None
+            return self.league
+
+    def get_league(self):
+        with self.lock:
+            if self.league is None and self.snapshot_path and os.path.exists(self.snapshot_path):
+                self.load_snapshot()
+            if self.league is None:
+                kwargs = {'base_url': self.base_url} if self.base_url else {}
+                if self.espn_s2 and self.swid:
+                    league = espn_call(League, league_id=self.league_id, year=self.year,
+                                       espn_s2=self.espn_s2, swid=self.swid, **kwargs)
+                else:
+                    league = espn_call(League, league_id=self.league_id, year=self.year, **kwargs)
+                self.league = LeagueSnapshot.from_league(league, espn_s2=self.espn_s2, swid=self.swid,
+                                                         base_url=self.base_url)
+                self.fetched_at = time.time()
+            elif time.time() - self.fetched_at > self.ttl:
+                # refresh skips the player and draft fetches a full build does
+                espn_call(self.league.refresh)
+                self.fetched_at = time.time()
+            else:
+                return self.league
+            if self.snapshot_path:
+                self.save_snapshot()
+            return self.league
+
+class BoxScoreMemo(object):
+    #Wraps a League for one job so each week's box scores hit ESPN at most once
+    def __init__(self, league, fetcher=None):
+        self.league = league
+        self.fetcher = fetcher
+        self.box_score_weeks = {}
+        self.score_weeks = {}
+        self.fetch_count = 0
+
+    def __repr__(self):
+        return "BoxScoreMemo(%s)" % self.league
+
+    def __getattr__(self, name):
+        return getattr(self.league, name)
+
+    def box_scores(self, week=None):
+        if not week:
+            week = self.league.current_week
+        if week not in self.box_score_weeks:
+            self.fetch_count += 1
+            self.box_score_weeks[week] = espn_call(self.league.box_scores, week=week)
+        return self.box_score_weeks[week]
+
+    def scores(self, week=None):
+        #Team scores only: full box scores already fetched this job, else the fetcher's scores view
+        if not week:
+            week = self.league.current_week
+        if week in self.box_score_weeks or self.fetcher is None:
+            return self.box_scores(week)
+        if week not in self.score_weeks:
+            self.fetch_count += 1
+            self.score_weeks[week] = self.fetcher.scores(week, self.league)
+        return self.score_weeks[week]
+
+def get_scores(league, week=None):
+    #Box scores for builders that only read team scores, the League may have a cheaper scores view
+    scores = getattr(league, 'scores', None)
+    if scores is None:
+        return league.box_scores(week=week)
+    return scores(week=week)
+
+league_contexts = {}
+league_contexts_lock = threading.Lock()
+
+def get_league_context(league_id, year, espn_s2=None, swid=None, ttl=900, snapshot_path=None, base_url=None):
+    #Returns the process-wide LeagueContext so scheduled jobs share one snapshot
+    key = (str(league_id), int(year), espn_s2, swid, base_url)
+    with league_contexts_lock:
+        if key not in league_contexts:
+            league_contexts[key] = LeagueContext(league_id, year, espn_s2=espn_s2, swid=swid, ttl=ttl,
+                                                 snapshot_path=snapshot_path, base_url=base_url)
+        context = league_contexts[key]
+        context.ttl = ttl
+        return context
+
+http_sessions = {}
+http_sessions_lock = threading.Lock()
+
+def get_http_session(name='default'):
+    #Returns a shared keep-alive session so sends reuse pooled connections
+    with http_sessions_lock:
+        if name not in http_sessions:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            http_sessions[name] = session
+        return http_sessions[name]
+
+class TokenBucket(object):
+    #Allows rate requests per second on average with bursts of up to capacity
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, sleep=time.sleep):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            sleep(wait)
+
+class CircuitBreaker(object):
+    #Stops calling a host after failure_threshold straight failures, lets one call through after reset_timeout
+    def __init__(self, failure_threshold=5, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # half open, the next result decides whether it closes again
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+class HttpClient(object):
+    #Sends requests with retries, exponential backoff with jitter, Retry-After,
+    #per host rate limiting and a per host circuit breaker
+    def __init__(self, session=None, retries=3, backoff=0.5, max_backoff=30, rate=5, burst=5,
+                 failure_threshold=5, reset_timeout=60, sleep=time.sleep):
+        self.session = session or get_http_session()
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.rate = rate
+        self.burst = burst
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.sleep = sleep
+        self.buckets = {}
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "HttpClient(%s retries)" % self.retries
+
+    def host_state(self, host):
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.rate, self.burst)
+                self.breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self.buckets[host], self.breakers[host]
+
+    def get_delay(self, attempt, retry_after=None):
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    delay = None
+            if delay is not None:
+                return min(max(delay, 0), self.max_backoff)
+        # full jitter
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def call(self, host, func, *args, retry_on=None, **kwargs):
+        #Runs func(*args, **kwargs) under host's rate limit and breaker, retrying exceptions in retry_on
+        if retry_on is None:
+            retry_on = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+        bucket, breaker = self.host_state(host)
+        for attempt in range(self.retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenException(host)
+            bucket.acquire(self.sleep)
+            try:
+                result = func(*args, **kwargs)
+            except retry_on as e:
+                breaker.record_failure()
+                if attempt == self.retries:
+                    raise
+                logger.warning('%s failed (%s), retrying', host, e)
+                self.sleep(self.get_delay(attempt))
+                continue
+            breaker.record_success()
+            return result
+
+    def request(self, method, url, **kwargs):
+        host = urlparse(url).netloc
+        bucket, breaker = self.host_state(host)
+        for attempt in range(self.retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenException(host)
+            bucket.acquire(self.sleep)
+            try:
+                r = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                breaker.record_failure()
+                if attempt == self.retries:
+                    raise
+                self.sleep(self.get_delay(attempt))
+                continue
+            if r.status_code not in RETRY_STATUS_CODES:
+                breaker.record_success()
+                return r
+            # a 429 means we are being throttled, not that the host is down
+            if r.status_code != 429:
+                breaker.record_failure()
+            if attempt == self.retries:
+                return r
+            logger.warning('%s returned %s, retrying', host, r.status_code)
+            self.sleep(self.get_delay(attempt, r.headers.get('Retry-After')))
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+http_clients = {}
+http_clients_lock = threading.Lock()
+
+def get_http_client(name='default'):
+    #Returns a shared HttpClient so rate limits and breakers apply across jobs and leagues
+    with http_clients_lock:
+        if name not in http_clients:
+            http_clients[name] = HttpClient(session=get_http_session(name))
+        return http_clients[name]
+
+ESPN_BASE_URL = 'https://lm-api-reads.fantasy.espn.com/apis/v3/games/ffl'
+
+#espn_call keyword arguments a span may record, the rest (espn_s2, swid) are private session cookies
+ESPN_SPAN_ATTRS = ('league_id', 'year', 'week')
+
+def espn_call(func, *args, **kwargs):
+    #Runs an espn_api fetch through the shared client's ESPN rate limit, retries and breaker. They are keyed
+    #by the host of the base url the League talks to, the same key EspnFetcher's requests get
+    from espn_api.requests.espn_requests import ESPNUnknownError
+    call = getattr(func, '__name__', repr(func))
+    base_url = kwargs.get('base_url') or getattr(getattr(func, '__self__', None), 'base_url', None)
+    host = urlparse(base_url or ESPN_BASE_URL).netloc
+    start = time.time()
+    status = 'ok'
+    try:
+        with span('espn.' + call, **{key: kwargs[key] for key in ESPN_SPAN_ATTRS if key in kwargs}):
+            return get_http_client('espn').call(host, func, *args,
+                                                retry_on=(requests.exceptions.ConnectionError,
+                                                          requests.exceptions.Timeout, ESPNUnknownError),
+                                                **kwargs)
+    except Exception as e:
+        status = type(e).__name__
+        raise
+    finally:
+        metrics.inc('ffb_bot_espn_requests_total', call=call, status=status)
+        metrics.observe('ffb_bot_espn_request_seconds', time.time() - start, call=call)
+
+class ResponseCache(object):
+    #ESPN responses on disk with their ETag/Last-Modified so a fetch can be a cheap revalidation
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute('CREATE TABLE IF NOT EXISTS responses ('
+                          'key TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body BLOB, fetched_at REAL)')
+        self.conn.commit()
+
+    def __repr__(self):
+        return "ResponseCache(%s)" % self.path
+
+    def get(self, key):
+        #Returns (etag, last_modified, body) or None
+        with self.lock:
+            row = self.conn.execute('SELECT etag, last_modified, body FROM responses WHERE key=?',
+                                    (key,)).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], gzip.decompress(row[2])
+
+    def put(self, key, etag, last_modified, body):
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                              (key, etag, last_modified, gzip.compress(body), time.time()))
+            self.conn.commit()
+
+#messageTypeId of the transactions in the activity feed, as espn_api's ACTIVITY_MAP
+ACTIVITY_ACTIONS = {178: 'added', 180: 'claimed', 179: 'dropped', 181: 'dropped', 239: 'dropped', 244: 'traded'}
+
+class EspnFetcher(object):
+    #Reads ESPN views directly for callers that only need part of a box score. Responses are
+    #gzipped on the wire, cached on disk and revalidated with If-None-Match/If-Modified-Since
+    def __init__(self, league_id, year, espn_s2=None, swid=None, base_url=ESPN_BASE_URL, cache=None, client=None,
+                 timeout=30):
+        self.league_id = league_id
+        self.year = int(year)
+        self.cookies = {'espn_s2': espn_s2, 'SWID': swid} if espn_s2 and swid else None
+        self.base_url = base_url
+        self.cache = cache
+        self.client = client or get_http_client('espn')
+        self.timeout = timeout
+
+    def __repr__(self):
+        return "EspnFetcher(%s, %s)" % (self.league_id, self.year)
+
+    def get(self, params, filters=None, extend=''):
+        url = '%s/seasons/%s/segments/0/leagues/%s%s' % (self.base_url, self.year, self.league_id, extend)
+        headers = {'Accept-Encoding': 'gzip'}
+        if filters:
+            headers['x-fantasy-filter'] = json.dumps(filters, sort_keys=True)
+        key = '%s?%s %s' % (url, urlencode(params, doseq=True), headers.get('x-fantasy-filter', ''))
+        cached = self.cache.get(key) if self.cache else None
+        if cached:
+            etag, last_modified, body = cached
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+        start = time.time()
+        status = 'error'
+        try:
+            with span('espn.get', view=','.join(params.get('view', []))):
+                r = self.client.get(url, params=params, headers=headers, cookies=self.cookies, timeout=self.timeout)
+            status = r.status_code
+            if r.status_code == 304 and cached:
+                return json.loads(cached[2])
+            r.raise_for_status()
+            metrics.inc('ffb_bot_espn_response_bytes_total', len(r.content))
+            if self.cache and (r.headers.get('ETag') or r.headers.get('Last-Modified')):
+                self.cache.put(key, r.headers.get('ETag'), r.headers.get('Last-Modified'), r.content)
+            return r.json()
+        finally:
+            metrics.inc('ffb_bot_espn_requests_total', call='get', status=status)
+            metrics.observe('ffb_bot_espn_request_seconds', time.time() - start, call='get')
+
+    def activity(self, cursor=None, page_size=25, max_pages=4):
+        #Returns the transaction topics newer than cursor, newest first. The next page is only read
+        #while every topic on a page is new, so a poll costs one request however long the season is
+        date, seen = cursor or (0, ())
+        topics = []
+        for page in range(max_pages):
+            filters = {'topics': {'filterType': {'value': ['ACTIVITY_TRANSACTIONS']},
+                                  'limit': page_size, 'limitPerMessageSet': {'value': page_size},
+                                  'offset': page * page_size,
+                                  'sortMessageDate': {'sortPriority': 1, 'sortAsc': False},
+                                  'sortFor': {'sortPriority': 2, 'sortAsc': False},
+                                  'filterIncludeMessageTypeIds': {'value': sorted(ACTIVITY_ACTIONS)}}}
+            data = self.get({'view': ['kona_league_communication']}, filters, extend='/communication/')
+            page_topics = data.get('topics', [])
+            new = [t for t in page_topics if t['date'] > date or (t['date'] == date and t['id'] not in seen)]
+            topics += new
+            # the first poll only needs the newest topic to set the high-water mark
+            if cursor is None or len(new) < len(page_topics) or len(page_topics) < page_size:
+                break
+        return topics
+
+    def player_names(self, player_ids):
+        #Returns {player id: full name} for just these players instead of the whole player universe
+        data = self.get({'view': ['kona_player_info']}, {'players': {'filterIds': {'value': sorted(player_ids)}}})
+        return {p['id']: p['player']['fullName'] for p in data.get('players', []) if 'player' in p}
+
+    def scores(self, week, league):
+        #Returns a week's BoxScoreSnapshots from the scores only view, no lineups, pro schedule or rankings
+        matchup_period = week
+        for period, weeks in getattr(league.settings, 'matchup_periods', {}).items():
+            if week in weeks:
+                matchup_period = int(period)
+                break
+        data = self.get({'view': ['mMatchupScore', 'mLiveScoring'], 'scoringPeriodId': week},
+                        {'schedule': {'filterMatchupPeriodIds': {'value': [matchup_period]}}})
+        teams = {t.team_id: t for t in league.teams}
+
+        def score(side):
+            return round(side.get('totalPointsLive', side.get('totalPoints', 0)), 2)
+        return [BoxScoreSnapshot(teams[m['home']['teamId']], score(m['home']),
+                                 teams[m['away']['teamId']] if 'away' in m else None,
+                                 score(m['away']) if 'away' in m else 0)
+                for m in data.get('schedule', []) if m.get('matchupPeriodId', matchup_period) == matchup_period]
+
+def split_message(text, limit):
+    #Splits text into chunks of at most limit characters, breaking between lines where it can
+    chunks = []
+    chunk = ''
+    for line in text.split('\n'):
+        while len(line) > limit:
+            if chunk.strip('\n'):
+                chunks.append(chunk.strip('\n'))
+            chunk = ''
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if chunk and len(chunk) + 1 + len(line) > limit:
+            chunks.append(chunk.strip('\n'))
+            chunk = line
+        else:
+            chunk = chunk + '\n' + line if chunk else line
+    if chunk.strip('\n'):
+        chunks.append(chunk.strip('\n'))
+    return chunks or [text]
+
+GROUPME_POST_URL = 'https://api.groupme.com/v3/bots/post'
+
 class GroupMeBot(object):
     #Creates GroupMe Bot to send messages
-    def __init__(self, bot_id):
+    max_length = 1000
+
+    def __init__(self, bot_id, client=None, timeout=10, post_url=GROUPME_POST_URL):
         self.bot_id = bot_id
+        self.client = client or get_http_client('groupme')
+        self.timeout = timeout
+        self.post_url = post_url
 
     def __repr__(self):
         return "GroupMeBot(%s)" % self.bot_id
 
-    def send_message(self, text):
-        #Sends a message to the chatroom
-        template = {
-                    "bot_id": self.bot_id,
-                    "text": text,
-                    "attachments": []
-                    }
+    def is_configured(self):
+        return self.bot_id not in (1, "1", '')
 
+    def send_message(self, text, skip=0, on_chunk=None):
+        #Sends a message to the chatroom, split into as many posts as GroupMe's length limit needs.
+        #The first skip chunks are left out and on_chunk is called with the count posted after each one
         headers = {'content-type': 'application/json'}
 
-        if self.bot_id not in (1, "1", ''):
-            r = requests.post("https://api.groupme.com/v3/bots/post",
-                              data=json.dumps(template), headers=headers)
-            if r.status_code != 202:
-                raise GroupMeException('Invalid BOT_ID')
+        if self.is_configured():
+            r = None
+            for n, chunk in enumerate(split_message(text, self.max_length)[skip:], skip + 1):
+                template = {
+                            "bot_id": self.bot_id,
+                            "text": chunk,
+                            "attachments": []
+                            }
+                r = self.client.post(self.post_url, data=json.dumps(template), headers=headers, timeout=self.timeout)
+                if r.status_code != 202:
+                    raise GroupMeException('Invalid BOT_ID')
+                if on_chunk:
+                    on_chunk(n)
 
             return r
 
 class SlackBot(object):
-    #Creates GroupMe Bot to send messages
-    def __init__(self, webhook_url):
+    #Creates Slack Bot to send messages
+    max_length = 40000
+
+    def __init__(self, webhook_url, client=None, timeout=10):
         self.webhook_url = webhook_url
+        self.client = client or get_http_client('slack')
+        self.timeout = timeout
 
     def __repr__(self):
         return "Slack Webhook Url(%s)" % self.webhook_url
 
-    def send_message(self, text):
-        #Sends a message to the chatroom
-        message = "```{0}```".format(text)
-        template = {
-                    "text":message
-                    }
+    def is_configured(self):
+        return self.webhook_url not in (1, "1", '')
 
+    def send_message(self, text, skip=0, on_chunk=None):
+        #Sends a message to the chatroom, each chunk gets its own code block. skip and on_chunk as for GroupMeBot
         headers = {'content-type': 'application/json'}
 
-        if self.webhook_url not in (1, "1", ''):
-            r = requests.post(self.webhook_url,
-                              data=json.dumps(template), headers=headers)
+        if self.is_configured():
+            r = None
+            for n, chunk in enumerate(split_message(text, self.max_length - len("``````"))[skip:], skip + 1):
+                message = "```{0}```".format(chunk)
+                template = {
+                            "text":message
+                            }
+                r = self.client.post(self.webhook_url, data=json.dumps(template), headers=headers, timeout=self.timeout)
 
-            if r.status_code != 200:
-                raise SlackException('WEBHOOK_URL')
+                if r.status_code != 200:
+                    raise SlackException('WEBHOOK_URL')
+                if on_chunk:
+                    on_chunk(n)
 
             return r
 
 class DiscordBot(object):
     #Creates Discord Bot to send messages
-    def __init__(self, webhook_url):
+    max_length = 2000
+
+    def __init__(self, webhook_url, client=None, timeout=10):
         self.webhook_url = webhook_url
+        self.client = client or get_http_client('discord')
+        self.timeout = timeout
 
     def __repr__(self):
         return "Discord Webhook Url(%s)" % self.webhook_url
 
-    def send_message(self, text):
-        #Sends a message to the chatroom
-        message = "```{0}```".format(text)
-        template = {
-                    "content":message
-                    }
+    def is_configured(self):
+        return self.webhook_url not in (1, "1", '')
 
+    def send_message(self, text, skip=0, on_chunk=None):
+        #Sends a message to the chatroom, each chunk gets its own code block. skip and on_chunk as for GroupMeBot
         headers = {'content-type': 'application/json'}
 
-        if self.webhook_url not in (1, "1", ''):
-            r = requests.post(self.webhook_url,
-                              data=json.dumps(template), headers=headers)
+        if self.is_configured():
+            r = None
+            for n, chunk in enumerate(split_message(text, self.max_length - len("``````"))[skip:], skip + 1):
+                message = "```{0}```".format(chunk)
+                template = {
+                            "content":message
+                            }
+                r = self.client.post(self.webhook_url, data=json.dumps(template), headers=headers, timeout=self.timeout)
 
-            if r.status_code != 204:
-                raise DiscordException('WEBHOOK_URL')
+                if r.status_code != 204:
+                    raise DiscordException('WEBHOOK_URL')
+                if on_chunk:
+                    on_chunk(n)
 
             return r
 
+def timed_send(bot, text, **kwargs):
+    #Sends through one bot, recording its latency and status. kwargs go to its send_message
+    sink = type(bot).__name__
+    start = time.time()
+    status = 'skipped'
+    try:
+        with span('send', sink=sink):
+            r = bot.send_message(text, **kwargs)
+        if r is not None:
+            status = getattr(r, 'status_code', 'ok')
+        return r
+    except Exception as e:
+        status = type(e).__name__
+        raise
+    finally:
+        metrics.inc('ffb_bot_sends_total', sink=sink, status=status)
+        if status != 'skipped':
+            metrics.observe('ffb_bot_send_seconds', time.time() - start, sink=sink)
+
+def send_to_all(bots, text, send_kwargs=None):
+    #Sends text to every bot concurrently, one sink failing or hanging doesn't hold up the others.
+    #send_kwargs maps a bot to extra send_message kwargs. Returns a list of (bot, response or exception)
+    send_kwargs = send_kwargs or {}
+    results = []
+    with ThreadPoolExecutor(max_workers=max(len(bots), 1)) as executor:
+        futures = [(bot, executor.submit(contextvars.copy_context().run, timed_send, bot, text,
+                                         **send_kwargs.get(bot, {})))
+                   for bot in bots]
+        for bot, future in futures:
+            try:
+                results.append((bot, future.result()))
+            except Exception as e:
+                logger.error('Sending to %s failed: %s', bot, e)
+                results.append((bot, e))
+    return results
+
+class MessageBatcher(object):
+    #Holds a league's messages for window seconds and sends everything queued meanwhile as one post
+    def __init__(self, window, send=None):
+        self.window = window
+        self.send = send
+        self.lock = threading.Lock()
+        self.pending = {}
+
+    def __repr__(self):
+        return "MessageBatcher(%s)" % self.window
+
+    def submit(self, key, bots, text):
+        with self.lock:
+            if key in self.pending:
+                self.pending[key][1].append(text)
+                return
+            self.pending[key] = (bots, [text])
+        threading.Timer(self.window, self.flush, [key]).start()
+
+    def flush(self, key):
+        with self.lock:
+            bots, texts = self.pending.pop(key)
+        return (self.send or send_to_all)(bots, '\n\n'.join(texts))
+
+message_batchers = {}
+message_batchers_lock = threading.Lock()
+
+def get_message_batcher(window):
+    with message_batchers_lock:
+        if window not in message_batchers:
+            message_batchers[window] = MessageBatcher(window)
+        return message_batchers[window]
+
+class Outbox(object):
+    #Per sink delivery records keyed by (league, run, sink), a retried or resumed run
+    #reuses the rendered text and only posts to the sinks that haven't got it yet.
+    #chunks counts the posts of a split message a sink has taken, a retry starts after them
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute('CREATE TABLE IF NOT EXISTS outbox ('
+                          'league TEXT, run_id TEXT, sink TEXT, text TEXT, status TEXT, '
+                          'attempts INTEGER, last_error TEXT, created_at REAL, sent_at REAL, '
+                          'chunks INTEGER DEFAULT 0, PRIMARY KEY (league, run_id, sink))')
+        if 'chunks' not in [row[1] for row in self.conn.execute('PRAGMA table_info(outbox)')]:
+            #outboxes written before chunk progress was recorded
+            self.conn.execute('ALTER TABLE outbox ADD COLUMN chunks INTEGER DEFAULT 0')
+        self.conn.commit()
+
+    def __repr__(self):
+        return "Outbox(%s)" % self.path
+
+    def get(self, league, run_id):
+        #Returns {sink: (text, status, chunks)} for a run
+        with self.lock:
+            rows = self.conn.execute('SELECT sink, text, status, chunks FROM outbox WHERE league=? AND run_id=?',
+                                     (league, run_id)).fetchall()
+        return {sink: (text, status, chunks) for sink, text, status, chunks in rows}
+
+    def add(self, league, run_id, sinks, text):
+        with self.lock:
+            self.conn.executemany('INSERT OR IGNORE INTO outbox (league, run_id, sink, text, status, attempts, '
+                                  'created_at, chunks) VALUES (?, ?, ?, ?, ?, 0, ?, 0)',
+                                  [(league, run_id, sink, text, 'pending', time.time()) for sink in sinks])
+            self.conn.commit()
+
+    def mark_sent(self, league, run_id, sink):
+        with self.lock:
+            self.conn.execute("UPDATE outbox SET status='sent', attempts=attempts+1, sent_at=? "
+                              "WHERE league=? AND run_id=? AND sink=?", (time.time(), league, run_id, sink))
+            self.conn.commit()
+
+    def mark_chunk(self, league, run_id, sink, chunks):
+        with self.lock:
+            self.conn.execute('UPDATE outbox SET chunks=? WHERE league=? AND run_id=? AND sink=?',
+                              (chunks, league, run_id, sink))
+            self.conn.commit()
+
+    def mark_failed(self, league, run_id, sink, error):
+        with self.lock:
+            self.conn.execute("UPDATE outbox SET attempts=attempts+1, last_error=? "
+                              "WHERE league=? AND run_id=? AND sink=?", (repr(error), league, run_id, sink))
+            self.conn.commit()
+
+    def pending(self, max_age, max_attempts=5, min_attempts=0):
+        #Returns (league, run_id) of recent runs that still have undelivered sinks. min_attempts=1
+        #leaves out sinks no delivery has tried yet, e.g. the ones a running job is posting to right now
+        with self.lock:
+            return self.conn.execute("SELECT DISTINCT league, run_id FROM outbox WHERE status='pending' "
+                                     "AND attempts >= ? AND attempts < ? AND created_at > ? ORDER BY created_at",
+                                     (min_attempts, max_attempts, time.time() - max_age)).fetchall()
+
+def deliver(bots, outbox, league, run_id, render):
+    #Sends a run to every configured sink, render is only called if the run has no entries yet.
+    #A sink is marked sent after it has taken the post, so delivery is at least once: a crash in
+    #between posts again on resume. Split messages record each chunk, only the unsent ones are re-posted
+    sinks = {type(bot).__name__: bot for bot in bots if bot.is_configured()}
+    entries = outbox.get(league, run_id)
+    if not entries:
+        text = render()
+        if text == '':
+            return []
+        outbox.add(league, run_id, list(sinks), text)
+        entries = outbox.get(league, run_id)
+
+    pending = [(sinks[sink], text, chunks) for sink, (text, status, chunks) in sorted(entries.items())
+               if status == 'pending' and sink in sinks]
+    if not pending:
+        return []
+
+    def on_chunk(sink):
+        return lambda chunks: outbox.mark_chunk(league, run_id, sink, chunks)
+    results = send_to_all([bot for bot, text, chunks in pending], pending[0][1],
+                          {bot: {'skip': chunks, 'on_chunk': on_chunk(type(bot).__name__)}
+                           for bot, text, chunks in pending})
+    for bot, result in results:
+        if isinstance(result, Exception):
+            outbox.mark_failed(league, run_id, type(bot).__name__, result)
+        else:
+            outbox.mark_sent(league, run_id, type(bot).__name__)
+    return results
+
 def get_random_phrase():
     phrases = [
         'Why doesn\'t a chicken wear pants? Because its pecker is on its head.',
@@ -126,7 +1275,7 @@ def get_random_insult():
 
 def get_scoreboard_short(league, week=None):
     #Gets current week's scoreboard
-    box_scores = league.box_scores(week=week)
+    box_scores = get_scores(league, week=week)
     score = ['%s %.2f - %.2f %s' % (i.home_team.team_abbrev, i.home_score,
              i.away_score, i.away_team.team_abbrev) for i in box_scores
              if i.away_team]
@@ -136,13 +1285,13 @@ def get_scoreboard_short(league, week=None):
 def get_projected_scoreboard(league, week=None):
     #Gets current week's scoreboard projections
     box_scores = league.box_scores(week=week)
-    score = ['%s %.2f - %.2f %s' % (i.home_team.team_abbrev, get_projected_total(i.home_lineup),
-                                    get_projected_total(i.away_lineup), i.away_team.team_abbrev) for i in box_scores
-             if i.away_team]
+    score = ['%s %.2f - %.2f %s' % (i.home_team.team_abbrev, LineupSummary(i.home_lineup).projected_total,
+                                    LineupSummary(i.away_lineup).projected_total, i.away_team.team_abbrev)
+             for i in box_scores if i.away_team]
     text = ['Projected Scores:'] + score
     return '\n'.join(text)
 
-def get_standings(league, top_half_scoring, week=None):
+def get_standings(league, top_half_scoring, week=None, cache=None):
     standings_txt = ''
     teams = league.teams
     standings = []
@@ -154,11 +1303,10 @@ def get_standings(league, top_half_scoring, week=None):
         standings_txt = [f"{pos + 1}: {team_name} ({wins} - {losses})" for \
             pos, (wins, losses, team_name) in enumerate(standings)]
     else:
-        top_half_totals = {t.team_name: 0 for t in teams}
         if not week:
             week = league.current_week
-        for w in range(1, week):
-            top_half_totals = top_half_wins(league, top_half_totals, w)
+        store = SeasonStore.from_league(league, range(1, week), cache=cache)
+        top_half_totals = {t.team_name: int(n) for t, n in zip(teams, store.top_half_wins())}
 
         for t in teams:
             wins = top_half_totals[t.team_name] + t.wins
@@ -171,44 +1319,330 @@ def get_standings(league, top_half_scoring, week=None):
 
     return "\n".join(text)
 
-def top_half_wins(league, top_half_totals, week):
-    box_scores = league.box_scores(week=week)
+def summarize_box_scores(box_scores):
+    #Returns a week's [home_id, home_score, away_id, away_score] rows
+    return [[i.home_team.team_id, i.home_score,
+             i.away_team.team_id if i.away_team else None, i.away_score] for i in box_scores]
+
+def get_week_matchups(league, week, cache=None):
+    #Returns a week's [home_id, home_score, away_id, away_score] rows
+    cached = cache.get(week) if cache else None
+    if cached is not None:
+        return cached
+
+    matchups = summarize_box_scores(get_scores(league, week=week))
+
+    # only weeks that are over can't change anymore (barring stat corrections)
+    if cache and week < league.current_week:
+        cache.put(week, matchups)
+    return matchups
+
+class SeasonStore(object):
+    #Team x week score and opponent matrices, season stats are batched numpy operations over them
+    def __init__(self, team_ids, weeks):
+        self.team_ids = list(team_ids)
+        self.index = {team_id: i for i, team_id in enumerate(self.team_ids)}
+        self.weeks = list(weeks)
+        self.columns = {week: i for i, week in enumerate(self.weeks)}
+        # nan score and -1 opponent mean the team didn't play (bye or not in the store)
+        self.scores = np.full((len(self.team_ids), len(self.weeks)), np.nan)
+        self.opponents = np.full((len(self.team_ids), len(self.weeks)), -1, dtype=np.int64)
+
+    def __repr__(self):
+        return "SeasonStore(%s teams, %s weeks)" % (len(self.team_ids), len(self.weeks))
+
+    @classmethod
+    def from_league(cls, league, weeks, cache=None):
+        store = cls([t.team_id for t in league.teams], weeks)
+        for week in store.weeks:
+            store.add_week(week, get_week_matchups(league, week, cache=cache))
+        return store
+
+    @classmethod
+    def from_teams(cls, teams, week):
+        #Weeks 1 to week from the teams' own scores and schedules, no box scores needed
+        store = cls([t.team_id for t in teams], range(1, week + 1))
+        for t in teams:
+            row = store.index[t.team_id]
+            for col, (score, opponent) in enumerate(zip(t.scores[:week], t.schedule[:week])):
+                store.scores[row, col] = score
+                store.opponents[row, col] = store.index[opponent.team_id]
+        return store
+
+    def add_week(self, week, matchups):
+        col = self.columns[week]
+        for home_id, home_score, away_id, away_score in matchups:
+            home = self.index[home_id]
+            self.scores[home, col] = home_score
+            if away_id:
+                away = self.index[away_id]
+                self.scores[away, col] = away_score
+                self.opponents[home, col] = away
+                self.opponents[away, col] = home
+
+    def played(self):
+        return ~np.isnan(self.scores)
+
+    def opponent_scores(self):
+        has_opponent = self.opponents >= 0
+        opponent_scores = self.scores[np.where(has_opponent, self.opponents, 0), np.arange(len(self.weeks))]
+        return np.where(has_opponent, opponent_scores, np.nan)
+
+    def records(self):
+        #Returns head to head (wins, losses, ties) per team
+        scores, against = self.scores, self.opponent_scores()
+        return (np.sum(scores > against, axis=1), np.sum(scores < against, axis=1),
+                np.sum(scores == against, axis=1))
+
+    def points_for(self):
+        return np.nansum(self.scores, axis=1)
+
+    def points_against(self):
+        return np.nansum(self.opponent_scores(), axis=1)
+
+    def top_half_wins(self):
+        #Top half scorers of each week get an extra win, ties go to the team listed first
+        played = self.played()
+        order = np.argsort(-np.where(played, self.scores, -np.inf), axis=0, kind='stable')
+        ranks = np.empty_like(order)
+        ranks[order, np.arange(len(self.weeks))] = np.arange(len(self.team_ids))[:, None]
+        return np.sum((ranks < played.sum(axis=0) // 2) & played, axis=1)
+
+    def all_play(self):
+        #Returns (wins, losses) as if every team played every other team every week
+        played = self.played()
+        both = played[:, None, :] & played[None, :, :]
+        wins = np.sum((self.scores[:, None, :] > self.scores[None, :, :]) & both, axis=(1, 2))
+        losses = np.sum((self.scores[:, None, :] < self.scores[None, :, :]) & both, axis=(1, 2))
+        return wins, losses
+
+    def head_to_head(self):
+        #Returns a team x team matrix of wins, row beat column
+        won = (self.scores > self.opponent_scores()) & (self.opponents >= 0)
+        wins = np.zeros((len(self.team_ids), len(self.team_ids)), dtype=np.int64)
+        np.add.at(wins, (np.nonzero(won)[0], self.opponents[won]), 1)
+        return wins
+
+    def power_rankings(self, week):
+        #Same two step dominance formula as espn_api, returns [(power, team_id)] best first
+        cols = [self.columns[w] for w in self.weeks if w <= week]
+        scores = np.nan_to_num(self.scores[:, cols])
+        margins = np.nan_to_num(scores - self.opponent_scores()[:, cols])
+        opponents = self.opponents[:, cols]
+        win_matrix = np.zeros((len(self.team_ids), len(self.team_ids)), dtype=np.int64)
+        won = (margins > 0) & (opponents >= 0)
+        np.add.at(win_matrix, (np.nonzero(won)[0], opponents[won]), 1)
+        dominance = np.sum(win_matrix @ win_matrix + win_matrix, axis=1)
+        week = max(week, 1)
+        power = (dominance * 0.8 + np.trunc(scores.sum(axis=1) / week) * 0.15 +
+                 np.trunc(margins.sum(axis=1) / week) * 0.05)
+        order = sorted(range(len(self.team_ids)), key=lambda i: float('%.2f' % power[i]), reverse=True)
+        return [('%.2f' % power[i], self.team_ids[i]) for i in order]
+
+    def trophies(self, week):
+        #Returns (high, low, closest, blowout) for a week as (team_id, points) and (winner_id, loser_id, margin)
+        col = self.columns[week]
+        scores = self.scores[:, col]
+        played = ~np.isnan(scores)
+        high = int(np.argmax(np.where(played, scores, -np.inf)))
+        low = int(np.argmin(np.where(played, scores, np.inf)))
+        margins = np.abs(scores - self.opponent_scores()[:, col])
+        # every matchup shows up twice, keep the winner's row
+        winners = np.where(scores > self.opponent_scores()[:, col])[0]
+        closest = int(winners[np.argmin(margins[winners])]) if len(winners) else None
+        blowout = int(winners[np.argmax(margins[winners])]) if len(winners) else None
+
+        def matchup(i):
+            if i is None:
+                return None
+            return (self.team_ids[i], self.team_ids[self.opponents[i, col]], float(margins[i]))
+        return ((self.team_ids[high], float(scores[high])), (self.team_ids[low], float(scores[low])),
+                matchup(closest), matchup(blowout))
+
+def get_season_stats(league, week=None, cache=None):
+    #Gets season points for/against and all-play records
+    if not week:
+        week = league.current_week
+    store = SeasonStore.from_league(league, range(1, week), cache=cache)
+    all_play_wins, all_play_losses = store.all_play()
+    points_for, points_against = store.points_for(), store.points_against()
+    stats = sorted(zip(league.teams, all_play_wins, all_play_losses, points_for, points_against),
+                   key=lambda tup: tup[3], reverse=True)
+    stats_txt = ['%s: PF %.2f PA %.2f All-play (%s - %s)' % (t.team_name, pf, pa, wins, losses)
+                 for t, wins, losses, pf, pa in stats]
+    text = ['Season Stats:'] + stats_txt
+    return '\n'.join(text)
 
-    scores = [(i.home_score, i.home_team.team_name) for i in box_scores] + \
-            [(i.away_score, i.away_team.team_name) for i in box_scores if i.away_team]
+class HistoryStore(object):
+    #Every cached season of a league, read straight from the week cache
+    def __init__(self, path, league_id):
+        self.path = path
+        self.league_id = str(league_id)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # the tables belong to WeekCache, opening one creates them on a fresh file
+        WeekCache(path, league_id, 0).conn.close()
 
-    scores = sorted(scores, key=lambda tup: tup[0], reverse=True)
+    def __repr__(self):
+        return "HistoryStore(%s, %s)" % (self.path, self.league_id)
+
+    def years(self):
+        return [row[0] for row in self.conn.execute('SELECT DISTINCT year FROM weeks WHERE league_id=? '
+                                                    'ORDER BY year', (self.league_id,))]
+
+    def team_names(self):
+        #Latest name of every team that has played in the league
+        rows = self.conn.execute('SELECT team_id, team_name FROM teams WHERE league_id=? ORDER BY year',
+                                 (self.league_id,))
+        return {team_id: team_name for team_id, team_name in rows}
+
+    def season_store(self, years=None):
+        #Returns a SeasonStore whose columns are every cached (year, week)
+        rows = [(year, week, json.loads(matchups)) for year, week, matchups in self.conn.execute(
+                    'SELECT year, week, matchups FROM weeks WHERE league_id=? ORDER BY year, week',
+                    (self.league_id,)) if years is None or year in years]
+        team_ids = set(self.team_names())
+        for year, week, matchups in rows:
+            for home_id, home_score, away_id, away_score in matchups:
+                team_ids.update(team_id for team_id in (home_id, away_id) if team_id)
+        store = SeasonStore(sorted(team_ids), [(year, week) for year, week, matchups in rows])
+        for year, week, matchups in rows:
+            store.add_week((year, week), matchups)
+        return store
+
+def sync_season(league, cache):
+    #Makes sure the current season's finished weeks and teams are in the cache, older seasons come from backfill
+    cache.put_teams(league.teams)
+    for week in range(1, league.current_week):
+        get_week_matchups(league, week, cache=cache)
+
+#espn_api raises for box scores of earlier seasons, backfill reads their scoreboard instead
+BOX_SCORE_FIRST_YEAR = 2019
+
+def backfill(config, years, max_workers=8):
+    #Fetches every week of past seasons into the week cache, seasons and then weeks are fetched
+    #in parallel with at most max_workers ESPN requests in flight. Weeks already cached are skipped
+    #so it can be rerun, past seasons are final and never refetched. A season or week that fails
+    #is logged and left for the next run, returns how many weeks were written
+    cache_path = config["cache_path"]
+    context = get_context(config)
+
+    def fetch_season(year):
+        league = LeagueContext(context.league_id, year, espn_s2=context.espn_s2, swid=context.swid,
+                               base_url=context.base_url).get_league()
+        return year, league
+
+    def fetch_week(league, year, week):
+        with span('backfill.week', year=year, week=week):
+            scores = league.box_scores if year >= BOX_SCORE_FIRST_YEAR else league.scoreboard
+            return year, week, summarize_box_scores(espn_call(scores, week=week))
+
+    def results(futures, what):
+        for future in futures:
+            try:
+                yield future.result()
+            except Exception as e:
+                logger.warning('Backfill of %s %s failed: %s', context.league_id, what[future], e)
+
+    caches = {year: WeekCache(cache_path, context.league_id, year) for year in years}
+    written = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        seasons = {executor.submit(contextvars.copy_context().run, fetch_season, year): year for year in years}
+        weeks = {}
+        for year, league in results(seasons, seasons):
+            caches[year].put_teams(league.teams)
+            # a finished season's current week is its final week
+            weeks.update({executor.submit(contextvars.copy_context().run, fetch_week, league, year, week):
+                          '%s week %s' % (year, week)
+                          for week in range(1, league.current_week + 1) if caches[year].get(week) is None})
+        # sqlite writes stay on this thread
+        for year, week, matchups in results(weeks, weeks):
+            caches[year].put(week, matchups)
+            written += 1
+    for cache in caches.values():
+        cache.conn.close()
+    return written
+
+def get_all_time_standings(history):
+    #Gets head to head records and points for over every cached season
+    store = history.season_store()
+    team_names = history.team_names()
+    wins, losses, ties = store.records()
+    points_for = store.points_for()
+    standings = sorted(zip(store.team_ids, wins, losses, ties, points_for),
+                       key=lambda tup: (tup[1], tup[4]), reverse=True)
+    standings_txt = ['%s. %s (%s - %s - %s) PF %.2f' % (pos + 1, team_names.get(team_id, team_id), w, l, t, pf)
+                     for pos, (team_id, w, l, t, pf) in enumerate(standings)]
+    text = ['All-Time Standings (%s):' % ', '.join(str(year) for year in history.years())] + standings_txt
+    return '\n'.join(text)
 
-    for i in range(0, len(scores)//2):
-        points, team_name = scores[i]
-        top_half_totals[team_name] += 1
+def get_career_trophies(history):
+    #Counts weekly high and low scores for every team over every cached season
+    store = history.season_store()
+    team_names = history.team_names()
+    highs = {team_id: 0 for team_id in store.team_ids}
+    lows = {team_id: 0 for team_id in store.team_ids}
+    for week in store.weeks:
+        if not store.played()[:, store.columns[week]].any():
+            continue
+        (high_id, high), (low_id, low), closest, blowout = store.trophies(week)
+        highs[high_id] += 1
+        lows[low_id] += 1
+    trophies = sorted(store.team_ids, key=lambda team_id: (highs[team_id], -lows[team_id]), reverse=True)
+    text = ['Career Trophies:'] + ['%s: %s🏆 %s🤮' % (team_names.get(team_id, team_id), highs[team_id], lows[team_id])
+                                   for team_id in trophies]
+    return '\n'.join(text)
 
-    return top_half_totals
+def get_rivalries(history, limit=10):
+    #Gets the most played head to head series over every cached season
+    store = history.season_store()
+    team_names = history.team_names()
+    wins = store.head_to_head()
+    pairs = [(wins[i, j] + wins[j, i], i, j) for i in range(len(store.team_ids))
+             for j in range(i + 1, len(store.team_ids)) if wins[i, j] + wins[j, i]]
+    pairs = sorted(pairs, key=lambda tup: tup[0], reverse=True)[:limit]
+    names = [team_names.get(team_id, team_id) for team_id in store.team_ids]
+    text = ['Rivalries:'] + ['%s vs %s: %s - %s' % (names[i], names[j], wins[i, j], wins[j, i])
+                             for games, i, j in pairs]
+    return '\n'.join(text)
 
-def get_projected_total(lineup):
-    total_projected = 0
-    for i in lineup:
-        if i.slot_position != 'BE' and i.slot_position != 'IR':
+#a starter's remaining points are simulated as normal around what's left of the projection
+#with this sd to mean ratio, and a game is close while the favourite wins less often than CLOSE_PROBABILITY
+SCORE_SD_RATIO = 0.5
+CLOSE_PROBABILITY = 0.75
+
+class LineupSummary(object):
+    #Everything the close score, projection and live builders read from a lineup, in one pass over its starters
+    def __init__(self, lineup):
+        self.projected_total = 0
+        self.points = 0
+        self.remaining_mean = 0
+        self.remaining_var = 0
+        self.players_left = []
+        for i in lineup:
+            if i.slot_position == 'BE' or i.slot_position == 'IR':
+                continue
+            self.points += i.points
             if i.points != 0 or i.game_played > 0:
-                total_projected += i.points
+                self.projected_total += i.points
             else:
-                total_projected += i.projected_points
-    return total_projected
+                self.projected_total += i.projected_points
+            if i.game_played < 100:
+                self.players_left.append(i.name)
+                # what's left of the projection, spread around it for the simulator
+                remaining = i.projected_points * (100 - i.game_played) / 100
+                self.remaining_mean += remaining
+                self.remaining_var += (SCORE_SD_RATIO * remaining) ** 2
+        self.all_played = not self.players_left
+        self._formatted_names = None
 
-def all_played(lineup):
-    for i in lineup:
-        if i.slot_position != 'BE' and i.slot_position != 'IR' and i.game_played < 100:
-            return False
-    return True
-
-def players_left(lineup):
-    players = []
-    for i in lineup:
-        if i.slot_position != 'BE' and i.slot_position != 'IR' and i.game_played < 100:
-            players += [i.name]
-    if not players:
-        return('')
-    return players
+    def __repr__(self):
+        return "LineupSummary(%.2f, %s left)" % (self.projected_total, len(self.players_left))
+
+    @property
+    def formatted_names(self):
+        if self._formatted_names is None:
+            self._formatted_names = [format_player_name(name) for name in self.players_left]
+        return self._formatted_names
 
 def format_player_name(name):
     names = name.split()
@@ -227,58 +1661,301 @@ def get_matchups(league, random_phrase, week=None):
         text = text + get_random_phrase()
     return '\n\n'.join(text)
 
+def is_close(home_win_probability, finished):
+    #A matchup is close while neither team is a clear favourite
+    return not finished and 1 - CLOSE_PROBABILITY < home_win_probability < CLOSE_PROBABILITY
+
+def simulate_matchups(means, sds, simulations=10000, seed=0):
+    #Monte Carlo over final scores, means and sds are (matchups, 2) home/away arrays
+    #Returns the home win probability of every matchup, ties count as half a win
+    #A fixed seed keeps repeated polls of an unchanged game on the same side of CLOSE_PROBABILITY
+    rng = np.random.default_rng(seed)
+    scores = rng.normal(means, sds, size=(simulations,) + np.shape(means))
+    home, away = scores[..., 0], scores[..., 1]
+    return np.mean((home > away) + 0.5 * (home == away), axis=0)
+
+def summarize_lineups(box_scores):
+    #Returns [(box score, home LineupSummary, away LineupSummary)] for a week's games, byes are left out
+    return [(i, LineupSummary(i.home_lineup), LineupSummary(i.away_lineup)) for i in box_scores if i.away_team]
+
+def get_win_probabilities(box_scores, simulations=10000, seed=0):
+    #Returns {(home_id, away_id): home win probability} for a week's games
+    return get_game_probabilities(summarize_lineups(box_scores), simulations, seed)
+
+def get_game_probabilities(games, simulations=10000, seed=0):
+    #get_win_probabilities for summarize_lineups' games, for callers that read the summaries too
+    #Every game draws from its own seeded stream, so live polls can re-simulate just the games that changed
+    probabilities = {}
+    for i, home, away in games:
+        key = (i.home_team.team_id, i.away_team.team_id)
+        means = [[home.points + home.remaining_mean, away.points + away.remaining_mean]]
+        sds = [[home.remaining_var ** 0.5, away.remaining_var ** 0.5]]
+        probabilities[key] = float(simulate_matchups(np.array(means), np.array(sds), simulations, (seed,) + key)[0])
+    return probabilities
+
 def get_close_scores(league, week=None):
-    #Gets current closest projections (16 points or closer)
-    matchups = league.box_scores(week=week)
+    #Gets games where neither team is a clear favourite yet
+    games = summarize_lineups(league.box_scores(week=week))
+    probabilities = get_game_probabilities(games)
     close_matchup_text = []
 
-    for i in matchups:
-        if i.away_team:
-            projection_diff = get_projected_total(i.away_lineup) - get_projected_total(i.home_lineup)
-            if ((-16 < projection_diff <= 0 and not (all_played(i.away_lineup) and all_played(i.home_lineup))) or (0 <= projection_diff < 16)):
-                matchup = ['%s vs %s' % (i.home_team.team_name, i.away_team.team_name)]
-                current_score = ['Current score: %s %.1f - %.1f %s' % (i.home_team.team_abbrev, i.home_score,
-                    i.away_score, i.away_team.team_abbrev)]
-                projected_score = ['Projected score: %s %.1f - %.1f %s' % (i.home_team.team_abbrev, get_projected_total(i.home_lineup),
-                    get_projected_total(i.away_lineup), i.away_team.team_abbrev)]
-
-                players = []
-                away_players = players_left(i.away_lineup)
-                for player in away_players:
-                    players += [f'{format_player_name(player)} ({i.away_team.team_abbrev})']
-                home_players = players_left(i.home_lineup)
-                for player in home_players:
-                    players += [f'{format_player_name(player)} ({i.home_team.team_abbrev})']
-                
-                players_left_text = ['‼Players to watch: ' + ', '.join(players) + '\n']
-
-                matchup_text = matchup + current_score + projected_score + players_left_text
-                close_matchup_text += matchup_text
-                        
+    for i, home, away in games:
+        probability = probabilities[(i.home_team.team_id, i.away_team.team_id)]
+        if is_close(probability, away.all_played and home.all_played):
+            matchup = ['%s vs %s' % (i.home_team.team_name, i.away_team.team_name)]
+            current_score = ['Current score: %s %.1f - %.1f %s' % (
+                i.home_team.team_abbrev, i.home_score, i.away_score, i.away_team.team_abbrev)]
+            projected_score = ['Projected score: %s %.1f - %.1f %s' % (
+                i.home_team.team_abbrev, home.projected_total, away.projected_total, i.away_team.team_abbrev)]
+            win_probability = ['Win probability: %s %.0f%% - %.0f%% %s' % (
+                i.home_team.team_abbrev, probability * 100, (1 - probability) * 100, i.away_team.team_abbrev)]
+
+            players = [f'{player} ({i.away_team.team_abbrev})' for player in away.formatted_names] + \
+                [f'{player} ({i.home_team.team_abbrev})' for player in home.formatted_names]
+
+            players_left_text = ['‼Players to watch: ' + ', '.join(players) + '\n']
+
+            matchup_text = matchup + current_score + projected_score + win_probability + players_left_text
+            close_matchup_text += matchup_text
+
     if not close_matchup_text:
         return('')
     text = ['⚠️Scoreboard Watch⚠️\n'] + close_matchup_text
     return '\n'.join(text)
 
+class PlayerIndex(object):
+    #Inverted index from player id to the (league, matchup, side) lineups they are in and their slot there,
+    #shared by every league the process polls. Each poll diffs a league's lineups against it and only the
+    #matchups with a changed starter are handed back for re-evaluation
+    def __init__(self):
+        self.players = {}
+        self.lineups = {}
+        self.leagues = {}
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "PlayerIndex(%s players, %s lineups)" % (len(self.players), len(self.lineups))
+
+    def matchups(self, player_id):
+        #Returns {(league, (home_id, away_id), side): slot} for every lineup a player is in
+        with self.lock:
+            return dict(self.players.get(player_id, {}))
+
+    def update(self, league, box_scores):
+        #Diffs a league's box scores against the index and returns {(home_id, away_id): [(side, player, old points)]}
+        #for starters whose slot, points, projection or game progress changed; a starter who left the lineup
+        #marks the matchup without a player. Bench changes are indexed but don't mark anything
+        with self.lock:
+            changed = {}
+            seen = set()
+            for i in box_scores:
+                if not i.away_team:
+                    continue
+                key = (i.home_team.team_id, i.away_team.team_id)
+                for side, lineup in (('home', i.home_lineup), ('away', i.away_lineup)):
+                    entry = (league, key, side)
+                    seen.add(entry)
+                    old = self.lineups.get(entry, {})
+                    new = {}
+                    for player in lineup:
+                        state = (player.slot_position, player.points, player.projected_points, player.game_played)
+                        new[player.playerId] = state
+                        old_state = old.get(player.playerId)
+                        if old_state == state:
+                            continue
+                        self.players.setdefault(player.playerId, {})[entry] = player.slot_position
+                        if is_starter(state[0]) or (old_state and is_starter(old_state[0])):
+                            changed.setdefault(key, []).append((side, player, old_state[1] if old_state else 0))
+                    for player_id in old.keys() - new.keys():
+                        self.remove(player_id, entry)
+                        if is_starter(old[player_id][0]):
+                            changed.setdefault(key, [])
+                    self.lineups[entry] = new
+            for entry in self.leagues.get(league, set()) - seen:
+                # last week's matchups
+                for player_id in self.lineups.pop(entry, {}):
+                    self.remove(player_id, entry)
+            self.leagues[league] = seen
+            return changed
+
+    def remove(self, player_id, entry):
+        entries = self.players.get(player_id, {})
+        entries.pop(entry, None)
+        if not entries:
+            self.players.pop(player_id, None)
+
+player_index = PlayerIndex()
+
+def is_starter(slot_position):
+    return slot_position != 'BE' and slot_position != 'IR'
+
+class ScoreWatcher(object):
+    #Remembers the last polled state of every matchup so live polling only posts what changed
+    #Matchups are only re-evaluated when the PlayerIndex saw one of their starters change or their score moved
+    def __init__(self, league=None, index=None):
+        self.league = league
+        self.index = index if index is not None else PlayerIndex()
+        self.week = None
+        self.states = None
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "ScoreWatcher(%s, week %s)" % (self.league, self.week)
+
+    def update(self, box_scores, week):
+        #Returns (box score, old state, new state, changed starters) for matchups that changed since the last poll
+        with self.lock:
+            if week != self.week:
+                # first poll of the week only records a baseline
+                self.week = week
+                self.states = None
+            players = self.index.update(self.league, box_scores)
+            states = dict(self.states or {})
+            games = []
+            for i in box_scores:
+                if not i.away_team:
+                    continue
+                key = (i.home_team.team_id, i.away_team.team_id)
+                old = states.get(key)
+                if old is None or key in players or old[:2] != (round(i.home_score, 2), round(i.away_score, 2)):
+                    games.append(i)
+            games = summarize_lineups(games)
+            probabilities = get_game_probabilities(games)
+            changed = []
+            for i, home, away in games:
+                key = (i.home_team.team_id, i.away_team.team_id)
+                state = get_matchup_state(i, home, away, probabilities[key])
+                old = states.get(key)
+                states[key] = state
+                if self.states is not None and old is not None and old != state:
+                    changed.append((i, old, state, players.get(key, [])))
+            self.states = states
+            return changed
+
+def get_matchup_state(box_score, home, away, home_win_probability):
+    #Compact state the live poller diffs: scores, close and finished flags, home and away are LineupSummaries
+    finished = home.all_played and away.all_played
+    return (round(box_score.home_score, 2), round(box_score.away_score, 2),
+            is_close(home_win_probability, finished), finished)
+
+def get_score_changes(league, watcher, week=None):
+    #Gets lead changes, newly close games and final results since the last poll
+    if not week:
+        week = league.current_week
+    lines = []
+    for i, old, new, players in watcher.update(league.box_scores(week=week), week):
+        old_home, old_away, old_close, old_finished = old
+        home_score, away_score, close, finished = new
+        score = '%s %.2f - %.2f %s' % (i.home_team.team_abbrev, home_score, away_score, i.away_team.team_abbrev)
+        abbrevs = {'home': i.home_team.team_abbrev, 'away': i.away_team.team_abbrev}
+        impact = ['%s %+.2f (%s)' % (format_player_name(player.name), player.points - old_points, abbrevs[side])
+                  for side, player, old_points in players if player.points != old_points]
+        if finished and not old_finished:
+            lines += ['Final: ' + score]
+        elif (old_home - old_away) * (home_score - away_score) < 0:
+            lines += ['Lead change: ' + score]
+        elif close and not old_close:
+            lines += ['Close game: ' + score]
+        elif close and impact:
+            lines += ['Player impact: %s: %s' % (', '.join(impact), score)]
+    if not lines:
+        return ''
+    text = ['Live Update:'] + lines
+    return '\n'.join(text)
+
 def get_power_rankings(league, week=None):
     # power rankings requires an integer value, so this grabs the current week for that
-    if not week:
+    if not week or week > league.current_week:
         week = league.current_week
     #Gets current week's power rankings
     #Using 2 step dominance, as well as a combination of points scored and margin of victory.
-    #It's weighted 80/15/5 respectively
-    power_rankings = league.power_rankings(week=week)
+    #It's weighted 80/15/5 respectively, from the teams' schedules like espn_api's own
+    power_rankings = SeasonStore.from_teams(league.teams, week).power_rankings(week)
+    teams = {t.team_id: t for t in league.teams}
     list_item = []
-    for idx, value in enumerate(power_rankings, start=1):
-        team = value[1]
+    for idx, (score, team_id) in enumerate(power_rankings, start=1):
+        team = teams[team_id]
         rank = f'{idx}'
         team_name = team.team_name
-        score = value[0]
         list_item += [f'{rank}. {team_name} ({score}) {get_heat_scale(team)}']
 
     text = ['Power Rankings:\n'] + list_item
     return '\n'.join(text)
 
+def simulate_playoff_chunk(schedule, wins, points, playoff_teams, simulations, seed):
+    #One worker's share of the season simulation, schedule is [(pairs, means, sds)] per remaining week
+    #with pairs a (matchups, 2) array of team indexes. Returns how often each team made the playoffs
+    rng = np.random.default_rng(seed)
+    wins = np.tile(np.asarray(wins, dtype=float), (simulations, 1))
+    points = np.tile(np.asarray(points, dtype=float), (simulations, 1))
+    for pairs, means, sds in schedule:
+        scores = rng.normal(means, sds, size=(simulations, len(means)))
+        home, away = pairs[:, 0], pairs[:, 1]
+        wins[:, home] += (scores[:, home] > scores[:, away]) + 0.5 * (scores[:, home] == scores[:, away])
+        wins[:, away] += (scores[:, away] > scores[:, home]) + 0.5 * (scores[:, home] == scores[:, away])
+        points[:, home] += scores[:, home]
+        points[:, away] += scores[:, away]
+    # seeds go by wins, then points for
+    order = np.lexsort((-points, -wins), axis=1)
+    return np.bincount(order[:, :playoff_teams].ravel(), minlength=wins.shape[1])
+
+def simulate_playoff_odds(schedule, wins, points, playoff_teams, simulations=10000, seed=0, workers=1):
+    #Returns each team's playoff probability, simulations are split over a process pool when workers > 1
+    seeds = np.random.SeedSequence(seed).spawn(max(workers, 1))
+    chunks = [simulations // len(seeds) + (n < simulations % len(seeds)) for n in range(len(seeds))]
+    args = [(schedule, wins, points, playoff_teams, chunk, chunk_seed) for chunk, chunk_seed in zip(chunks, seeds)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            counts = list(executor.map(simulate_playoff_chunk, *zip(*args)))
+    else:
+        counts = [simulate_playoff_chunk(*a) for a in args]
+    return np.sum(counts, axis=0) / simulations
+
+def get_playoff_odds(league, simulations=10000, workers=1, cache=None):
+    #Gets every team's chance of making the playoffs, simulating this week from the lineups and
+    #the rest of the regular season from each team's scores so far
+    week = league.current_week
+    last_week = league.settings.reg_season_count
+    if week > last_week:
+        return ''
+    teams = sorted(league.teams, key=lambda t: t.team_id)
+    index = {t.team_id: n for n, t in enumerate(teams)}
+    store = SeasonStore([t.team_id for t in teams], range(1, week))
+    for w in store.weeks:
+        store.add_week(w, get_week_matchups(league, w, cache=cache))
+    wins, losses, ties = store.records()
+    wins = wins + 0.5 * ties
+
+    # teams without a couple of games yet borrow the league's spread
+    scores = store.scores
+    played = store.played()
+    league_mean = np.nanmean(scores) if played.any() else 100.0
+    league_sd = np.nanstd(scores) if played.sum() > 1 else league_mean * SCORE_SD_RATIO
+    counts = played.sum(axis=1)
+    means = np.where(counts > 0, np.nansum(scores, axis=1) / np.maximum(counts, 1), league_mean)
+    sds = np.array([np.nanstd(scores[n]) if counts[n] > 1 else league_sd for n in range(len(teams))])
+
+    box_scores = [i for i in league.box_scores(week=week) if i.away_team]
+    live_means, live_sds = means.copy(), sds.copy()
+    for i in box_scores:
+        for team, lineup in ((i.home_team, i.home_lineup), (i.away_team, i.away_lineup)):
+            summary = LineupSummary(lineup)
+            live_means[index[team.team_id]] = summary.points + summary.remaining_mean
+            live_sds[index[team.team_id]] = summary.remaining_var ** 0.5
+    schedule = [(np.array([[index[i.home_team.team_id], index[i.away_team.team_id]] for i in box_scores],
+                          dtype=np.int64).reshape(-1, 2), live_means, live_sds)]
+    for w in range(week + 1, last_week + 1):
+        # espn_api makes a team its own opponent on a bye
+        pairs = {tuple(sorted((index[t.team_id], index[t.schedule[w - 1].team_id])))
+                 for t in teams if len(t.schedule) >= w and t.schedule[w - 1].team_id != t.team_id}
+        schedule.append((np.array(sorted(pairs), dtype=np.int64).reshape(-1, 2), means, sds))
+
+    odds = simulate_playoff_odds(schedule, wins, store.points_for(), league.settings.playoff_team_count,
+                                 simulations=simulations, workers=workers)
+    ranked = sorted(zip(teams, odds), key=lambda tup: tup[1], reverse=True)
+    text = ['Playoff Odds:'] + ['%s: %.1f%%' % (t.team_name, p * 100) for t, p in ranked]
+    return '\n'.join(text)
+
 def get_heat_scale(team):
     if 1 < team.streak_length < 3:
         if team.streak_type == 'WIN':
@@ -300,62 +1977,94 @@ def get_heat_scale(team):
 
 def get_trophies(league, week=None):
     #Gets trophies for highest score, lowest score, closest score, and biggest win
-    matchups = league.box_scores(week=week)
-    low_score = 9999
-    low_team_name = ''
-    high_score = -1
-    high_team_name = ''
-    closest_score = 9999
-    close_winner = ''
-    close_loser = ''
-    biggest_blowout = -1
-    blown_out_team_name = ''
-    ownerer_team_name = ''
-
-    for i in matchups:
-        if i.home_score > high_score:
-            high_score = i.home_score
-            high_team_name = i.home_team.team_name
-        if i.home_score < low_score:
-            low_score = i.home_score
-            low_team_name = i.home_team.team_name
-        if i.away_score > high_score:
-            high_score = i.away_score
-            high_team_name = i.away_team.team_name
-        if i.away_score < low_score:
-            low_score = i.away_score
-            low_team_name = i.away_team.team_name
-        if i.away_score - i.home_score != 0 and \
-            abs(i.away_score - i.home_score) < closest_score:
-            closest_score = abs(i.away_score - i.home_score)
-            if i.away_score - i.home_score < 0:
-                close_winner = i.home_team.team_name
-                close_loser = i.away_team.team_name
-            else:
-                close_winner = i.away_team.team_name
-                close_loser = i.home_team.team_name
-        if abs(i.away_score - i.home_score) > biggest_blowout:
-            biggest_blowout = abs(i.away_score - i.home_score)
-            if i.away_score - i.home_score < 0:
-                ownerer_team_name = i.home_team.team_name
-                blown_out_team_name = i.away_team.team_name
-            else:
-                ownerer_team_name = i.away_team.team_name
-                blown_out_team_name = i.home_team.team_name
+    if not week:
+        week = league.current_week
+    store = SeasonStore.from_league(league, [week])
+    team_names = {t.team_id: t.team_name for t in league.teams}
+    (high_id, high_score), (low_id, low_score), closest, blowout = store.trophies(week)
+    high_team_name, low_team_name = team_names[high_id], team_names[low_id]
 
     low_score_str = ['%s was the lowest scoring team on the week with %.2f points. ' % (low_team_name, low_score) + get_random_insult() + '🤮']
     high_score_str = ['✨✨%s was FAABulous this week! They were the highest scoring team with %.2f points.✨✨' % (high_team_name, high_score)]
-    close_score_str = ['%s barely beat %s by a margin of %.2f.' % (close_winner, close_loser, closest_score)]
-    blowout_str = ['Awkwaaard! %s was blown out by %s by a margin of %.2f. ' % (blown_out_team_name, ownerer_team_name, biggest_blowout) + get_random_insult()]
+    close_score_str = []
+    blowout_str = []
+    # a week of nothing but ties has no winners to hand these to
+    if closest:
+        close_winner, close_loser, closest_score = closest
+        close_score_str = ['%s barely beat %s by a margin of %.2f.' % (team_names[close_winner],
+                                                                       team_names[close_loser], closest_score)]
+    if blowout:
+        ownerer, blown_out, biggest_blowout = blowout
+        blowout_str = ['Awkwaaard! %s was blown out by %s by a margin of %.2f. ' % (
+            team_names[blown_out], team_names[ownerer], biggest_blowout) + get_random_insult()]
 
     text = ['🏆This Week\'s Highlights🏆'] + high_score_str + low_score_str + close_score_str + blowout_str
     return '\n\n'.join(text)
 
+#bot_main functions served from a finished week's artifacts, joined in this order
+RENDERED_FUNCTIONS = {
+    'get_final': ('final', 'trophies'),
+    'get_power_rankings': ('power_rankings',),
+}
+
+def render_week(league):
+    #Builds the artifacts for the week that just finished, returns (week, {name: text})
+    week = league.current_week - 1
+    return week, {
+        'final': "Final " + get_scoreboard_short(league, week=week),
+        'trophies': get_trophies(league, week=week),
+        'power_rankings': get_power_rankings(league),
+    }
+
+def get_rendered(renders, function, week):
+    #Returns the text for a rendered function from week's artifacts or None if they aren't built yet
+    texts = [renders.get(week, name) for name in RENDERED_FUNCTIONS[function]]
+    if None in texts:
+        return None
+    return '\n\n'.join(texts)
+
+def format_activity(message, teams, player_map):
+    def team_name(team_id):
+        return teams[team_id].team_name if team_id in teams else 'Team %s' % team_id
+    player = player_map.get(message['targetId'], 'Player %s' % message['targetId'])
+    action = ACTIVITY_ACTIONS[message['messageTypeId']]
+    if message['messageTypeId'] == 244:
+        return '%s traded %s to %s' % (team_name(message['from']), player, team_name(message.get('to')))
+    if message['messageTypeId'] == 239:
+        return '%s %s %s' % (team_name(message['for']), action, player)
+    if message['messageTypeId'] == 180 and message.get('from'):
+        #a waiver claim's bid is in from
+        return '%s %s %s for $%s' % (team_name(message['to']), action, player, message['from'])
+    return '%s %s %s' % (team_name(message['to']), action, player)
+
+def get_activity(league, fetcher, store):
+    #One digest of the transactions since the last poll, the first poll only sets the high-water mark
+    cursor = store.get()
+    topics = fetcher.activity(cursor)
+    if topics or cursor is None:
+        store.advance(topics)
+    if not topics or cursor is None:
+        return ''
+
+    messages = [m for t in reversed(topics) for m in t.get('messages', [])
+                if m.get('messageTypeId') in ACTIVITY_ACTIONS]
+    player_map = getattr(league, 'player_map', None)
+    if player_map is None:
+        player_map = {}
+    missing = {m['targetId'] for m in messages} - set(player_map)
+    if missing:
+        #only the players in this digest, the names are kept on the league for later polls
+        player_map.update(fetcher.player_names(missing))
+    teams = {t.team_id: t for t in league.teams}
+    text = ['League Activity:'] + [format_activity(m, teams, player_map) for m in messages]
+    return '\n'.join(text)
+
 def get_waivers_reminder():
     text = ['I am Funnybot! Don\'t forget to set your waiver claims for today before 11am EST you imperfect biological beings.']
     return text
 
-def bot_main(function):
+def get_config():
+    #Reads one league's settings from the environment
     try:
         bot_id = os.environ["BOT_ID"]
     except KeyError:
@@ -371,15 +2080,20 @@ def bot_main(function):
     except KeyError:
         discord_webhook_url = 1
 
-    if (len(str(bot_id)) <= 1 and
-        len(str(slack_webhook_url)) <= 1 and
-        len(str(discord_webhook_url)) <= 1):
-        #Ensure that there's info for at least one messaging platform,
-        #use length of str in case of blank but non null env variable
-        raise Exception("No messaging platform info provided. Be sure one of BOT_ID,\
-                        SLACK_WEBHOOK_URL, or DISCORD_WEBHOOK_URL env variables are set")
+    try:
+        slack_signing_secret = os.environ["SLACK_SIGNING_SECRET"]
+    except KeyError:
+        slack_signing_secret = None
 
-    league_id = os.environ["LEAGUE_ID"]
+    try:
+        discord_public_key = os.environ["DISCORD_PUBLIC_KEY"]
+    except KeyError:
+        discord_public_key = None
+
+    try:
+        league_id = os.environ["LEAGUE_ID"]
+    except KeyError:
+        league_id = None
 
     try:
         year = int(os.environ["LEAGUE_YEAR"])
@@ -391,11 +2105,6 @@ def bot_main(function):
     except KeyError:
         swid='{1}'
 
-    if swid.find("{",0) == -1:
-        swid = "{" + swid
-    if swid.find("}",-1) == -1:
-        swid = swid + "}"
-
     try:
         espn_s2 = os.environ["ESPN_S2"]
     except KeyError:
@@ -416,14 +2125,293 @@ def bot_main(function):
     except KeyError:
         random_phrase = False
 
-    bot = GroupMeBot(bot_id)
-    slack_bot = SlackBot(slack_webhook_url)
-    discord_bot = DiscordBot(discord_webhook_url)
+    try:
+        cache_path = os.environ["CACHE_PATH"]
+    except KeyError:
+        cache_path = 'ffb_bot_cache.sqlite3'
+
+    try:
+        league_ttl = int(os.environ["LEAGUE_TTL"])
+    except KeyError:
+        league_ttl = 900
+
+    try:
+        snapshot_dir = os.environ["SNAPSHOT_DIR"]
+    except KeyError:
+        snapshot_dir = None
+
+    try:
+        outbox_path = os.environ["OUTBOX_PATH"]
+    except KeyError:
+        outbox_path = None
+
+    try:
+        coalesce_seconds = int(os.environ["COALESCE_SECONDS"])
+    except KeyError:
+        coalesce_seconds = 0
+
+    try:
+        metrics_file = os.environ["METRICS_FILE"]
+    except KeyError:
+        metrics_file = None
+
+    try:
+        live_scoring = os.environ["LIVE_SCORING"]
+    except KeyError:
+        live_scoring = False
+
+    try:
+        scores_only = os.environ["SCORES_ONLY"]
+    except KeyError:
+        scores_only = False
+
+    try:
+        espn_base_url = os.environ["ESPN_BASE_URL"]
+    except KeyError:
+        espn_base_url = ESPN_BASE_URL
+
+    try:
+        groupme_post_url = os.environ["GROUPME_POST_URL"]
+    except KeyError:
+        groupme_post_url = GROUPME_POST_URL
+
+    try:
+        simulations = int(os.environ["SIMULATIONS"])
+    except KeyError:
+        simulations = 10000
+
+    try:
+        sim_workers = int(os.environ["SIM_WORKERS"])
+    except KeyError:
+        sim_workers = 1
+
+    try:
+        live_interval = int(os.environ["LIVE_INTERVAL"])
+    except KeyError:
+        live_interval = 1
+
+    try:
+        init_msg = os.environ["INIT_MSG"]
+    except KeyError:
+        init_msg = ''
+
+    try:
+        ff_start_date = os.environ["START_DATE"]
+    except KeyError:
+        ff_start_date='2021-09-09'
+
+    try:
+        ff_end_date = os.environ["END_DATE"]
+    except KeyError:
+        ff_end_date='2022-01-04'
+
+    try:
+        my_timezone = os.environ["TIMEZONE"]
+    except KeyError:
+        my_timezone='America/New_York'
+
+    return {
+        'bot_id': bot_id,
+        'slack_webhook_url': slack_webhook_url,
+        'discord_webhook_url': discord_webhook_url,
+        'slack_signing_secret': slack_signing_secret,
+        'discord_public_key': discord_public_key,
+        'league_id': league_id,
+        'year': year,
+        'swid': swid,
+        'espn_s2': espn_s2,
+        'test': test,
+        'top_half_scoring': top_half_scoring,
+        'random_phrase': random_phrase,
+        'cache_path': cache_path,
+        'league_ttl': league_ttl,
+        'snapshot_dir': snapshot_dir,
+        'outbox_path': outbox_path,
+        'coalesce_seconds': coalesce_seconds,
+        'metrics_file': metrics_file,
+        'live_scoring': live_scoring,
+        'live_interval': live_interval,
+        'scores_only': scores_only,
+        'espn_base_url': espn_base_url,
+        'groupme_post_url': groupme_post_url,
+        'simulations': simulations,
+        'sim_workers': sim_workers,
+        'init_msg': init_msg,
+        'start_date': ff_start_date,
+        'end_date': ff_end_date,
+        'timezone': my_timezone,
+    }
+
+def load_league_configs(path):
+    #Reads league definitions from a json file, {"defaults": {...}, "leagues": [{...}, ...]}
+    #Each league falls back to the file's defaults and then to the environment
+    with open(path) as f:
+        data = json.load(f)
+    configs = []
+    for league in data["leagues"]:
+        config = get_config()
+        config.update(data.get("defaults", {}))
+        config.update(league)
+        config["name"] = str(league.get("name", league["league_id"]))
+        configs.append(config)
+    return configs
+
+league_configs = {}
+
+job_triggers = {}
+outboxes = {}
+outboxes_lock = threading.Lock()
+
+def get_outbox(path):
+    with outboxes_lock:
+        if path not in outboxes:
+            outboxes[path] = Outbox(path)
+        return outboxes[path]
+
+def get_league_key(config):
+    return str(config.get("name") or config["league_id"])
+
+def get_run_id(job_id, misfire_grace_time=15*60):
+    #Identifies a scheduled run by its job id and the latest fire time at or before now
+    trigger = job_triggers.get(job_id)
+    now = datetime.now(timezone.utc)
+    fire_time = trigger.get_next_fire_time(None, now - timedelta(seconds=misfire_grace_time)) if trigger else None
+    if fire_time is None or fire_time > now:
+        return '%s@%s' % (job_id, now.isoformat())
+    while True:
+        next_fire_time = trigger.get_next_fire_time(fire_time, fire_time + timedelta(microseconds=1))
+        if next_fire_time is None or next_fire_time > now:
+            return '%s@%s' % (job_id, fire_time.astimezone(timezone.utc).isoformat())
+        fire_time = next_fire_time
+
+#set in sharded mode, jobs only run for leagues this process holds the lease of
+shard_worker = None
+
+def scheduled_job(job_id, name, function):
+    #Scheduled entry point, name picks the league in multi league mode
+    if shard_worker is not None and not shard_worker.owns(name):
+        logger.info('Skipping %s, %s has moved to another worker', job_id, name)
+        return
+    config = league_configs[name] if name else get_config()
+    bot_main(function, config, run_id=get_run_id(job_id))
+
+async def scheduled_job_async(job_id, name, function):
+    if shard_worker is not None and not shard_worker.owns(name):
+        logger.info('Skipping %s, %s has moved to another worker', job_id, name)
+        return
+    config = league_configs[name] if name else get_config()
+    await bot_main_async(function, config, run_id=get_run_id(job_id))
+
+def resume_outbox(configs, max_age=60*60, min_attempts=0):
+    #Delivers runs a previous process rendered but didn't finish sending, without touching ESPN.
+    #Leagues another shard worker owns are left to it
+    for config in configs:
+        if not config["outbox_path"]:
+            continue
+        if shard_worker is not None and not shard_worker.owns(config["name"]):
+            continue
+        outbox = get_outbox(config["outbox_path"])
+        league = get_league_key(config)
+        for pending_league, run_id in outbox.pending(max_age, min_attempts=min_attempts):
+            if pending_league == league:
+                logger.info('Resuming delivery of %s for %s', run_id, league)
+                deliver(get_bots(config), outbox, league, run_id, render=lambda: '')
+
+OUTBOX_RETRY_SECONDS = 5*60
+
+def add_outbox_retry(sched, configs, seconds=OUTBOX_RETRY_SECONDS):
+    #Retries sinks that failed since the last pass so a flaky sink gets its post without a restart.
+    #Sinks nothing has tried yet belong to a job that may still be posting, those are left alone
+    if not any(config["outbox_path"] for config in configs):
+        return None
+    sched.add_jobstore('memory', alias='outbox')
+    return sched.add_job(resume_outbox, 'interval', [configs], {'min_attempts': 1}, seconds=seconds,
+                         id='resume_outbox', jobstore='outbox')
+
+def get_bots(config):
+    bot_id = config["bot_id"]
+    slack_webhook_url = config["slack_webhook_url"]
+    discord_webhook_url = config["discord_webhook_url"]
+
+    if (len(str(bot_id)) <= 1 and
+        len(str(slack_webhook_url)) <= 1 and
+        len(str(discord_webhook_url)) <= 1):
+        #Ensure that there's info for at least one messaging platform,
+        #use length of str in case of blank but non null env variable
+        raise Exception("No messaging platform info provided. Be sure one of BOT_ID,\
+                        SLACK_WEBHOOK_URL, or DISCORD_WEBHOOK_URL env variables are set")
+
+    return [GroupMeBot(bot_id, post_url=config.get("groupme_post_url", GROUPME_POST_URL)),
+            SlackBot(slack_webhook_url), DiscordBot(discord_webhook_url)]
+
+def get_context(config):
+    #Returns the shared LeagueContext for a league config
+    league_id = config["league_id"]
+    if league_id is None:
+        raise KeyError("LEAGUE_ID")
+    year = int(config["year"])
+    swid = config["swid"]
+
+    if swid.find("{",0) == -1:
+        swid = "{" + swid
+    if swid.find("}",-1) == -1:
+        swid = swid + "}"
+
+    espn_s2 = config["espn_s2"]
+    league_ttl = int(config["league_ttl"])
+
+    snapshot_path = None
+    if config["snapshot_dir"]:
+        snapshot_path = os.path.join(config["snapshot_dir"], 'league_%s_%s.snapshot' % (league_id, year))
+
+    #espn_api has its own endpoints, only hand it a base url that isn't ESPN's
+    base_url = config["espn_base_url"] if config["espn_base_url"] != ESPN_BASE_URL else None
 
     if swid == '{1}' and espn_s2 == '1':
-        league = League(league_id=league_id, year=year)
-    else:
-        league = League(league_id=league_id, year=year, espn_s2=espn_s2, swid=swid)
+        return get_league_context(league_id, year, ttl=league_ttl, snapshot_path=snapshot_path, base_url=base_url)
+    return get_league_context(league_id, year, espn_s2=espn_s2, swid=swid, ttl=league_ttl,
+                              snapshot_path=snapshot_path, base_url=base_url)
+
+def get_text(function, config, render=True):
+    #Builds the message for a bot_main function, this is where all the ESPN fetching happens
+    #render=False answers rendered functions without storing the week, chat commands never write renders
+    test = config["test"]
+    if function == "init" and not test:
+        #the init message is static, don't build a league just to send it
+        return config["init_msg"]
+
+    league_id = config["league_id"]
+    year = int(config["year"])
+    top_half_scoring = config["top_half_scoring"]
+    random_phrase = config["random_phrase"]
+    cache_path = config["cache_path"]
+
+    renders = RenderStore(cache_path, league_id, year)
+    context = get_context(config)
+    cached = context.cached_league(max_age=context.ttl)
+    if function in RENDERED_FUNCTIONS and not test and cached is not None:
+        #scheduled posts are read from the artifacts the render job built for the week that just finished,
+        #a league we hold that is still within its ttl knows which week that is, no ESPN calls
+        text = get_rendered(renders, function, cached.current_week - 1)
+        if text is not None:
+            return text
+
+    if function == "get_activity" and not test:
+        #a cheap poll: team names from the league we already hold, however old, and only the activity
+        #and player name views from ESPN. The league is fetched once if nothing is cached yet
+        league = context.cached_league() or context.get_league()
+        activity_fetcher = EspnFetcher(league_id, year, espn_s2=context.espn_s2, swid=context.swid,
+                                       base_url=config["espn_base_url"],
+                                       cache=ResponseCache(cache_path) if config["scores_only"] else None)
+        return get_activity(league, activity_fetcher, ActivityStore(cache_path, league_id, year))
+
+    fetcher = None
+    if config["scores_only"]:
+        fetcher = EspnFetcher(league_id, year, espn_s2=context.espn_s2, swid=context.swid,
+                              base_url=config["espn_base_url"], cache=ResponseCache(cache_path))
+    league = BoxScoreMemo(context.get_league(), fetcher=fetcher)
+
+    cache = WeekCache(cache_path, league_id, year)
 
     if test:
         print(get_matchups(league,random_phrase))
@@ -432,11 +2420,8 @@ def bot_main(function):
         print(get_close_scores(league))
         print(get_power_rankings(league))
         print(get_scoreboard_short(league))
-        print(get_standings(league, top_half_scoring))
+        print(get_standings(league, top_half_scoring, cache=cache))
         function="get_final"
-        bot.send_message("Testing")
-        slack_bot.send_message("Testing")
-        discord_bot.send_message("Testing")
 
     text = ''
     if function=="get_matchups":
@@ -449,83 +2434,823 @@ def bot_main(function):
         text = get_projected_scoreboard(league)
     elif function=="get_close_scores":
         text = get_close_scores(league)
+    elif function=="get_score_changes":
+        text = get_score_changes(league, context.score_watcher)
+    elif function in RENDERED_FUNCTIONS and not test:
+        text = get_rendered(renders, function, league.current_week - 1)
+        if text is None:
+            #the render job hasn't run (yet), build the week now so later jobs can reuse it
+            week, artifacts = render_week(league)
+            if render:
+                renders.put(week, artifacts)
+            text = '\n\n'.join(artifacts[name] for name in RENDERED_FUNCTIONS[function])
+    elif function=="render_week":
+        renders.put(*render_week(league))
     elif function=="get_power_rankings":
         text = get_power_rankings(league)
     elif function=="get_trophies":
         text = get_trophies(league)
     elif function=="get_standings":
-        text = get_standings(league, top_half_scoring)
+        text = get_standings(league, top_half_scoring, cache=cache)
+    elif function=="get_season_stats":
+        text = get_season_stats(league, cache=cache)
+    elif function=="get_playoff_odds":
+        text = get_playoff_odds(league, simulations=config["simulations"], workers=config["sim_workers"],
+                                cache=cache)
+    elif function=="get_all_time_standings":
+        sync_season(league, cache)
+        text = get_all_time_standings(HistoryStore(cache_path, league_id))
+    elif function=="get_career_trophies":
+        sync_season(league, cache)
+        text = get_career_trophies(HistoryStore(cache_path, league_id))
+    elif function=="get_rivalries":
+        sync_season(league, cache)
+        text = get_rivalries(HistoryStore(cache_path, league_id))
+    elif function=="invalidate_cache":
+        # ESPN stat corrections land after the week is over, drop last week so it gets refetched
+        cache.invalidate(week=league.current_week - 1)
+        renders.invalidate(week=league.current_week - 1)
     elif function=="get_final":
         # on Tuesday we need to get the scores of last week
         week = league.current_week - 1
         text = "Final " + get_scoreboard_short(league, week=week)
         text = text + "\n\n" + get_trophies(league, week=week)
     elif function=="init":
-        try:
-            text = os.environ["INIT_MSG"]
-        except KeyError:
-            #do nothing here, empty init message
-            pass
+        #empty init message sends nothing
+        text = config["init_msg"]
     else:
         text = "Something happened. HALP"
 
-    if text != '' and not test:
-        bot.send_message(text)
-        slack_bot.send_message(text)
-        discord_bot.send_message(text)
+    return text
 
-    if test:
-        #print "get_final" function
-        print(text)
+@contextmanager
+def job_metrics(function, config):
+    #Times a bot_main run and traces it as the root span of the job
+    start = time.time()
+    status = 'ok'
+    try:
+        with span('job', function=function, league_id=config.get("league_id")):
+            yield
+    except Exception as e:
+        status = type(e).__name__
+        raise
+    finally:
+        metrics.inc('ffb_bot_jobs_total', function=function, status=status)
+        metrics.observe('ffb_bot_job_seconds', time.time() - start, function=function)
+        if config.get("metrics_file"):
+            metrics.write(config["metrics_file"])
+
+def bot_main(function, config=None, run_id=None):
+    if config is None:
+        config = get_config()
+
+    with job_metrics(function, config):
+        bots = get_bots(config)
+
+        if config["test"]:
+            text = get_text(function, config)
+            send_to_all(bots, "Testing")
+            #print "get_final" function
+            print(text)
+        elif run_id and config["outbox_path"]:
+            deliver(bots, get_outbox(config["outbox_path"]), get_league_key(config), run_id,
+                    lambda: get_text(function, config))
+        else:
+            text = get_text(function, config)
+            if text != '' and config.get("coalesce_seconds"):
+                #messages from jobs scheduled close together go out as one post
+                get_message_batcher(config["coalesce_seconds"]).submit(get_league_key(config), bots, text)
+            elif text != '':
+                send_to_all(bots, text)
+
+async def send_to_all_async(bots, text, timeout=60):
+    #asyncio flavour of send_to_all, each sink gets at most timeout seconds. The bots are blocking, so
+    #every post still holds a thread of the loop's bounded executor while it runs
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(*[asyncio.wait_for(loop.run_in_executor(
+                                         None, contextvars.copy_context().run, timed_send, bot, text), timeout)
+                                     for bot in bots], return_exceptions=True)
+    for bot, result in zip(bots, results):
+        if isinstance(result, Exception):
+            logger.error('Sending to %s failed: %r', bot, result)
+    return list(zip(bots, results))
+
+async def bot_main_async(function, config=None, run_id=None):
+    #espn_api and the bots are blocking, so the ESPN fetches and posts run in the loop's bounded
+    #executor: the loop never waits on I/O, but a running job holds an executor thread like it
+    #would a scheduler thread, there are just never more than MAX_WORKERS of them
+    loop = asyncio.get_running_loop()
+    if config is None:
+        config = get_config()
+
+    with job_metrics(function, config):
+        bots = get_bots(config)
+        if run_id and config["outbox_path"] and not config["test"]:
+            # the outbox is sqlite backed, run the whole delivery off the loop
+            await loop.run_in_executor(None, contextvars.copy_context().run, deliver, bots,
+                                       get_outbox(config["outbox_path"]), get_league_key(config), run_id,
+                                       lambda: get_text(function, config))
+            return
+
+        text = await loop.run_in_executor(None, contextvars.copy_context().run, get_text, function, config)
+
+        if config["test"]:
+            await send_to_all_async(bots, "Testing")
+            print(text)
+        elif text != '' and config.get("coalesce_seconds"):
+            get_message_batcher(config["coalesce_seconds"]).submit(get_league_key(config), bots, text)
+        elif text != '':
+            await send_to_all_async(bots, text)
+
+
+class SingleFlightCache(object):
+    #Caches values for ttl seconds, concurrent misses for the same key all wait on one build
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.values = {}
+        self.inflight = {}
+
+    def __repr__(self):
+        return "SingleFlightCache(%s)" % self.ttl
+
+    def get(self, key, build):
+        with self.lock:
+            cached = self.values.get(key)
+            if cached and cached[0] > time.time():
+                return cached[1]
+            future = self.inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self.inflight[key] = Future()
+        if not leader:
+            return future.result()
+
+        try:
+            value = build()
+        except Exception as e:
+            with self.lock:
+                del self.inflight[key]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            self.values[key] = (time.time() + self.ttl, value)
+            del self.inflight[key]
+        future.set_result(value)
+        return value
+
+#chat commands and the bot_main function that answers them
+COMMANDS = {
+    'scores': 'get_scoreboard_short',
+    'standings': 'get_standings',
+    'power': 'get_power_rankings',
+    'close': 'get_close_scores',
+    'odds': 'get_playoff_odds',
+}
+
+command_cache = SingleFlightCache(60)
+DISCORD_API_URL = 'https://discord.com/api/v10'
+
+def parse_command(text):
+    #Returns the function for "!scores", "/ffb scores" or "scores", or None
+    words = text.strip().lower().split()
+    if words and words[0].startswith('/'):
+        words = words[1:]
+    if not words:
+        return None
+    return COMMANDS.get(words[0].lstrip('!'))
+
+def get_command_text(function, config):
+    #Answers a command from the short lived cache, 20 people asking at once cost one build
+    metrics.inc('ffb_bot_commands_total', function=function)
+    return command_cache.get((get_league_key(config), function),
+                             lambda: get_text(function, dict(config, test=False), render=False))
+
+def verify_slack_request(secret, headers, body):
+    timestamp = headers.get('X-Slack-Request-Timestamp', '0')
+    try:
+        if abs(time.time() - int(timestamp)) > 5 * 60:
+            return False
+    except ValueError:
+        return False
+    expected = 'v0=' + hmac.new(secret.encode(), b'v0:' + timestamp.encode() + b':' + body,
+                                hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, headers.get('X-Slack-Signature', ''))
+
+def verify_discord_request(public_key, headers, body):
+    #Discord signs interactions with ed25519, PyNaCl is only needed when DISCORD_PUBLIC_KEY is set
+    from nacl.exceptions import BadSignatureError
+    from nacl.signing import VerifyKey
+
+    try:
+        VerifyKey(bytes.fromhex(public_key)).verify(headers.get('X-Signature-Timestamp', '').encode() + body,
+                                                    bytes.fromhex(headers.get('X-Signature-Ed25519', '')))
+        return True
+    except (BadSignatureError, ValueError):
+        return False
+
+class CommandHandler(BaseHTTPRequestHandler):
+    #POST /groupme, /slack or /discord, with the league name appended in multi league mode
+    def do_POST(self):
+        parts = urlparse(self.path).path.strip('/').split('/')
+        config = self.server.configs.get(parts[1] if len(parts) > 1 else None)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if config is None:
+            self.send_error(404)
+        elif parts[0] == 'groupme':
+            self.handle_groupme(config, body)
+        elif parts[0] == 'slack':
+            self.handle_slack(config, body)
+        elif parts[0] == 'discord':
+            self.handle_discord(config, body)
+        else:
+            self.send_error(404)
+
+    def handle_groupme(self, config, body):
+        #GroupMe posts every message in the group here, replies go out through the bot
+        message = json.loads(body or b'{}')
+        self.send_json(200, {})
+        function = parse_command(message.get('text', ''))
+        if function and message.get('sender_type') != 'bot':
+            self.reply_later(function, config, GroupMeBot(config["bot_id"]).send_message)
+
+    def handle_slack(self, config, body):
+        #Without a signing secret anyone could make the bot fetch, so Slack commands are off
+        if not config["slack_signing_secret"]:
+            self.send_error(404)
+            return
+        if not verify_slack_request(config["slack_signing_secret"], self.headers, body):
+            self.send_error(401)
+            return
+        form = parse_qs(body.decode())
+        function = parse_command(form.get('text', [''])[0])
+        if function is None:
+            self.send_json(200, {'response_type': 'ephemeral',
+                                 'text': 'Try one of: %s' % ', '.join(sorted(COMMANDS))})
+            return
+        # Slack waits 3 seconds for an answer, acknowledge now and post the text to the response_url
+        self.send_json(200, {'response_type': 'in_channel'})
+        response_url = form.get('response_url', [''])[0]
+        self.reply_later(function, config, lambda text: get_http_client('slack').post(
+            response_url, json={'response_type': 'in_channel', 'text': '```%s```' % text}, timeout=10))
+
+    def handle_discord(self, config, body):
+        #Without a public key anyone could make the bot fetch, so Discord commands are off
+        if not config["discord_public_key"]:
+            self.send_error(404)
+            return
+        if not verify_discord_request(config["discord_public_key"], self.headers, body):
+            self.send_error(401)
+            return
+        interaction = json.loads(body or b'{}')
+        if interaction.get('type') == 1:
+            self.send_json(200, {'type': 1})
+            return
+        function = parse_command(interaction.get('data', {}).get('name', ''))
+        if function is None:
+            self.send_json(200, {'type': 4, 'data': {'content': 'Try one of: %s' % ', '.join(sorted(COMMANDS))}})
+            return
+        # Discord waits 3 seconds too, defer the reply and edit it in once the text is built.
+        # an interaction gets a single reply, keep the first chunk that fits
+        self.send_json(200, {'type': 5})
+        url = '%s/webhooks/%s/%s/messages/@original' % (DISCORD_API_URL, interaction.get('application_id'),
+                                                        interaction.get('token'))
+        self.reply_later(function, config, lambda text: get_http_client('discord').request(
+            'PATCH', url, json={'content': '```%s```' % split_message(text, DiscordBot.max_length - len('``````'))[0]},
+            timeout=10))
+
+    def reply_later(self, function, config, send):
+        #Builds a command's text off the request thread and hands it to send
+        def run():
+            try:
+                send(get_command_text(function, config))
+            except Exception:
+                logger.exception('Answering %s failed', function)
+        threading.Thread(target=run, name='command', daemon=True).start()
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def serve_commands(configs, port, host='0.0.0.0'):
+    #Serves chat command callbacks from a daemon thread, configs maps league name (None when single league) to config
+    server = ThreadingHTTPServer((host, port), CommandHandler)
+    server.configs = configs
+    threading.Thread(target=server.serve_forever, name='commands', daemon=True).start()
+    return server
+
+#waiver reminder:                    wednesday morning at 10:00am EST.
+#power rankings:                     tuesday evening at 6:30pm EST.
+#matchups:                           wednesday evening at 6:30pm EST.
+#close scores (within 15.99 points): monday evening at 7:30pm EST.
+#awards:                             tuesday morning at 8:00pm EST.
+#standings:                          wednesday morning at 8:00am EST.
+#score update:                       friday, monday, and tuesday morning at 8:00am EST.
+#score update:                       sunday at 4pm, 8pm EST.
+JOBS = [
+    #(job id, bot_main function, cron trigger)
+    ('power_rankings', 'get_power_rankings', {'day_of_week': 'tue', 'hour': 18, 'minute': 00}),
+    ('matchups', 'get_matchups', {'day_of_week': 'thu', 'hour': 8, 'minute': 30}),
+    ('close_scores', 'get_close_scores', {'day_of_week': 'mon', 'hour': 20, 'minute': 00}),
+    ('render', 'render_week', {'day_of_week': 'tue', 'hour': 7, 'minute': 30}),
+    ('final', 'get_final', {'day_of_week': 'tue', 'hour': 8, 'minute': 00}),
+    ('scoreboard1', 'get_scoreboard_short', {'day_of_week': 'fri,mon', 'hour': 8, 'minute': 00}),
+    ('scoreboard2', 'get_scoreboard_short', {'day_of_week': 'sun', 'hour': '16,20'}),
+    ('activity', 'get_activity', {'minute': '*/15'}),
+]
+
+#with LIVE_SCORING the fixed sunday score updates are replaced by polling during game windows
+GAME_TIMEZONE = 'America/New_York'
+LIVE_JOBS = [
+    ('live_scores', 'get_score_changes', {'day_of_week': 'sun', 'hour': '9-23', 'timezone': GAME_TIMEZONE}),
+    ('live_scores_primetime', 'get_score_changes', {'day_of_week': 'mon,thu', 'hour': '19-23',
+                                                    'timezone': GAME_TIMEZONE}),
+]
+
+def get_job_signature(func_ref, args, trigger):
+    return '%s %r %r' % (func_ref, tuple(args), trigger)
+
+job_store_classes = {}
+
+def SQLiteJobStore(path):
+    #apscheduler job store on sqlite3 (SQLAlchemyJobStore without SQLAlchemy) so schedules and
+    #next run times survive a restart, imported lazily like the rest of apscheduler
+    if 'sqlite' not in job_store_classes:
+        from apscheduler.job import Job
+        from apscheduler.jobstores.base import BaseJobStore, ConflictingIdError, JobLookupError
+        from apscheduler.util import datetime_to_utc_timestamp, utc_timestamp_to_datetime
+
+        class _SQLiteJobStore(BaseJobStore):
+            def __init__(self, path):
+                super().__init__()
+                self.path = path
+                self.conn = sqlite3.connect(path, check_same_thread=False)
+                self.lock = threading.Lock()
+                self.conn.execute('CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, next_run_time REAL, '
+                                  'job_state BLOB NOT NULL, signature TEXT)')
+                self.conn.execute('CREATE INDEX IF NOT EXISTS jobs_next_run_time ON jobs (next_run_time)')
+                self.conn.commit()
+
+            def __repr__(self):
+                return "SQLiteJobStore(%s)" % self.path
+
+            def signature(self, job_id):
+                with self.lock:
+                    row = self.conn.execute('SELECT signature FROM jobs WHERE id=?', (job_id,)).fetchone()
+                return row[0] if row else None
+
+            def job_ids(self):
+                with self.lock:
+                    return {row[0] for row in self.conn.execute('SELECT id FROM jobs')}
+
+            def lookup_job(self, job_id):
+                with self.lock:
+                    row = self.conn.execute('SELECT job_state FROM jobs WHERE id=?', (job_id,)).fetchone()
+                return self._reconstitute_job(row[0]) if row else None
+
+            def get_due_jobs(self, now):
+                return self._get_jobs('WHERE next_run_time <= ?', (datetime_to_utc_timestamp(now),))
+
+            def get_next_run_time(self):
+                with self.lock:
+                    row = self.conn.execute('SELECT next_run_time FROM jobs WHERE next_run_time IS NOT NULL '
+                                            'ORDER BY next_run_time LIMIT 1').fetchone()
+                return utc_timestamp_to_datetime(row[0]) if row else None
+
+            def get_all_jobs(self):
+                jobs = self._get_jobs()
+                self._fix_paused_jobs_sorting(jobs)
+                return jobs
+
+            def add_job(self, job):
+                try:
+                    with self.lock, self.conn:
+                        self.conn.execute('INSERT INTO jobs VALUES (?, ?, ?, ?)', self._row(job))
+                except sqlite3.IntegrityError:
+                    raise ConflictingIdError(job.id)
+
+            def update_job(self, job):
+                job_id, next_run_time, job_state, signature = self._row(job)
+                with self.lock, self.conn:
+                    updated = self.conn.execute('UPDATE jobs SET next_run_time=?, job_state=?, signature=? '
+                                                'WHERE id=?', (next_run_time, job_state, signature, job_id))
+                if updated.rowcount == 0:
+                    raise JobLookupError(job.id)
+
+            def remove_job(self, job_id):
+                with self.lock, self.conn:
+                    deleted = self.conn.execute('DELETE FROM jobs WHERE id=?', (job_id,))
+                if deleted.rowcount == 0:
+                    raise JobLookupError(job_id)
+
+            def remove_all_jobs(self):
+                with self.lock, self.conn:
+                    self.conn.execute('DELETE FROM jobs')
+
+            def shutdown(self):
+                self.conn.close()
+
+            def _row(self, job):
+                return (job.id, datetime_to_utc_timestamp(job.next_run_time),
+                        pickle.dumps(job.__getstate__(), pickle.HIGHEST_PROTOCOL),
+                        get_job_signature(job.func_ref, job.args, job.trigger))
+
+            def _reconstitute_job(self, job_state):
+                job_state = pickle.loads(job_state)
+                job_state['jobstore'] = self
+                job = Job.__new__(Job)
+                job.__setstate__(job_state)
+                job._scheduler = self._scheduler
+                job._jobstore_alias = self._alias
+                return job
+
+            def _get_jobs(self, where='', params=()):
+                jobs = []
+                failed_job_ids = []
+                with self.lock:
+                    rows = self.conn.execute('SELECT id, job_state FROM jobs %s ORDER BY next_run_time' % where,
+                                             params).fetchall()
+                for job_id, job_state in rows:
+                    try:
+                        jobs.append(self._reconstitute_job(job_state))
+                    except BaseException:
+                        self._logger.exception('Unable to restore job "%s" -- removing it', job_id)
+                        failed_job_ids.append(job_id)
+                if failed_job_ids:
+                    with self.lock, self.conn:
+                        self.conn.executemany('DELETE FROM jobs WHERE id=?', [(job_id,) for job_id in failed_job_ids])
+                return jobs
+
+        job_store_classes['sqlite'] = _SQLiteJobStore
+    return job_store_classes['sqlite'](path)
+
+def add_jobs(sched, config, name=None, asynchronous=False, job_store=None):
+    #Registers the weekly jobs, prefixing ids with the league name in multi league mode.
+    #Jobs already persisted in job_store with the same function, args and trigger are left alone
+    #so a run missed while the bot was down still fires within the misfire grace time
+    from apscheduler.triggers.cron import CronTrigger
+    from apscheduler.util import obj_to_ref
+
+    jobs = JOBS
+    if config["live_scoring"]:
+        live_minutes = '*/%s' % config["live_interval"]
+        jobs = [job for job in JOBS if job[0] != 'scoreboard2'] + \
+            [(job_id, function, dict(trigger, minute=live_minutes)) for job_id, function, trigger in LIVE_JOBS]
+    func = scheduled_job_async if asynchronous else scheduled_job
+    job_ids = []
+    for job_id, function, trigger in jobs:
+        if name is not None:
+            job_id = '%s-%s' % (name, job_id)
+        args = [job_id, name, function]
+        trigger = CronTrigger(start_date=config["start_date"], end_date=config["end_date"],
+                              **dict({'timezone': config["timezone"]}, **trigger))
+        job_triggers[job_id] = trigger
+        job_ids.append(job_id)
+        if job_store is not None and job_store.signature(job_id) == get_job_signature(obj_to_ref(func), args, trigger):
+            continue
+        sched.add_job(func, trigger, args, id=job_id, replace_existing=True)
+    return job_ids
+
+def prune_jobs(job_store, job_ids):
+    #Drops persisted jobs that are no longer configured, e.g. live scoring was switched off
+    for job_id in job_store.job_ids() - set(job_ids):
+        job_store.remove_job(job_id)
+
+
+class LeaseStore(object):
+    #Worker heartbeats and per league leases in sqlite, shared by every worker of a deployment
+    def __init__(self, path, ttl=60):
+        self.path = path
+        self.ttl = ttl
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.lock = threading.Lock()
+        self.conn.execute('CREATE TABLE IF NOT EXISTS workers (worker_id TEXT PRIMARY KEY, heartbeat REAL)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS leases (league TEXT PRIMARY KEY, worker_id TEXT, '
+                          'expires_at REAL)')
+
+    def __repr__(self):
+        return "LeaseStore(%s)" % self.path
+
+    def heartbeat(self, worker_id, now=None):
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO workers VALUES (?, ?)', (worker_id, now or time.time()))
+
+    def workers(self, now=None):
+        #Workers that have checked in within the lease ttl
+        with self.lock:
+            rows = self.conn.execute('SELECT worker_id FROM workers WHERE heartbeat > ? ORDER BY worker_id',
+                                     ((now or time.time()) - self.ttl,)).fetchall()
+        return [row[0] for row in rows]
+
+    def acquire(self, league, worker_id, now=None):
+        #Takes or renews a league's lease, fails while another worker's lease hasn't expired
+        now = now or time.time()
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self.conn.execute('SELECT worker_id, expires_at FROM leases WHERE league=?',
+                                        (league,)).fetchone()
+                acquired = row is None or row[0] == worker_id or row[1] < now
+                if acquired:
+                    self.conn.execute('INSERT OR REPLACE INTO leases VALUES (?, ?, ?)',
+                                      (league, worker_id, now + self.ttl))
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+        return acquired
+
+    def owner(self, league, now=None):
+        with self.lock:
+            row = self.conn.execute('SELECT worker_id FROM leases WHERE league=? AND expires_at >= ?',
+                                    (league, now or time.time())).fetchone()
+        return row[0] if row else None
+
+    def release(self, league, worker_id):
+        with self.lock:
+            self.conn.execute('DELETE FROM leases WHERE league=? AND worker_id=?', (league, worker_id))
+
+    def remove_worker(self, worker_id):
+        with self.lock:
+            self.conn.execute('DELETE FROM leases WHERE worker_id=?', (worker_id,))
+            self.conn.execute('DELETE FROM workers WHERE worker_id=?', (worker_id,))
+
+def get_shard_owner(league, workers):
+    #Rendezvous hashing, a worker joining or leaving only moves the leagues it gains or owned
+    if not workers:
+        return None
+    return max(workers, key=lambda worker_id: hashlib.sha1(('%s:%s' % (league, worker_id)).encode()).hexdigest())
+
+class ShardWorker(object):
+    #Schedules the jobs of the leagues that hash to this worker once it holds their lease
+    def __init__(self, sched, lease_store, configs, worker_id=None, asynchronous=False):
+        self.sched = sched
+        self.lease_store = lease_store
+        self.configs = configs
+        self.worker_id = worker_id or '%s-%s' % (socket.gethostname(), os.getpid())
+        self.asynchronous = asynchronous
+        self.leagues = {}
+
+    def __repr__(self):
+        return "ShardWorker(%s, %s leagues)" % (self.worker_id, len(self.leagues))
+
+    def owns(self, name):
+        return self.lease_store.owner(name) == self.worker_id
+
+    def rebalance(self, now=None):
+        #Heartbeats, renews leases and moves jobs to match the live workers, returns the leagues held
+        self.lease_store.heartbeat(self.worker_id, now)
+        workers = self.lease_store.workers(now)
+        for config in self.configs:
+            name = config["name"]
+            wanted = get_shard_owner(name, workers) == self.worker_id
+            if wanted and self.lease_store.acquire(name, self.worker_id, now):
+                if name not in self.leagues:
+                    logger.info('%s taking over %s', self.worker_id, name)
+                    self.leagues[name] = add_jobs(self.sched, config, name=name, asynchronous=self.asynchronous)
+                    if config["outbox_path"]:
+                        #deliver what the league's last owner rendered but never got to send, once, off the
+                        #lease thread. The periodic retry skips sinks nothing has tried yet
+                        self.sched.add_job(resume_outbox, args=[[config]], id='%s-resume_outbox' % name,
+                                           replace_existing=True)
+            elif name in self.leagues:
+                logger.info('%s handing off %s', self.worker_id, name)
+                for job_id in self.leagues.pop(name):
+                    self.sched.remove_job(job_id)
+                if not wanted:
+                    self.lease_store.release(name, self.worker_id)
+        metrics.set('ffb_bot_shard_leagues', len(self.leagues), worker=self.worker_id)
+        return sorted(self.leagues)
+
+    def stop(self):
+        self.lease_store.remove_worker(self.worker_id)
+
+def warm_up(configs):
+    #Loads (or builds and saves) each league's SNAPSHOT_DIR snapshot in the background so the first job finds it ready
+    def warm():
+        for config in configs:
+            try:
+                get_context(config).get_league()
+            except Exception as e:
+                logger.warning('Warming up league %s failed: %s', config["league_id"], e)
+    thread = threading.Thread(target=warm, name='warm_up', daemon=True)
+    thread.start()
+    return thread
+
+def watch_scheduler(sched):
+    #Records how late each job started relative to its scheduled time, and missed runs
+    from apscheduler.events import EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED
+
+    def listener(event):
+        if event.code == EVENT_JOB_SUBMITTED:
+            for run_time in event.scheduled_run_times:
+                lag = (datetime.now(run_time.tzinfo) - run_time).total_seconds()
+                metrics.observe('ffb_bot_scheduler_lag_seconds', lag, job=event.job_id)
+        else:
+            metrics.inc('ffb_bot_jobs_missed_total', job=event.job_id)
+    sched.add_listener(listener, EVENT_JOB_SUBMITTED | EVENT_JOB_MISSED)
+
+def ready():
+    startup_metrics['cold_start_seconds'] = time.time() - IMPORT_STARTED_AT
+    metrics.set('ffb_bot_cold_start_seconds', startup_metrics['cold_start_seconds'])
+    print("Ready! (%.2fs)" % startup_metrics['cold_start_seconds'])
+
+def async_main(configs, max_workers, multi_league=False, job_store=None):
+    #Runs every job on one event loop with AsyncIOScheduler, thread pool backed: blocking ESPN and
+    #sink I/O goes through a default executor of max_workers threads
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=max_workers))
+    sched = AsyncIOScheduler(event_loop=loop, job_defaults={'misfire_grace_time': 15*60, 'coalesce': True},
+                             jobstores={'default': job_store} if job_store else {})
+
+    watch_scheduler(sched)
+    job_ids = []
+    for config in configs:
+        loop.run_until_complete(bot_main_async("init", config))
+        job_ids += add_jobs(sched, config, name=config["name"] if multi_league else None, asynchronous=True,
+                            job_store=job_store)
+    if job_store:
+        prune_jobs(job_store, job_ids)
+    add_outbox_retry(sched, configs)
+
+    sched.start()
+    ready()
+    loop.run_forever()
+
+def add_lease_renewal(sched, worker, lease_ttl):
+    #Renews well inside the ttl so a live worker never loses its leases. The renewal has an executor
+    #of its own, league jobs holding every default thread can't hold it back
+    from apscheduler.executors.pool import ThreadPoolExecutor as SchedulerThreadPool
+
+    sched.add_executor(SchedulerThreadPool(1), alias='leases')
+    return sched.add_job(worker.rebalance, 'interval', seconds=max(lease_ttl // 3, 1), id='rebalance',
+                         executor='leases')
+
+def shard_main(configs, lease_path, max_workers, worker_id=None, lease_ttl=60):
+    #One worker of a sharded deployment, on this host or another one sharing lease_path
+    global shard_worker
+    from apscheduler.executors.pool import ThreadPoolExecutor as SchedulerThreadPool
+    from apscheduler.schedulers.blocking import BlockingScheduler
+
+    for config in configs:
+        league_configs[config["name"]] = config
+    sched = BlockingScheduler(job_defaults={'misfire_grace_time': 15*60, 'coalesce': True},
+                              executors={'default': SchedulerThreadPool(max_workers)})
+    watch_scheduler(sched)
+    shard_worker = ShardWorker(sched, LeaseStore(lease_path, ttl=lease_ttl), configs, worker_id=worker_id)
+    add_lease_renewal(sched, shard_worker, lease_ttl)
+    add_outbox_retry(sched, configs)
+    shard_worker.rebalance()
+    ready()
+    try:
+        sched.start()
+    finally:
+        shard_worker.stop()
+
+def coordinator_main(configs, lease_path, num_workers, max_workers, lease_ttl=60, poll=5):
+    #Runs num_workers shard worker processes and restarts any that die, their leagues move to
+    #the others as soon as the dead worker's leases expire
+    import multiprocessing
+
+    for config in configs:
+        bot_main("init", config)
+    processes = {}
+    while True:
+        for n in range(num_workers):
+            process = processes.get(n)
+            if process is None or not process.is_alive():
+                if process is not None:
+                    logger.warning('Shard worker %s exited with %s, restarting', n, process.exitcode)
+                process = multiprocessing.Process(target=shard_main, name='shard-%s' % n,
+                                                  args=(configs, lease_path, max_workers),
+                                                  kwargs={'lease_ttl': lease_ttl})
+                process.start()
+                processes[n] = process
+        time.sleep(poll)
 
 
 if __name__ == '__main__':
+    from apscheduler.executors.pool import ThreadPoolExecutor as SchedulerThreadPool
+    from apscheduler.schedulers.blocking import BlockingScheduler
+
     try:
-        ff_start_date = os.environ["START_DATE"]
+        leagues_config = os.environ["LEAGUES_CONFIG"]
     except KeyError:
-        ff_start_date='2021-09-09'
+        leagues_config = None
 
     try:
-        ff_end_date = os.environ["END_DATE"]
+        max_workers = int(os.environ["MAX_WORKERS"])
     except KeyError:
-        ff_end_date='2022-01-04'
+        max_workers = 10
 
     try:
-        my_timezone = os.environ["TIMEZONE"]
+        async_mode = os.environ["ASYNC_MODE"]
     except KeyError:
-        my_timezone='America/New_York'
+        async_mode = False
+
+    try:
+        metrics_port = int(os.environ["METRICS_PORT"])
+    except KeyError:
+        metrics_port = None
+
+    try:
+        trace_file = os.environ["TRACE_FILE"]
+    except KeyError:
+        trace_file = None
 
-    game_timezone='America/New_York'
-    bot_main("init")
-    sched = BlockingScheduler(job_defaults={'misfire_grace_time': 15*60})
-
-    #waiver reminder:                    wednesday morning at 10:00am EST.
-    #power rankings:                     tuesday evening at 6:30pm EST.
-    #matchups:                           wednesday evening at 6:30pm EST.
-    #close scores (within 15.99 points): monday evening at 7:30pm EST.
-    #awards:                             tuesday morning at 8:00pm EST.
-    #standings:                          wednesday morning at 8:00am EST.
-    #score update:                       friday, monday, and tuesday morning at 8:00am EST.
-    #score update:                       sunday at 4pm, 8pm EST.
-
-    sched.add_job(bot_main, 'cron', ['get_power_rankings'], id='power_rankings',
-        day_of_week='tue', hour=18, minute=00, start_date=ff_start_date, end_date=ff_end_date,
-        timezone=my_timezone, replace_existing=True)
-    sched.add_job(bot_main, 'cron', ['get_matchups'], id='matchups',
-        day_of_week='thu', hour=8, minute=30, start_date=ff_start_date, end_date=ff_end_date,
-        timezone=my_timezone, replace_existing=True)
-    sched.add_job(bot_main, 'cron', ['get_close_scores'], id='close_scores',
-        day_of_week='mon', hour=20, minute=00, start_date=ff_start_date, end_date=ff_end_date,
-        timezone=my_timezone, replace_existing=True)
-    sched.add_job(bot_main, 'cron', ['get_final'], id='final',
-        day_of_week='tue', hour=8, minute=00, start_date=ff_start_date, end_date=ff_end_date,
-        timezone=my_timezone, replace_existing=True)
-    sched.add_job(bot_main, 'cron', ['get_scoreboard_short'], id='scoreboard1',
-        day_of_week='fri,mon', hour=8, minute=00, start_date=ff_start_date, end_date=ff_end_date,
-        timezone=my_timezone, replace_existing=True)
-    sched.add_job(bot_main, 'cron', ['get_scoreboard_short'], id='scoreboard2',
-        day_of_week='sun', hour='16,20', start_date=ff_start_date, end_date=ff_end_date,
-        timezone=my_timezone, replace_existing=True)
-
-    print("Ready!")
-    sched.start()
\ No newline at end of file
+    try:
+        job_store = SQLiteJobStore(os.environ["JOB_STORE_PATH"])
+    except KeyError:
+        job_store = None
+
+    try:
+        lease_path = os.environ["SHARD_LEASE_PATH"]
+    except KeyError:
+        lease_path = None
+
+    try:
+        shard_workers = int(os.environ["SHARD_WORKERS"])
+    except KeyError:
+        shard_workers = 1
+
+    try:
+        lease_ttl = int(os.environ["LEASE_TTL"])
+    except KeyError:
+        lease_ttl = 60
+
+    try:
+        command_port = int(os.environ["COMMAND_PORT"])
+    except KeyError:
+        command_port = None
+
+    try:
+        command_cache.ttl = int(os.environ["COMMAND_TTL"])
+    except KeyError:
+        pass
+
+    if metrics_port:
+        serve_metrics(metrics_port)
+    if trace_file:
+        trace_logger.addHandler(logging.FileHandler(trace_file))
+        trace_logger.setLevel(logging.INFO)
+        trace_logger.propagate = False
+
+    if leagues_config:
+        configs = load_league_configs(leagues_config)
+        for config in configs:
+            league_configs[config["name"]] = config
+    else:
+        configs = [get_config()]
+
+    if sys.argv[1:2] == ['backfill']:
+        #python ffb_bot.py backfill FIRST_YEAR fetches FIRST_YEAR up to last season into the week cache
+        for config in configs:
+            years = list(range(int(sys.argv[2]), int(config["year"])))
+            print('%s: backfilled %s weeks' % (config.get("name") or config["league_id"],
+                                               backfill(config, years, max_workers=max_workers)))
+        sys.exit(0)
+
+    if lease_path:
+        #sharded: each league's jobs run on exactly one worker process, here or on another host
+        for config in configs:
+            config["name"] = get_league_key(config)
+        if shard_workers > 1:
+            coordinator_main(configs, lease_path, shard_workers, max_workers, lease_ttl=lease_ttl)
+        else:
+            shard_main(configs, lease_path, max_workers, lease_ttl=lease_ttl)
+        sys.exit(0)
+
+    warm_up([config for config in configs if config["snapshot_dir"]])
+    resume_outbox(configs)
+    if command_port:
+        serve_commands({config["name"] if leagues_config else None: config for config in configs}, command_port)
+    if async_mode:
+        async_main(configs, max_workers, multi_league=bool(leagues_config), job_store=job_store)
+    else:
+        #jobs for every league share one bounded pool instead of a process each
+        sched = BlockingScheduler(job_defaults={'misfire_grace_time': 15*60, 'coalesce': True},
+                                  executors={'default': SchedulerThreadPool(max_workers)},
+                                  jobstores={'default': job_store} if job_store else {})
+        watch_scheduler(sched)
+
+        job_ids = []
+        for config in configs:
+            bot_main("init", config)
+            job_ids += add_jobs(sched, config, name=config["name"] if leagues_config else None,
+                                job_store=job_store)
+        if job_store:
+            prune_jobs(job_store, job_ids)
+        add_outbox_retry(sched, configs)
+
+        ready()
+        sched.start()
@@ -0,0 +1,87 @@
+'''Times the message builders and a full bot_main run offline against generated league fixtures
+
+python -m ffb_bot.tests.benchmark --teams 8 12 32 --weeks 1 9 17
+'''
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+
+
+from ffb_bot import ffb_bot
+from ffb_bot.tests.fake_league import (dump_league, load_league, make_league, )
+
+
+BUILDERS = [
+    ('get_standings', lambda league, cache: ffb_bot.get_standings(league, False)),
+    ('get_standings top half', lambda league, cache: ffb_bot.get_standings(league, True)),
+    ('get_standings top half cached', lambda league, cache: ffb_bot.get_standings(league, True, cache=cache)),
+    ('get_power_rankings', lambda league, cache: ffb_bot.get_power_rankings(league)),
+    ('get_close_scores', lambda league, cache: ffb_bot.get_close_scores(league)),
+    ('get_trophies', lambda league, cache: ffb_bot.get_trophies(league, week=league.current_week - 1)),
+    ('get_season_stats', lambda league, cache: ffb_bot.get_season_stats(league, cache=cache)),
+]
+
+BOT_MAIN_FUNCTIONS = ['get_matchups', 'get_scoreboard_short', 'get_close_scores', 'get_power_rankings',
+                      'get_final', 'get_standings']
+
+
+def measure(func, repeat):
+    # returns (best wall time, peak traced memory) over repeat runs
+    times = []
+    tracemalloc.start()
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def run_bot_main(league, tmp_dir):
+    # every scheduled function through bot_main with ESPN and the sinks swapped out
+    config = ffb_bot.get_config()
+    config.update({'league_id': 'bench', 'bot_id': 'bench', 'top_half_scoring': '1', 'test': False,
+                   'cache_path': os.path.join(tmp_dir, 'bot_main.sqlite3')})
+    ffb_bot.league_contexts.clear()
+    # skip the ESPN rate limiter, nothing goes over the network here
+    with mock.patch.object(ffb_bot, 'League', return_value=league), \
+            mock.patch.object(ffb_bot, 'espn_call', lambda func, *args, **kwargs: func(*args, **kwargs)), \
+            mock.patch.object(ffb_bot, 'send_to_all'):
+        for function in BOT_MAIN_FUNCTIONS:
+            ffb_bot.bot_main(function, config)
+    ffb_bot.league_contexts.clear()
+
+
+def benchmark(teams, weeks, repeat=3, report=print):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for num_teams in teams:
+            for num_weeks in weeks:
+                # fixtures are recorded once and replayed so every run sees identical data
+                path = os.path.join(tmp_dir, 'league_%s_%s.json' % (num_teams, num_weeks))
+                dump_league(make_league(num_teams, num_weeks, seed=num_teams * 100 + num_weeks), path)
+                cache = ffb_bot.WeekCache(os.path.join(tmp_dir, 'cache.sqlite3'), path, 2021)
+                cases = [(name, lambda build=build: build(league, cache)) for name, build in BUILDERS]
+                cases.append(('bot_main', lambda: run_bot_main(league, tmp_dir)))
+                for name, func in cases:
+                    league = load_league(path)
+                    wall, peak = measure(func, repeat)
+                    result = (num_teams, num_weeks, name, wall, league.espn_calls / repeat, peak)
+                    results.append(result)
+                    report('%3s teams %2s weeks  %-30s %9.2fms %7.1f ESPN calls %9.1fKiB' %
+                           (num_teams, num_weeks, name, wall * 1000, league.espn_calls / repeat, peak / 1024))
+                cache.conn.close()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--teams', type=int, nargs='+', default=[8, 12, 16, 32])
+    parser.add_argument('--weeks', type=int, nargs='+', default=[1, 9, 17])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    benchmark(args.teams, args.weeks, args.repeat)
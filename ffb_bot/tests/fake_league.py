@@ -0,0 +1,156 @@
+import json
+import random
+from types import SimpleNamespace
+
+
+from espn_api.football import League
+
+
+STARTER_SLOTS = ['QB', 'RB', 'RB', 'WR', 'WR', 'TE', 'RB/WR/TE', 'D/ST', 'K']
+FIRST_NAMES = ['Patrick', 'Josh', 'Derrick', 'Davante', 'Travis', 'Justin', 'Cooper', 'Tyreek', 'Aaron', 'Dalvin']
+LAST_NAMES = ['Mahomes', 'Allen', 'Henry', 'Adams', 'Kelce', 'Jefferson', 'Kupp', 'Hill', 'Jones', 'Cook']
+
+
+class FakeLeague(object):
+    '''Offline stand-in for espn_api's League, counts ESPN fetches'''
+
+    def __init__(self, team_names, week_scores, current_week=None, lineups=None):
+        # week_scores: {week: [(home_idx, home_score, away_idx, away_score), ...]}
+        # lineups: {(week, team_idx): [player, ...]}
+        self.teams = [SimpleNamespace(team_id=idx + 1, team_name=name, team_abbrev=name[:4].upper(),
+                                      wins=0, losses=0, streak_length=0, streak_type='WIN',
+                                      scores=[], mov=[], schedule=[])
+                      for idx, name in enumerate(team_names)]
+        self.week_scores = week_scores
+        self.lineups = lineups or {}
+        self.current_week = current_week or max(week_scores) + 1
+        self.settings = SimpleNamespace(reg_season_count=max(week_scores), playoff_team_count=min(4, len(team_names)))
+        self.box_score_calls = []
+        self.power_ranking_calls = []
+        self.scoreboard_calls = []
+
+    def __repr__(self):
+        return "FakeLeague(%s teams)" % len(self.teams)
+
+    @property
+    def espn_calls(self):
+        return len(self.box_score_calls) + len(self.power_ranking_calls)
+
+    def box_scores(self, week=None):
+        week = week or self.current_week
+        self.box_score_calls.append(week)
+        return [SimpleNamespace(home_team=self.teams[home], home_score=home_score,
+                                away_team=self.teams[away] if away is not None else 0, away_score=away_score,
+                                home_lineup=self.lineups.get((week, home), []),
+                                away_lineup=self.lineups.get((week, away), []))
+                for home, home_score, away, away_score in self.week_scores.get(week, [])]
+
+    def scoreboard(self, week=None):
+        # espn_api's Matchups, team ids and scores only
+        week = week or self.current_week
+        self.scoreboard_calls.append(week)
+        return [SimpleNamespace(_home_team_id=self.teams[home].team_id, home_score=home_score,
+                                _away_team_id=self.teams[away].team_id if away is not None else 0,
+                                away_score=away_score)
+                for home, home_score, away, away_score in self.week_scores.get(week, [])]
+
+    def power_rankings(self, week=None):
+        # espn_api computes power rankings locally from teams, replay its own code
+        self.power_ranking_calls.append(week)
+        return League.power_rankings(self, week=week)
+
+    def refresh(self):
+        pass
+
+
+def make_player(name, points=0, projected_points=10, game_played=0, slot_position='RB', playerId=None):
+    return SimpleNamespace(name=name, points=points, projected_points=projected_points,
+                           game_played=game_played, slot_position=slot_position, playerId=playerId)
+
+
+def make_league(num_teams=10, num_weeks=13, seed=0, bench=6):
+    '''Generates a deterministic season, weeks before num_weeks are final and num_weeks is in progress'''
+    rng = random.Random(seed)
+    names = ['Team %s %s' % (LAST_NAMES[i % len(LAST_NAMES)], i) for i in range(num_teams)]
+    slots = list(range(num_teams)) + ([None] if num_teams % 2 else [])
+    week_scores = {}
+    lineups = {}
+    player_id = 0
+    for week in range(1, num_weeks + 1):
+        # circle method round robin, None is a bye
+        offset = (week - 1) % (len(slots) - 1)
+        order = [slots[0]] + (slots[1:][offset:] + slots[1:][:offset])
+        pairs = [(order[i], order[-1 - i]) for i in range(len(order) // 2)]
+        pairs = [(home, away) if home is not None else (away, home) for home, away in pairs]
+        in_progress = week == num_weeks
+        matchups = []
+        for home, away in pairs:
+            scores = []
+            for team in (home, away):
+                if team is None:
+                    scores.append(0)
+                    continue
+                lineup = []
+                for slot in STARTER_SLOTS + ['BE'] * bench:
+                    player_id += 1
+                    played = 100 if not in_progress or rng.random() < 0.6 else 0
+                    projected = round(rng.uniform(2, 25), 1)
+                    points = round(rng.gauss(projected, 6), 1) if played else 0
+                    lineup.append(make_player('%s %s' % (rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)),
+                                              points, projected, played, slot, player_id))
+                lineups[(week, team)] = lineup
+                scores.append(round(sum(p.points for p in lineup if p.slot_position != 'BE'), 2))
+            matchups.append((home, scores[0], away, scores[1]))
+        week_scores[week] = matchups
+
+    league = FakeLeague(names, week_scores, current_week=num_weeks, lineups=lineups)
+    set_records(league)
+    return league
+
+
+def set_records(league):
+    '''Fills in the schedule, and wins, losses and streaks from finished weeks, like espn_api's Team'''
+    for week in sorted(league.week_scores):
+        for home, home_score, away, away_score in league.week_scores[week]:
+            if away is None:
+                continue
+            for team, score, opponent, opponent_score in ((home, home_score, away, away_score),
+                                                          (away, away_score, home, home_score)):
+                t = league.teams[team]
+                # like ESPN the schedule is known for the whole season, results only for finished weeks
+                t.schedule.append(league.teams[opponent])
+                if week >= league.current_week:
+                    continue
+                t.scores.append(score)
+                t.mov.append(score - opponent_score)
+                result = 'WIN' if score > opponent_score else 'LOSS'
+                if result == 'WIN':
+                    t.wins += 1
+                else:
+                    t.losses += 1
+                t.streak_length = t.streak_length + 1 if t.streak_type == result else 1
+                t.streak_type = result
+
+
+def dump_league(league, path):
+    '''Records a league's teams, scores and lineups as a json fixture'''
+    data = {'team_names': [t.team_name for t in league.teams],
+            'current_week': league.current_week,
+            'week_scores': {week: matchups for week, matchups in league.week_scores.items()},
+            'lineups': [[week, team, [vars(p) for p in lineup]]
+                        for (week, team), lineup in league.lineups.items()]}
+    with open(path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+
+
+def load_league(path):
+    '''Replays a fixture written by dump_league'''
+    with open(path) as f:
+        data = json.load(f)
+    league = FakeLeague(data['team_names'],
+                        {int(week): [tuple(m) for m in matchups] for week, matchups in data['week_scores'].items()},
+                        current_week=data['current_week'],
+                        lineups={(week, team): [make_player(**p) for p in lineup]
+                                 for week, team, lineup in data['lineups']})
+    set_records(league)
+    return league
@@ -0,0 +1,172 @@
+'''Runs N leagues' weekly schedule through bot_main at an accelerated clock against the local stubs
+
+python -m ffb_bot.tests.load_test --leagues 20 --speed 3600 --latency 0.05 --error-rate 0.01 --rate-limit-rate 0.02
+'''
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+
+from apscheduler.schedulers.background import BackgroundScheduler
+
+
+from ffb_bot import ffb_bot
+from ffb_bot.tests.fake_league import make_league
+from ffb_bot.tests.stubs import (start_espn_stub, start_sink_stub, )
+
+
+# a Tuesday inside the default START_DATE/END_DATE season
+WEEK_START = datetime(2021, 10, 5, tzinfo=timezone.utc)
+SUCCESS_STATUSES = {'GroupMeBot': 202, 'SlackBot': 200, 'DiscordBot': 204}
+
+
+def make_configs(num_leagues, espn_url, sinks_url, tmp_dir):
+    # one config per league, every ESPN request and post goes to the stubs
+    configs = {}
+    for n in range(num_leagues):
+        name = 'league%s' % n
+        config = ffb_bot.get_config()
+        config.update({'name': name, 'league_id': str(1000 + n), 'year': 2021, 'test': False,
+                       'bot_id': 'bot%s' % n, 'groupme_post_url': sinks_url + '/groupme',
+                       'slack_webhook_url': '%s/slack/%s' % (sinks_url, name),
+                       'discord_webhook_url': '%s/discord/%s' % (sinks_url, name),
+                       'espn_base_url': espn_url + '/ffl',
+                       'cache_path': os.path.join(tmp_dir, 'cache.sqlite3'),
+                       'outbox_path': os.path.join(tmp_dir, 'outbox.sqlite3')})
+        configs[name] = config
+    return configs
+
+
+def get_events(configs, start=WEEK_START, days=7, jobs=None):
+    # (fire time, league name, job id, function) for every run in the window, from the real triggers
+    sched = BackgroundScheduler()
+    for name, config in configs.items():
+        ffb_bot.add_jobs(sched, config, name=name)
+    end = start + timedelta(days=days)
+    events = []
+    for job in sched.get_jobs():
+        job_id, name, function = job.args
+        if jobs is not None and job_id[len(name) + 1:] not in jobs:
+            continue
+        fire_time = job.trigger.get_next_fire_time(None, start)
+        while fire_time is not None and fire_time < end:
+            events.append((fire_time, name, job_id, function))
+            fire_time = job.trigger.get_next_fire_time(fire_time, fire_time + timedelta(microseconds=1))
+    return sorted(events)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[int(round(q * (len(values) - 1)))] if values else 0
+
+
+def send_counts():
+    # {(sink, status): sends} from the process metrics
+    return {(dict(labels)['sink'], dict(labels)['status']): value
+            for (name, labels), value in list(ffb_bot.metrics.counters.items()) if name == 'ffb_bot_sends_total'}
+
+
+def sum_by_status(counts):
+    totals = {}
+    for (name, status), count in counts.items():
+        totals[status] = totals.get(status, 0) + count
+    return totals
+
+
+def replay(events, configs, start, speed, workers):
+    # fires each run at its scheduled time divided by speed, latency is from then until the run is done
+    def run(fire_time, name, job_id, function, due):
+        ok = True
+        try:
+            ffb_bot.bot_main(function, configs[name], run_id='%s@%s' % (job_id, fire_time.isoformat()))
+        except Exception:
+            ok = False
+        return function, ok, time.perf_counter() - due
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for fire_time, name, job_id, function in events:
+            due = started + (fire_time - start).total_seconds() / speed
+            if due > time.perf_counter():
+                time.sleep(due - time.perf_counter())
+            futures.append(executor.submit(run, fire_time, name, job_id, function, due))
+        results = [future.result() for future in futures]
+    return results, time.perf_counter() - started
+
+
+def load_test(num_leagues=10, num_teams=10, num_weeks=5, speed=3600, workers=16, jobs=None, latency=0,
+              error_rate=0, rate_limit_rate=0, retry_after=0, client_rate=None, report=print):
+    espn = start_espn_stub({1000 + n: make_league(num_teams, num_weeks, seed=n) for n in range(num_leagues)},
+                           latency=latency, error_rate=error_rate, rate_limit_rate=rate_limit_rate,
+                           retry_after=retry_after, seed=1)
+    sinks = start_sink_stub(latency=latency, error_rate=error_rate, rate_limit_rate=rate_limit_rate,
+                            retry_after=retry_after, seed=2)
+    clients = dict(ffb_bot.http_clients)
+    if client_rate:
+        # the production limits are per host, raise them to find where the pipeline itself tops out
+        for name in ('espn', 'groupme', 'slack', 'discord'):
+            ffb_bot.http_clients[name] = ffb_bot.HttpClient(session=ffb_bot.get_http_session(name),
+                                                            rate=client_rate, burst=client_rate)
+    ffb_bot.league_contexts.clear()
+    before = send_counts()
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            configs = make_configs(num_leagues, espn.url, sinks.url, tmp_dir)
+            events = get_events(configs, jobs=jobs)
+            results, seconds = replay(events, configs, WEEK_START, speed, workers)
+    finally:
+        espn.stop()
+        sinks.stop()
+        ffb_bot.league_contexts.clear()
+        ffb_bot.http_clients.clear()
+        ffb_bot.http_clients.update(clients)
+
+    latencies = [latency for function, ok, latency in results]
+    summary = {'jobs': len(results), 'failed': sum(1 for function, ok, latency in results if not ok),
+               'seconds': seconds, 'jobs_per_second': len(results) / seconds if seconds else 0,
+               'p50': percentile(latencies, 0.5), 'p99': percentile(latencies, 0.99), 'sinks': {}}
+    after = send_counts()
+    for (sink, status), value in after.items():
+        sent = value - before.get((sink, status), 0)
+        if status == 'skipped' or not sent:
+            continue
+        delivered, failed = summary['sinks'].get(sink, (0, 0))
+        if status == SUCCESS_STATUSES.get(sink):
+            delivered += sent
+        else:
+            failed += sent
+        summary['sinks'][sink] = (delivered, failed)
+
+    report('%s leagues, %s jobs in %.1fs: %.1f jobs/s, %s failed, latency p50 %.0fms p99 %.0fms' %
+           (num_leagues, summary['jobs'], seconds, summary['jobs_per_second'], summary['failed'],
+            summary['p50'] * 1000, summary['p99'] * 1000))
+    for sink, (delivered, failed) in sorted(summary['sinks'].items()):
+        report('  %-10s %6s delivered %5s failed %6.1f%%' %
+               (sink, delivered, failed, 100.0 * delivered / (delivered + failed)))
+    report('  ESPN stub:  %s' % ', '.join('%s %s' % (status, count) for status, count in
+                                          sorted(sum_by_status(espn.counts).items())))
+    report('  sink stub:  %s' % ', '.join('%s %s' % (status, count) for status, count in
+                                          sorted(sum_by_status(sinks.counts).items())))
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--leagues', type=int, default=10)
+    parser.add_argument('--teams', type=int, default=10)
+    parser.add_argument('--weeks', type=int, default=5, help='the last week is in progress')
+    parser.add_argument('--speed', type=float, default=3600, help='simulated seconds per wall second')
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--jobs', nargs='+', help='job ids to run, e.g. final activity, default all')
+    parser.add_argument('--latency', type=float, default=0, help='stub seconds per request')
+    parser.add_argument('--error-rate', type=float, default=0, help='share of stub requests that 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0, help='share of stub requests that 429')
+    parser.add_argument('--retry-after', type=float, default=0)
+    parser.add_argument('--client-rate', type=float, help='requests per second per host, default the bot\'s own')
+    args = parser.parse_args()
+    load_test(args.leagues, args.teams, args.weeks, args.speed, args.workers, args.jobs, args.latency,
+              args.error_rate, args.rate_limit_rate, args.retry_after, args.client_rate)
@@ -0,0 +1,253 @@
+'''Local stand-ins for ESPN and the GroupMe, Slack and Discord webhooks, with injectable latency and faults
+
+Point a league's config at them with ESPN_BASE_URL=<espn.url>, GROUPME_POST_URL=<sinks.url>/groupme,
+SLACK_WEBHOOK_URL=<sinks.url>/slack/<league> and DISCORD_WEBHOOK_URL=<sinks.url>/discord/<league>.
+'''
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+# espn_api's POSITION_MAP ids for the fixture lineup slots
+SLOT_IDS = {'QB': 0, 'RB': 2, 'WR': 4, 'TE': 6, 'D/ST': 16, 'K': 17, 'BE': 20, 'IR': 21, 'RB/WR/TE': 23}
+# players whose game is over play for the first pro team, the rest for the second
+PLAYED_PRO_TEAM = 1
+UNPLAYED_PRO_TEAM = 2
+PAST_GAME = 946684800000
+FUTURE_GAME = 4102444800000
+
+
+class StubServer(ThreadingHTTPServer):
+    '''Threaded HTTP server that sleeps latency seconds per request and fails a share of them'''
+    daemon_threads = True
+
+    def __init__(self, handler, latency=0, error_rate=0, rate_limit_rate=0, retry_after=0, seed=0,
+                 host='127.0.0.1', port=0):
+        super().__init__((host, port), handler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def __repr__(self):
+        return "StubServer(%s)" % self.url
+
+    @property
+    def url(self):
+        return 'http://%s:%s' % self.server_address[:2]
+
+    def record(self, name, status):
+        with self.lock:
+            self.counts[(name, status)] += 1
+
+    def roll(self):
+        with self.lock:
+            return self.random.random()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # keep-alive like the real services, every response has a Content-Length
+    protocol_version = 'HTTP/1.1'
+
+    def fault(self, name):
+        # sleeps, then answers 429 or 500 for the server's share of requests, True if it did
+        time.sleep(self.server.latency)
+        roll = self.server.roll()
+        if roll < self.server.rate_limit_rate:
+            self.send_body(name, 429, b'', {'Retry-After': str(self.server.retry_after)})
+            return True
+        if roll < self.server.rate_limit_rate + self.server.error_rate:
+            self.send_body(name, 500, b'')
+            return True
+        return False
+
+    def send_body(self, name, status, body, headers=None):
+        self.server.record(name, status)
+        self.send_response(status)
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, name, data, status=200):
+        self.send_body(name, status, json.dumps(data, separators=(',', ':')).encode(),
+                       {'Content-Type': 'application/json'})
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def log_message(self, *args):
+        pass
+
+
+def espn_player_entry(player, year, week):
+    # a roster entry as the box score views return it
+    slot = SLOT_IDS.get(player.slot_position, 20)
+    position = SLOT_IDS['RB'] if slot in (SLOT_IDS['BE'], SLOT_IDS['IR'], SLOT_IDS['RB/WR/TE']) else slot
+    stats = [{'seasonId': year, 'scoringPeriodId': week, 'statSourceId': 1, 'appliedTotal': player.projected_points}]
+    if player.game_played:
+        stats.append({'seasonId': year, 'scoringPeriodId': week, 'statSourceId': 0,
+                      'appliedTotal': player.points, 'proTeamId': PLAYED_PRO_TEAM})
+    return {'lineupSlotId': slot, 'playerId': player.playerId,
+            'playerPoolEntry': {'id': player.playerId, 'player': {
+                'id': player.playerId, 'fullName': player.name, 'defaultPositionId': position,
+                'eligibleSlots': [position], 'stats': stats,
+                'proTeamId': PLAYED_PRO_TEAM if player.game_played else UNPLAYED_PRO_TEAM}}}
+
+
+def espn_schedule(league, year, weeks, rosters=False):
+    # matchups for weeks, finished weeks have a winner
+    schedule = []
+    for week in weeks:
+        for home, home_score, away, away_score in league.week_scores.get(week, []):
+            finished = week < league.current_week
+            matchup = {'matchupPeriodId': week, 'home': {'teamId': home + 1, 'totalPoints': home_score}}
+            if away is not None:
+                matchup['away'] = {'teamId': away + 1, 'totalPoints': away_score}
+            if finished and away is not None:
+                matchup['winner'] = 'HOME' if home_score > away_score else 'AWAY'
+            else:
+                matchup['winner'] = 'UNDECIDED'
+            for side, team in (('home', home), ('away', away)):
+                if side in matchup:
+                    if not finished and not rosters:
+                        matchup[side]['totalPoints'] = 0
+                    if rosters:
+                        matchup[side]['rosterForCurrentScoringPeriod'] = {'entries': [
+                            espn_player_entry(p, year, week) for p in league.lineups.get((week, team), [])]}
+            schedule.append(matchup)
+    return schedule
+
+
+def espn_league(league, league_id, year):
+    # the mTeam, mRoster, mMatchup, mSettings and mStandings views in one
+    weeks = sorted(league.week_scores)
+    teams = [{'id': t.team_id, 'abbrev': t.team_abbrev, 'name': t.team_name, 'divisionId': 0, 'playoffSeed': 0,
+              'roster': {'entries': []},
+              'record': {'overall': {'wins': t.wins, 'losses': t.losses, 'ties': 0,
+                                     'pointsFor': sum(t.scores), 'pointsAgainst': sum(t.scores) - sum(t.mov),
+                                     'streakLength': t.streak_length, 'streakType': t.streak_type}}}
+             for t in league.teams]
+    settings = {'name': 'League %s' % league_id, 'size': len(league.teams),
+                'scheduleSettings': {'matchupPeriodCount': league.settings.reg_season_count,
+                                     'matchupPeriods': {str(week): [week] for week in weeks},
+                                     'playoffTeamCount': league.settings.playoff_team_count,
+                                     'playoffSeedingRule': 'TOTAL_POINTS_SCORED'},
+                'tradeSettings': {'vetoVotesRequired': 4}, 'draftSettings': {'keeperCount': 0},
+                'scoringSettings': {'matchupTieRule': 'NONE', 'playoffMatchupTieRule': 'NONE', 'scoringItems': []},
+                'acquisitionSettings': {'isUsingAcquisitionBudget': False}, 'rosterSettings': {'lineupSlotCounts': {}}}
+    return {'id': int(league_id), 'seasonId': year, 'scoringPeriodId': league.current_week,
+            'status': {'currentMatchupPeriod': league.current_week, 'firstScoringPeriod': 1,
+                       'finalScoringPeriod': 17, 'latestScoringPeriod': league.current_week, 'previousSeasons': []},
+            'settings': settings, 'members': [], 'teams': teams, 'schedule': espn_schedule(league, year, weeks)}
+
+
+def espn_pro_schedule(weeks):
+    # one pro game a week that is long over and one that hasn't kicked off
+    def games(date):
+        return {str(week): [{'homeProTeamId': PLAYED_PRO_TEAM, 'awayProTeamId': UNPLAYED_PRO_TEAM, 'date': date}]
+                for week in weeks}
+    return {'settings': {'proTeams': [{'id': PLAYED_PRO_TEAM, 'proGamesByScoringPeriod': games(PAST_GAME)},
+                                      {'id': UNPLAYED_PRO_TEAM, 'proGamesByScoringPeriod': games(FUTURE_GAME)}]}}
+
+
+class EspnStubHandler(StubHandler):
+    '''Serves the ESPN fantasy views espn_api and EspnFetcher read from the server's FakeLeagues
+
+    server.leagues maps league id strings to FakeLeagues and server.topics league ids to transaction topics.
+    '''
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        views = params.get('view', [])
+        name = ','.join(views) or url.path
+        if self.fault(name):
+            return
+        parts = url.path.strip('/').split('/')
+        # ffl/seasons/<year>[/players | /segments/0/leagues/<id>[/communication]]
+        if len(parts) < 3 or parts[:2] != ['ffl', 'seasons']:
+            return self.send_json(name, {'messages': ['Not found']}, 404)
+        year = int(parts[2])
+        weeks = sorted({week for league in self.server.leagues.values() for week in league.week_scores})
+        if len(parts) == 3:
+            return self.send_json(name, espn_pro_schedule(weeks))
+        if parts[3] == 'players':
+            players = {p.playerId: p.name for league in self.server.leagues.values()
+                       for lineup in league.lineups.values() for p in lineup}
+            return self.send_json(name, [{'id': player_id, 'fullName': player_name}
+                                         for player_id, player_name in players.items()])
+        league_id = parts[6] if len(parts) > 6 else None
+        league = self.server.leagues.get(league_id)
+        if league is None:
+            return self.send_json(name, {'messages': ['League not found']}, 404)
+        filters = json.loads(self.headers.get('x-fantasy-filter') or '{}')
+
+        if parts[7:] == ['communication']:
+            topic_filter = filters.get('topics', {})
+            offset = topic_filter.get('offset', 0)
+            topics = sorted(self.server.topics.get(league_id, []), key=lambda t: t['date'], reverse=True)
+            return self.send_json(name, {'topics': topics[offset:offset + topic_filter.get('limit', 25)]})
+        if 'mDraftDetail' in views:
+            return self.send_json(name, {'draftDetail': {'drafted': False}})
+        if 'mPositionalRatings' in views:
+            return self.send_json(name, {})
+        if 'mMatchupScore' in views:
+            week = int(params.get('scoringPeriodId', [league.current_week])[0])
+            periods = filters.get('schedule', {}).get('filterMatchupPeriodIds', {}).get('value', [week])
+            return self.send_json(name, {'schedule': espn_schedule(league, year, [int(p) for p in periods],
+                                                                   rosters=True)})
+        return self.send_json(name, espn_league(league, league_id, year))
+
+
+class SinkStubHandler(StubHandler):
+    '''Accepts GroupMe bot posts on /groupme and Slack and Discord webhooks on /slack/... and /discord/...
+
+    server.posts collects (sink, path, text) of every accepted post.
+    '''
+    statuses = {'groupme': 202, 'slack': 200, 'discord': 204}
+
+    def do_POST(self):
+        sink = urlparse(self.path).path.strip('/').split('/')[0]
+        body = self.read_body()
+        if sink not in self.statuses:
+            return self.send_body(sink, 404, b'')
+        if self.fault(sink):
+            return
+        message = json.loads(body or b'{}')
+        with self.server.lock:
+            self.server.posts.append((sink, self.path, message.get('text', message.get('content'))))
+        self.send_body(sink, self.statuses[sink], b'' if sink == 'discord' else b'ok')
+
+
+def start_espn_stub(leagues, topics=None, **options):
+    '''Starts an ESPN stub serving {league id: FakeLeague}, options are StubServer's'''
+    server = StubServer(EspnStubHandler, **options)
+    server.leagues = {str(league_id): league for league_id, league in leagues.items()}
+    server.topics = topics or {}
+    return server.start()
+
+
+def start_sink_stub(**options):
+    '''Starts a GroupMe, Slack and Discord stub, options are StubServer's'''
+    server = StubServer(SinkStubHandler, **options)
+    server.posts = []
+    return server.start()
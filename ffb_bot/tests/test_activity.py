@@ -0,0 +1,147 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import urlparse
+
+
+import requests
+
+
+from ffb_bot import ffb_bot
+from ffb_bot.ffb_bot import (ActivityStore, EspnFetcher, HttpClient, get_activity, get_config, get_text, )
+from ffb_bot.tests.fake_league import make_league
+
+
+class StubActivityHandler(BaseHTTPRequestHandler):
+    # serves the server's transaction topics newest first, paged by the filter's offset and limit,
+    # and the names of the players asked for
+    def do_GET(self):
+        filters = json.loads(self.headers['x-fantasy-filter'])
+        if 'players' in filters:
+            ids = filters['players']['filterIds']['value']
+            self.server.player_requests.append(ids)
+            body = json.dumps({'players': [{'id': i, 'player': {'fullName': self.server.players[i]}}
+                                           for i in ids if i in self.server.players]}).encode()
+        else:
+            filters = filters['topics']
+            self.server.requests.append((urlparse(self.path).path, filters))
+            topics = sorted(self.server.topics, key=lambda t: t['date'], reverse=True)
+            body = json.dumps({'topics': topics[filters['offset']:filters['offset'] + filters['limit']]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_topic(date, message_type, target, **teams):
+    return {'id': 'topic%s' % date, 'date': date,
+            'messages': [dict(teams, messageTypeId=message_type, targetId=target)]}
+
+
+class ActivityTestCase(unittest.TestCase):
+    '''Test the league activity feed and its high-water mark'''
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'cache.sqlite3')
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubActivityHandler)
+        self.server.topics = [make_topic(date, 178, 1000 + date, to=1) for date in range(1, 201)]
+        self.server.requests = []
+        self.server.players = {5: 'Tyreek Hill', 1201: 'Davante Adams', 1202: 'Travis Kelce'}
+        self.server.player_requests = []
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        self.base_url = 'http://127.0.0.1:%s/ffl' % self.server.server_port
+        client = HttpClient(session=requests.Session(), rate=1000, burst=1000)
+        self.fetcher = EspnFetcher(123, 2021, base_url=self.base_url, client=client)
+        self.store = ActivityStore(self.path, 123, 2021)
+        self.league = make_league(4, 3)
+        self.league.player_map = {1201: 'Davante Adams', 1202: 'Travis Kelce'}
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.store.conn.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def poll(self):
+        self.server.requests.clear()
+        return get_activity(self.league, self.fetcher, self.store)
+
+    def test_only_new_transactions(self):
+        '''Is the backlog skipped and each new transaction posted once, oldest first?'''
+        self.assertEqual(self.poll(), '')
+        self.assertEqual(self.store.get(), (200, {'topic200'}))
+        self.server.topics += [make_topic(201, 180, 1201, to=2, **{'from': 12}),
+                               make_topic(202, 244, 1202, to=3, **{'from': 4})]
+        self.assertEqual(self.poll(), 'League Activity:\n'
+                                      'Team Allen 1 claimed Davante Adams for $12\n'
+                                      'Team Adams 3 traded Travis Kelce to Team Henry 2')
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.server.requests[0][0], '/ffl/seasons/2021/segments/0/leagues/123/communication/')
+        self.assertEqual(self.poll(), '')
+
+    def test_constant_cost(self):
+        '''Does a poll read one page however long the season, and page only for a burst?'''
+        self.poll()
+        self.server.topics += [make_topic(date, 179, 5, to=1) for date in range(201, 231)]
+        lines = self.poll().split('\n')
+        self.assertEqual(len(lines), 31)
+        self.assertEqual(lines[1], 'Team Mahomes 0 dropped Tyreek Hill')
+        self.assertEqual([filters['offset'] for path, filters in self.server.requests], [0, 25])
+        self.poll()
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_player_names(self):
+        '''Are only the players in a digest looked up, once, and unknown ones shown by id?'''
+        self.poll()
+        self.server.topics += [make_topic(201, 178, 5, to=1), make_topic(202, 178, 6, to=1),
+                               make_topic(203, 178, 1201, to=1)]
+        self.assertEqual(self.poll().split('\n')[1:], ['Team Mahomes 0 added Tyreek Hill',
+                                                       'Team Mahomes 0 added Player 6',
+                                                       'Team Mahomes 0 added Davante Adams'])
+        self.assertEqual(self.server.player_requests, [[5, 6]])
+        self.server.topics.append(make_topic(204, 179, 5, to=1))
+        self.assertEqual(self.poll(), 'League Activity:\nTeam Mahomes 0 dropped Tyreek Hill')
+        self.assertEqual(self.server.player_requests, [[5, 6]])
+
+    def test_same_millisecond(self):
+        '''Is a transaction at the same time as the mark still posted?'''
+        self.poll()
+        self.server.topics.append(dict(make_topic(200, 178, 1201, to=1), id='other'))
+        self.assertEqual(self.poll(), 'League Activity:\nTeam Mahomes 0 added Davante Adams')
+        self.assertEqual(self.store.get(), (200, {'topic200', 'other'}))
+
+    def test_scheduled_job(self):
+        '''Does the get_activity job post through the configured ESPN base url?'''
+        patchers = [mock.patch.object(ffb_bot, 'League', return_value=self.league),
+                    mock.patch.dict(os.environ, {"LEAGUE_ID": "123", "LEAGUE_YEAR": "2021",
+                                                 "ESPN_BASE_URL": self.base_url}, clear=True)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(ffb_bot.league_contexts.clear)
+        config = get_config()
+        config['cache_path'] = self.path
+        self.assertEqual(get_text('get_activity', config), '')
+        self.server.topics.append(make_topic(300, 178, 1202, to=2))
+        self.assertEqual(get_text('get_activity', config), 'League Activity:\nTeam Allen 1 added Travis Kelce')
+
+        # an expired league isn't refreshed just to read the activity feed
+        ffb_bot.get_context(config).fetched_at = 0
+        self.server.topics.append(make_topic(301, 178, 1201, to=2))
+        with mock.patch.object(self.league, 'refresh') as refresh:
+            self.assertEqual(get_text('get_activity', config), 'League Activity:\nTeam Allen 1 added Davante Adams')
+        refresh.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import asyncio
+import os
+import time
+import unittest
+from unittest import mock
+
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+
+from ffb_bot import ffb_bot
+from ffb_bot.ffb_bot import (JOBS, add_jobs, bot_main_async, get_config, scheduled_job_async, send_to_all_async, )
+
+
+class SlowBot(object):
+    def __init__(self, delay):
+        self.delay = delay
+
+    def send_message(self, text):
+        time.sleep(self.delay)
+        return text
+
+
+class AsyncTestCase(unittest.IsolatedAsyncioTestCase):
+    '''Test the asyncio execution mode'''
+
+    async def test_send_to_all_async(self):
+        '''Does a hung sink time out without holding up the others?'''
+        start = time.time()
+        results = await send_to_all_async([SlowBot(0), SlowBot(1), SlowBot(0.1)], 'This is a test.', timeout=0.3)
+        self.assertLess(time.time() - start, 0.9)
+        self.assertEqual(results[0][1], 'This is a test.')
+        self.assertIsInstance(results[1][1], asyncio.TimeoutError)
+        self.assertEqual(results[2][1], 'This is a test.')
+
+    async def test_jobs_overlap(self):
+        '''Do jobs overlap on I/O instead of running one after another?'''
+        def get_text(function, config):
+            time.sleep(0.2)
+            return function
+
+        bots = [SlowBot(0.2)]
+        config = {"test": False}
+        with mock.patch.object(ffb_bot, 'get_text', get_text), \
+                mock.patch.object(ffb_bot, 'get_bots', return_value=bots):
+            start = time.time()
+            await asyncio.gather(*[bot_main_async('get_final', config) for i in range(4)])
+        self.assertLess(time.time() - start, 0.7)
+
+    @mock.patch.dict(os.environ, {}, clear=True)
+    def test_same_job_ids(self):
+        '''Does async mode register the same job ids?'''
+        sched = AsyncIOScheduler()
+        add_jobs(sched, get_config(), asynchronous=True)
+        self.assertEqual({job.id for job in sched.get_jobs()}, {job_id for job_id, function, trigger in JOBS})
+        self.assertIs(sched.get_job('final').func, scheduled_job_async)
@@ -0,0 +1,32 @@
+import os
+import tempfile
+import unittest
+
+
+from ffb_bot.tests.benchmark import (BOT_MAIN_FUNCTIONS, BUILDERS, benchmark, )
+from ffb_bot.tests.fake_league import (dump_league, load_league, make_league, )
+
+
+class BenchmarkTestCase(unittest.TestCase):
+    '''Smoke test the benchmark harness and its fixtures'''
+
+    def test_fixture_round_trip(self):
+        '''Does a recorded fixture replay the same league?'''
+        league = make_league(8, 4)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'league.json')
+            dump_league(league, path)
+            replayed = load_league(path)
+        self.assertEqual(replayed.week_scores, league.week_scores)
+        self.assertEqual([t.wins for t in replayed.teams], [t.wins for t in league.teams])
+        self.assertEqual(replayed.power_rankings()[0][0], league.power_rankings()[0][0])
+
+    def test_benchmark(self):
+        '''Does every builder and bot_main run offline?'''
+        results = benchmark([8], [3], repeat=1, report=lambda line: None)
+        self.assertEqual(len(results), len(BUILDERS) + 1)
+        bot_main = results[-1]
+        self.assertEqual(bot_main[2], 'bot_main')
+        # one fetch per job plus a second finished week for top half standings,
+        # get_final is posted from the artifacts get_power_rankings rendered
+        self.assertEqual(bot_main[4], len(BOT_MAIN_FUNCTIONS))
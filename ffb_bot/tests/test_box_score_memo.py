@@ -0,0 +1,40 @@
+import unittest
+
+
+from ffb_bot.ffb_bot import (BoxScoreMemo, get_close_scores, get_matchups, get_projected_scoreboard,
+                             get_scoreboard_short, get_standings, get_trophies, )
+from ffb_bot.tests.fake_league import FakeLeague
+
+
+class BoxScoreMemoTestCase(unittest.TestCase):
+    '''Test BoxScoreMemo fetch counts'''
+
+    def setUp(self):
+        self.league = FakeLeague(['Alpha', 'Bravo', 'Charlie', 'Delta'],
+                                 {1: [(0, 100, 1, 90), (2, 80, 3, 70)],
+                                  2: [(0, 60, 2, 95), (1, 110, 3, 50)]})
+        self.memo = BoxScoreMemo(self.league)
+
+    def test_current_week_fetched_once(self):
+        '''Do all builders share one fetch of the current week?'''
+        get_matchups(self.memo, False)
+        get_projected_scoreboard(self.memo)
+        get_scoreboard_short(self.memo)
+        get_close_scores(self.memo)
+        get_trophies(self.memo)
+        self.assertEqual(self.memo.fetch_count, 1)
+        self.assertEqual(self.league.box_score_calls, [3])
+
+    def test_final_fetched_once(self):
+        '''Does the get_final job fetch last week once?'''
+        week = self.memo.current_week - 1
+        get_scoreboard_short(self.memo, week=week)
+        get_trophies(self.memo, week=week)
+        get_standings(self.memo, True)
+        self.assertEqual(self.memo.fetch_count, 2)
+        self.assertEqual(self.league.box_score_calls, [2, 1])
+
+    def test_passthrough(self):
+        '''Are other League attributes passed through?'''
+        self.assertIs(self.memo.teams, self.league.teams)
+        self.assertEqual(self.memo.current_week, 3)
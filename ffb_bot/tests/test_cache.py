@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+
+from ffb_bot.ffb_bot import (WeekCache, get_standings, )
+from ffb_bot.tests.fake_league import FakeLeague
+
+
+class WeekCacheTestCase(unittest.TestCase):
+    '''Test WeekCache and top half standings'''
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'cache.sqlite3')
+        self.league = FakeLeague(['Alpha', 'Bravo', 'Charlie', 'Delta'],
+                                 {1: [(0, 100, 1, 90), (2, 80, 3, 70)],
+                                  2: [(0, 60, 2, 95), (1, 110, 3, 50)]})
+        self.cache = WeekCache(self.path, 123, 2021)
+
+    def tearDown(self):
+        self.cache.conn.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_standings_fetch_past_weeks_once(self):
+        '''Are finished weeks only fetched from ESPN once?'''
+        first = get_standings(self.league, True, cache=self.cache)
+        self.assertEqual(self.league.box_score_calls, [1, 2])
+        second = get_standings(self.league, True, cache=WeekCache(self.path, 123, 2021))
+        self.assertEqual(self.league.box_score_calls, [1, 2])
+        self.assertEqual(first, second)
+        self.assertEqual(first, get_standings(self.league, True))
+
+    def test_cached_matchups(self):
+        '''Are finished weeks cached as matchup rows?'''
+        get_standings(self.league, True, cache=self.cache)
+        self.assertEqual(self.cache.get(1), [[1, 100, 2, 90], [3, 80, 4, 70]])
+        self.assertEqual(self.cache.get(2), [[1, 60, 3, 95], [2, 110, 4, 50]])
+
+    def test_invalidate(self):
+        '''Does invalidating a week make it get refetched?'''
+        get_standings(self.league, True, cache=self.cache)
+        self.cache.invalidate(week=2)
+        self.assertIsNone(self.cache.get(2))
+        get_standings(self.league, True, cache=self.cache)
+        self.assertEqual(self.league.box_score_calls, [1, 2, 2])
+        self.cache.invalidate()
+        self.assertIsNone(self.cache.get(1))
+
+    def test_keyed_by_league(self):
+        '''Are other leagues' weeks kept separate?'''
+        get_standings(self.league, True, cache=self.cache)
+        self.assertIsNone(WeekCache(self.path, 456, 2021).get(1))
+        self.assertIsNone(WeekCache(self.path, 123, 2020).get(1))
@@ -0,0 +1,153 @@
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+import unittest
+import urllib.request
+from unittest import mock
+from urllib.parse import urlencode
+
+
+import requests_mock
+
+
+from ffb_bot import ffb_bot
+from ffb_bot.ffb_bot import (SingleFlightCache, get_config, parse_command, serve_commands, )
+
+
+class SingleFlightCacheTestCase(unittest.TestCase):
+    '''Test the command response cache'''
+
+    def test_concurrent_misses_build_once(self):
+        '''Do 20 requests at once share a single build?'''
+        cache = SingleFlightCache(60)
+        builds = []
+
+        def build():
+            builds.append(1)
+            time.sleep(0.1)
+            return 'Score Update:'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get('scores', build))) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(results, ['Score Update:'] * 20)
+
+    def test_expiry_and_errors(self):
+        '''Are stale values rebuilt and failed builds not cached?'''
+        cache = SingleFlightCache(0)
+        self.assertEqual(cache.get('scores', lambda: 1), 1)
+        self.assertEqual(cache.get('scores', lambda: 2), 2)
+        with self.assertRaises(ValueError):
+            cache.get('power', mock.Mock(side_effect=ValueError))
+        self.assertEqual(cache.get('power', lambda: 3), 3)
+
+    def test_parse_command(self):
+        '''Are the command spellings of every platform understood?'''
+        self.assertEqual(parse_command('!scores'), 'get_scoreboard_short')
+        self.assertEqual(parse_command('/ffb Standings'), 'get_standings')
+        self.assertEqual(parse_command('power'), 'get_power_rankings')
+        self.assertIsNone(parse_command('nice game everyone'))
+        self.assertIsNone(parse_command(''))
+
+
+class CommandServerTestCase(unittest.TestCase):
+    '''Test the inbound command endpoint'''
+
+    @mock.patch.dict(os.environ, {"LEAGUE_ID": "123", "BOT_ID": "456", "SLACK_SIGNING_SECRET": "shh"}, clear=True)
+    def setUp(self):
+        self.config = get_config()
+        self.server = serve_commands({None: self.config}, 0, host='127.0.0.1')
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = 'http://127.0.0.1:%s' % self.server.server_address[1]
+        ffb_bot.command_cache.values.clear()
+        patcher = mock.patch.object(ffb_bot, 'get_text', return_value='Score Update:')
+        self.get_text = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, path, body, headers=None):
+        request = urllib.request.Request(self.url + path, data=body, headers=headers or {})
+        try:
+            with urllib.request.urlopen(request) as r:
+                return r.status, json.loads(r.read())
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+    def slack_headers(self, body, timestamp=None):
+        timestamp = timestamp or str(int(time.time()))
+        signature = 'v0=' + hmac.new(b'shh', b'v0:' + timestamp.encode() + b':' + body, hashlib.sha256).hexdigest()
+        return {'X-Slack-Request-Timestamp': timestamp, 'X-Slack-Signature': signature}
+
+    def wait_for(self, m, count):
+        deadline = time.time() + 5
+        while m.call_count < count and time.time() < deadline:
+            time.sleep(0.01)
+        return m.request_history
+
+    @requests_mock.Mocker(real_http=True)
+    def test_slack_command(self, m):
+        '''Is a signed slash command acknowledged at once and answered on its response_url?'''
+        m.post('https://hooks.slack.com/commands/1', status_code=200)
+        body = urlencode({'command': '/ffb', 'text': 'scores',
+                          'response_url': 'https://hooks.slack.com/commands/1'}).encode()
+        headers = self.slack_headers(body)
+        for i in range(3):
+            status, data = self.post('/slack', body, headers)
+            self.assertEqual(status, 200)
+            self.assertEqual(data, {'response_type': 'in_channel'})
+        replies = self.wait_for(m, 3)
+        self.assertEqual([r.json() for r in replies],
+                         [{'response_type': 'in_channel', 'text': '```Score Update:```'}] * 3)
+        self.get_text.assert_called_once()
+        self.assertEqual(self.post('/slack', body, dict(headers, **{'X-Slack-Signature': 'v0=bad'}))[0], 401)
+
+    def test_slack_bad_timestamp(self):
+        '''Is a garbled timestamp a failed verification rather than an error?'''
+        body = urlencode({'command': '/ffb', 'text': 'scores'}).encode()
+        self.assertEqual(self.post('/slack', body, self.slack_headers(body, timestamp='soon'))[0], 401)
+        self.get_text.assert_not_called()
+
+    def test_unconfigured_platforms(self):
+        '''Are commands refused for a platform without a signing secret or public key?'''
+        self.config['slack_signing_secret'] = None
+        body = urlencode({'command': '/ffb', 'text': 'scores'}).encode()
+        self.assertEqual(self.post('/slack', body)[0], 404)
+        self.assertEqual(self.post('/discord', json.dumps({'type': 2, 'data': {'name': 'power'}}).encode())[0], 404)
+        self.get_text.assert_not_called()
+
+    @requests_mock.Mocker(real_http=True)
+    def test_discord_interaction(self, m):
+        '''Are pings answered and slash commands deferred and then edited in?'''
+        url = ffb_bot.DISCORD_API_URL + '/webhooks/789/tok/messages/@original'
+        m.patch(url, status_code=200)
+        self.config['discord_public_key'] = 'ab'
+        with mock.patch.object(ffb_bot, 'verify_discord_request', return_value=True) as verify:
+            self.assertEqual(self.post('/discord', json.dumps({'type': 1}).encode()), (200, {'type': 1}))
+            status, data = self.post('/discord', json.dumps({'type': 2, 'data': {'name': 'power'},
+                                                             'application_id': '789', 'token': 'tok'}).encode())
+            self.assertEqual(data, {'type': 5})
+            self.assertEqual(self.wait_for(m, 1)[0].json(), {'content': '```Score Update:```'})
+            self.get_text.assert_called_once_with('get_power_rankings', mock.ANY, render=False)
+            verify.return_value = False
+            self.assertEqual(self.post('/discord', json.dumps({'type': 1}).encode())[0], 401)
+
+    @mock.patch.object(ffb_bot.GroupMeBot, 'send_message')
+    def test_groupme_callback(self, send_message):
+        '''Does the bot reply to commands but not to chatter or itself?'''
+        for message in [{'text': 'lol', 'sender_type': 'user'}, {'text': '!close', 'sender_type': 'bot'},
+                        {'text': '!close', 'sender_type': 'user'}]:
+            self.assertEqual(self.post('/groupme', json.dumps(message).encode())[0], 200)
+        time.sleep(0.1)
+        send_message.assert_called_once_with('Score Update:')
+        self.assertEqual(self.post('/other', b'')[0], 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,7 +4,7 @@ import unittest
 import requests_mock
 
 
-from ffb-bot.ffb-bot import (DiscordBot, DiscordException, )
+from ffb_bot.ffb_bot import (DiscordBot, DiscordException, )
 
 
 class DiscordTestCase(unittest.TestCase):
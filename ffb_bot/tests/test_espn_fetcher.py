@@ -0,0 +1,112 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+import requests
+
+
+from ffb_bot.ffb_bot import (BoxScoreMemo, EspnFetcher, HttpClient, ResponseCache, get_scoreboard_short,
+                             get_trophies, )
+from ffb_bot.tests.fake_league import make_league
+
+
+class StubEspnHandler(BaseHTTPRequestHandler):
+    # serves the scores only view of the server's league, gzipped, with an ETag
+    def do_GET(self):
+        self.server.requests.append((urlparse(self.path), dict(self.headers)))
+        week = int(parse_qs(urlparse(self.path).query)['scoringPeriodId'][0])
+        schedule = [{'matchupPeriodId': week,
+                     'home': {'teamId': home + 1, 'totalPoints': home_score},
+                     'away': {'teamId': away + 1, 'totalPoints': away_score}}
+                    for home, home_score, away, away_score in self.server.league.week_scores[week]]
+        etag = '"%s-%s"' % (week, self.server.version)
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        body = gzip.compress(json.dumps({'schedule': schedule}).encode())
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class EspnFetcherTestCase(unittest.TestCase):
+    '''Test the scores only ESPN fetch layer against a local stub'''
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.league = make_league(8, 4, seed=6)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubEspnHandler)
+        self.server.league = self.league
+        self.server.requests = []
+        self.server.version = 1
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        self.cache = ResponseCache(os.path.join(self.tmp_dir, 'cache.sqlite3'))
+        self.fetcher = self.make_fetcher()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.cache.conn.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def make_fetcher(self):
+        client = HttpClient(session=requests.Session(), rate=1000, burst=1000)
+        return EspnFetcher(123, 2021, espn_s2='abc', swid='{def}', cache=self.cache, client=client,
+                           base_url='http://127.0.0.1:%s/ffl' % self.server.server_port)
+
+    def test_same_text_as_box_scores(self):
+        '''Do the score builders say the same thing from the scores only view?'''
+        memo = BoxScoreMemo(self.league, fetcher=self.fetcher)
+        self.assertEqual(get_scoreboard_short(memo, week=3), get_scoreboard_short(self.league, week=3))
+        self.assertEqual(get_trophies(memo, week=3).split('\n\n')[3],
+                         get_trophies(self.league, week=3).split('\n\n')[3])
+        self.assertEqual(self.league.box_score_calls, [3, 3])
+        self.assertEqual(len(self.server.requests), 1)
+
+        path, headers = self.server.requests[0]
+        self.assertEqual(parse_qs(path.query)['view'], ['mMatchupScore', 'mLiveScoring'])
+        self.assertEqual(json.loads(headers['x-fantasy-filter']),
+                         {'schedule': {'filterMatchupPeriodIds': {'value': [3]}}})
+        self.assertIn('gzip', headers['Accept-Encoding'])
+        self.assertIn('espn_s2=abc', headers['Cookie'])
+
+    def test_full_box_scores_reused(self):
+        '''Is no scores request made when the job already has the full box scores?'''
+        memo = BoxScoreMemo(self.league, fetcher=self.fetcher)
+        memo.box_scores(week=2)
+        get_scoreboard_short(memo, week=2)
+        self.assertEqual(self.server.requests, [])
+
+    def test_revalidated_from_disk(self):
+        '''Does a new process revalidate its cached copy instead of downloading it again?'''
+        first = self.fetcher.scores(2, self.league)
+        fetcher = self.make_fetcher()
+        second = fetcher.scores(2, self.league)
+        self.assertEqual(self.server.requests[1][1]['If-None-Match'], '"2-1"')
+        self.assertEqual([(m.home_score, m.away_score) for m in first], [(m.home_score, m.away_score) for m in second])
+
+        self.server.version = 2
+        self.league.week_scores[2][0] = (self.league.week_scores[2][0][0], 1.5) + self.league.week_scores[2][0][2:]
+        self.assertEqual(fetcher.scores(2, self.league)[0].home_score, 1.5)
+        self.assertEqual(self.cache.get(self.cache.conn.execute('SELECT key FROM responses').fetchone()[0])[0],
+                         '"2-2"')
+
+
+if __name__ == '__main__':
+    unittest.main()
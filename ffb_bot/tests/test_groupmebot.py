@@ -4,7 +4,7 @@ import unittest
 import requests_mock
 
 
-from ffb-bot.ffb-bot import (GroupMeBot, GroupMeException, )
+from ffb_bot.ffb_bot import (GroupMeBot, GroupMeException, )
 
 
 class GroupMeBotTestCase(unittest.TestCase):
@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+
+from ffb_bot import ffb_bot
+from ffb_bot.ffb_bot import (HistoryStore, backfill, get_config, get_rivalries, get_text, )
+from ffb_bot.tests.fake_league import make_league
+
+
+class HistoryTestCase(unittest.TestCase):
+    '''Test multi season backfill and all-time stats'''
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'cache.sqlite3')
+        self.leagues = {2017: make_league(4, 2, seed=4), 2019: make_league(4, 3, seed=1),
+                        2020: make_league(4, 5, seed=2), 2021: make_league(4, 4, seed=3)}
+        self.league_calls = []
+
+        def League(league_id, year, **kwargs):
+            self.league_calls.append((year, kwargs))
+            return self.leagues[year]
+
+        patchers = [mock.patch.object(ffb_bot, 'League', League),
+                    mock.patch.object(ffb_bot, 'espn_call', lambda func, *args, **kwargs: func(*args, **kwargs)),
+                    mock.patch.dict(os.environ, {"LEAGUE_ID": "123", "LEAGUE_YEAR": "2021"}, clear=True)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.config = get_config()
+        self.config['cache_path'] = self.path
+
+    def tearDown(self):
+        ffb_bot.league_contexts.clear()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_backfill_once(self):
+        '''Is every past week fetched once, and skipped on a rerun?'''
+        self.assertEqual(backfill(self.config, [2019, 2020], max_workers=4), 3 + 5)
+        self.assertEqual(sorted(self.leagues[2019].box_score_calls), [1, 2, 3])
+        self.assertEqual(backfill(self.config, [2019, 2020], max_workers=4), 0)
+        self.assertEqual(len(self.leagues[2020].box_score_calls), 5)
+        self.assertEqual(HistoryStore(self.path, 123).years(), [2019, 2020])
+
+    def test_before_box_scores(self):
+        '''Are seasons before 2019 read from the scoreboard?'''
+        self.assertEqual(backfill(self.config, [2017, 2019]), 2 + 3)
+        self.assertEqual(self.leagues[2017].box_score_calls, [])
+        self.assertEqual(sorted(self.leagues[2017].scoreboard_calls), [1, 2])
+        store = HistoryStore(self.path, 123).season_store(years=[2017])
+        self.assertEqual(store.weeks, [(2017, 1), (2017, 2)])
+        self.assertEqual(sum(store.records()[0]) + sum(store.records()[2]) / 2, 2 * 2)
+
+    def test_failed_week(self):
+        '''Does a failing week leave the rest of the backfill written and get fetched on a rerun?'''
+        box_scores = self.leagues[2019].box_scores
+        self.leagues[2019].box_scores = lambda week=None: 1 / 0 if week == 2 else box_scores(week=week)
+        with self.assertLogs(ffb_bot.logger, 'WARNING'):
+            self.assertEqual(backfill(self.config, [2019, 2020]), 2 + 5)
+        self.leagues[2019].box_scores = box_scores
+        self.assertEqual(backfill(self.config, [2019, 2020]), 1)
+
+    def test_base_url(self):
+        '''Does backfill fetch from the configured ESPN base url?'''
+        self.config['espn_base_url'] = 'http://127.0.0.1:1/ffl'
+        backfill(self.config, [2019])
+        self.assertEqual(self.league_calls[0], (2019, {'base_url': 'http://127.0.0.1:1/ffl'}))
+
+    def test_all_time_standings(self):
+        '''Do all-time records add up every season, including the finished weeks of this one?'''
+        backfill(self.config, [2019, 2020])
+        text = get_text('get_all_time_standings', self.config)
+        self.assertTrue(text.startswith('All-Time Standings (2019, 2020, 2021):'))
+        store = HistoryStore(self.path, 123).season_store()
+        self.assertEqual(len(store.weeks), 3 + 5 + 3)
+        wins, losses, ties = store.records()
+        self.assertEqual(sum(wins) + sum(ties) / 2, 2 * len(store.weeks))
+        self.assertEqual(len(text.split('\n')), 5)
+
+    def test_rivalries(self):
+        '''Are head to head series counted across seasons?'''
+        backfill(self.config, [2019, 2020])
+        history = HistoryStore(self.path, 123)
+        wins = history.season_store().head_to_head()
+        self.assertEqual(wins.sum(), 8 * 2)
+        self.assertEqual(get_rivalries(history, limit=1).split('\n')[0], 'Rivalries:')
+        self.assertIn('Career Trophies:', get_text('get_career_trophies', self.config))
+
+
+if __name__ == '__main__':
+    unittest.main()
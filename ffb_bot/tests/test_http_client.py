@@ -0,0 +1,102 @@
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+import requests
+
+
+from ffb_bot.ffb_bot import (CircuitOpenException, HttpClient, SlackBot, SlackException, TokenBucket, )
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    # each request pops the next (status, headers) from the server's responses
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.requests += 1
+        status, headers = self.server.responses.pop(0) if self.server.responses else (200, {})
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpClientTestCase(unittest.TestCase):
+    '''Test HttpClient retries, rate limiting and circuit breaker against a local server'''
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), MockHandler)
+        self.server.responses = []
+        self.server.requests = 0
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        self.url = 'http://127.0.0.1:%s/hook' % self.server.server_port
+        self.sleeps = []
+        self.client = HttpClient(session=requests.Session(), retries=3, rate=1000, burst=1000,
+                                 sleep=self.sleeps.append)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_retry_after(self):
+        '''Are 429s retried after the Retry-After delay?'''
+        self.server.responses = [(429, {'Retry-After': '2'}), (503, {}), (200, {})]
+        r = self.client.post(self.url, data='{}')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(self.sleeps[0], 2)
+        self.assertLessEqual(self.sleeps[1], 1)
+
+    def test_retries_exhausted(self):
+        '''Is the last response returned once retries run out?'''
+        self.server.responses = [(500, {})] * 4
+        self.assertEqual(self.client.post(self.url).status_code, 500)
+        self.assertEqual(self.server.requests, 4)
+
+    def test_bot_retries(self):
+        '''Do the bots go through the retrying client?'''
+        self.server.responses = [(502, {}), (200, {})]
+        bot = SlackBot(self.url, client=self.client)
+        self.assertEqual(bot.send_message('This is a test.').status_code, 200)
+        self.server.responses = [(404, {})]
+        with self.assertRaises(SlackException):
+            bot.send_message('This is a test.')
+
+    def test_circuit_breaker(self):
+        '''Does the breaker stop calls to a failing host?'''
+        client = HttpClient(session=requests.Session(), retries=0, failure_threshold=2,
+                            reset_timeout=60, sleep=self.sleeps.append)
+        self.server.responses = [(500, {}), (500, {})]
+        client.post(self.url)
+        client.post(self.url)
+        with self.assertRaises(CircuitOpenException):
+            client.post(self.url)
+        self.assertEqual(self.server.requests, 2)
+
+    def test_call_retries_exceptions(self):
+        '''Are wrapped fetches retried on connection errors?'''
+        attempts = []
+
+        def fetch(week):
+            attempts.append(week)
+            if len(attempts) < 3:
+                raise requests.exceptions.ConnectionError()
+            return week
+
+        self.assertEqual(self.client.call('espn', fetch, week=4), 4)
+        self.assertEqual(attempts, [4, 4, 4])
+
+    def test_token_bucket(self):
+        '''Does the bucket make callers wait once the burst is spent?'''
+        bucket = TokenBucket(rate=10, capacity=2)
+        waits = []
+        bucket.acquire(waits.append)
+        bucket.acquire(waits.append)
+        self.assertEqual(waits, [])
+        bucket.acquire(lambda wait: (waits.append(wait), time.sleep(wait)))
+        self.assertGreater(waits[0], 0.05)
@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+
+from ffb_bot import ffb_bot
+from ffb_bot.ffb_bot import (LazyModule, LeagueContext, get_config, get_league_context, get_power_rankings, get_text, )
+from ffb_bot.tests.fake_league import (FakeLeague, make_league, )
+
+
+class LeagueContextTestCase(unittest.TestCase):
+    '''Test LeagueContext reuse and refresh'''
+
+    def setUp(self):
+        patcher = mock.patch.object(ffb_bot, 'League')
+        self.League = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_league_built_once(self):
+        '''Is the League only built once while it is fresh?'''
+        context = LeagueContext(123, 2021, ttl=900)
+        self.assertIs(context.get_league(), context.get_league())
+        self.League.assert_called_once_with(league_id=123, year=2021)
+        self.League.return_value.refresh.assert_not_called()
+
+    def test_refresh_after_ttl(self):
+        '''Is the League refreshed instead of rebuilt once it is stale?'''
+        context = LeagueContext(123, 2021, espn_s2='abc', swid='{def}', ttl=0)
+        league = context.get_league()
+        context.fetched_at -= 1
+        self.assertIs(context.get_league(), league)
+        self.League.assert_called_once_with(league_id=123, year=2021, espn_s2='abc', swid='{def}')
+        self.League.return_value.refresh.assert_called_once_with()
+
+    def test_shared_context(self):
+        '''Do jobs for the same league share one context?'''
+        first = get_league_context(123, 2021)
+        self.assertIs(first, get_league_context('123', '2021'))
+        self.assertIsNot(first, get_league_context(123, 2020))
+
+
+class LeagueSnapshotTestCase(unittest.TestCase):
+    '''Test league snapshots and the fast init path'''
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.path = os.path.join(self.tmp_dir, 'league.snapshot')
+        patcher = mock.patch.object(ffb_bot, 'League', side_effect=lambda **kwargs: make_league(8, 3))
+        self.League = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_snapshot_round_trip(self):
+        '''Does a new process load the saved snapshot instead of fetching it?'''
+        league = LeagueContext(123, 2021, snapshot_path=self.path).get_league()
+        restarted = LeagueContext(123, 2021, snapshot_path=self.path)
+        self.assertEqual(get_power_rankings(restarted.get_league()), get_power_rankings(league))
+        self.assertEqual([t.wins for t in restarted.get_league().teams], [t.wins for t in league.teams])
+        self.assertEqual(self.League.call_count, 1)
+
+    def test_stale_snapshot_refreshed(self):
+        '''Is a stale snapshot refreshed rather than rebuilt?'''
+        LeagueContext(123, 2021, snapshot_path=self.path).get_league()
+        os.utime(self.path, (0, 0))
+        restarted = LeagueContext(123, 2021, snapshot_path=self.path)
+        with mock.patch.object(FakeLeague, 'refresh') as refresh:
+            restarted.get_league()
+        refresh.assert_called_once_with()
+        # the refresh goes through a League that is never fetched itself
+        self.assertEqual(self.League.call_count, 2)
+        self.assertFalse(self.League.call_args.kwargs['fetch_league'])
+        self.assertGreater(os.path.getmtime(self.path), 0)
+
+    @mock.patch.dict(os.environ, {"LEAGUE_ID": "123", "INIT_MSG": "Hello"}, clear=True)
+    def test_init_skips_league(self):
+        '''Is the init message sent without building a league?'''
+        self.assertEqual(get_text('init', get_config()), 'Hello')
+        self.League.assert_not_called()
+
+    def test_lazy_module(self):
+        '''Are heavy modules only imported when used?'''
+        lazy = LazyModule('json')
+        self.assertIsNone(lazy.module)
+        self.assertEqual(lazy.dumps([1]), '[1]')
+        self.assertIsNotNone(lazy.module)
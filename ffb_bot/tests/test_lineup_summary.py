@@ -0,0 +1,41 @@
+import unittest
+
+
+from ffb_bot.ffb_bot import LineupSummary
+from ffb_bot.tests.fake_league import make_player
+
+
+class LineupSummaryTestCase(unittest.TestCase):
+    '''Test the one pass lineup summary'''
+
+    def setUp(self):
+        self.lineup = [make_player('Josh Allen', points=24.5, projected_points=22, game_played=100, slot_position='QB'),
+                       make_player('Derrick Henry', points=6, projected_points=16, game_played=50),
+                       make_player('Davante Adams', projected_points=15, slot_position='WR'),
+                       make_player('Travis Kelce', points=-1, projected_points=12, slot_position='TE'),
+                       make_player('Cooper Kupp', points=30, projected_points=18, game_played=100, slot_position='BE'),
+                       make_player('Dalvin Cook', projected_points=14, slot_position='IR')]
+
+    def test_summary(self):
+        '''Are starters' points, projections and remaining players summed and bench and IR skipped?'''
+        summary = LineupSummary(self.lineup)
+        self.assertEqual(summary.points, 29.5)
+        # played or scoring starters count their points, the rest their projection
+        self.assertEqual(summary.projected_total, 24.5 + 6 + 15 - 1)
+        self.assertEqual(summary.players_left, ['Derrick Henry', 'Davante Adams', 'Travis Kelce'])
+        self.assertEqual(summary.formatted_names, ['D. Henry', 'D. Adams', 'T. Kelce'])
+        self.assertEqual(summary.remaining_mean, 8 + 15 + 12)
+        self.assertEqual(summary.remaining_var, 0.25 * (8 ** 2 + 15 ** 2 + 12 ** 2))
+        self.assertFalse(summary.all_played)
+
+    def test_all_played(self):
+        '''Is a lineup whose starters have all played done with nothing left?'''
+        summary = LineupSummary(self.lineup[:1] + self.lineup[4:])
+        self.assertTrue(summary.all_played)
+        self.assertEqual(summary.players_left, [])
+        self.assertEqual((summary.remaining_mean, summary.remaining_var), (0, 0))
+        self.assertEqual(summary.projected_total, 24.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
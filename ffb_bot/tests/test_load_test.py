@@ -0,0 +1,70 @@
+import unittest
+
+
+import requests
+
+
+from ffb_bot import ffb_bot
+from ffb_bot.tests.fake_league import make_league
+from ffb_bot.tests.load_test import (get_events, load_test, make_configs, )
+from ffb_bot.tests.stubs import (start_espn_stub, start_sink_stub, )
+
+
+class StubsTestCase(unittest.TestCase):
+    '''Test the local ESPN and webhook stand-ins'''
+
+    def test_espn_stub_league(self):
+        '''Does espn_api build the same league from the ESPN stub as the fixture it serves?'''
+        server = start_espn_stub({123: make_league(8, 5, seed=3)})
+        self.addCleanup(server.stop)
+        league = ffb_bot.LeagueSnapshot.from_league(
+            ffb_bot.League(league_id=123, year=2021, base_url=server.url + '/ffl'))
+        fixture = make_league(8, 5, seed=3)
+        for builder in (ffb_bot.get_scoreboard_short, ffb_bot.get_projected_scoreboard, ffb_bot.get_close_scores,
+                        ffb_bot.get_power_rankings):
+            self.assertEqual(builder(league), builder(fixture))
+        self.assertEqual(ffb_bot.get_standings(league, False), ffb_bot.get_standings(fixture, False))
+        self.assertEqual(server.counts[('mTeam,mRoster,mMatchup,mSettings,mStandings', 200)], 1)
+
+    def test_faults(self):
+        '''Are the configured shares of posts rate limited and failed?'''
+        server = start_sink_stub(rate_limit_rate=0.5, error_rate=0.5, retry_after=2)
+        self.addCleanup(server.stop)
+        statuses = []
+        for i in range(20):
+            r = requests.post(server.url + '/slack/league', json={'text': 'hi'})
+            statuses.append(r.status_code)
+            if r.status_code == 429:
+                self.assertEqual(r.headers['Retry-After'], '2')
+        self.assertEqual(set(statuses), {429, 500})
+        self.assertEqual(server.posts, [])
+        self.assertEqual(requests.post(server.url + '/other').status_code, 404)
+
+
+class LoadTestTestCase(unittest.TestCase):
+    '''Smoke test the load driver'''
+
+    def test_events(self):
+        '''Is a week's schedule laid out from the real job triggers?'''
+        configs = make_configs(2, 'http://espn', 'http://sinks', '/tmp')
+        events = get_events(configs, jobs=['final', 'scoreboard2'])
+        self.assertEqual(len(events), 2 * 3)
+        self.assertEqual([function for fire_time, name, job_id, function in events[:2]], ['get_final'] * 2)
+        self.assertEqual(events[-1][2], 'league1-scoreboard2')
+
+    def test_load_test(self):
+        '''Does every run deliver to every sink through rate limits?'''
+        lines = []
+        summary = load_test(2, 6, 3, speed=10 ** 6, workers=4, jobs=['power_rankings', 'final', 'scoreboard1'],
+                            rate_limit_rate=0.1, client_rate=1000, report=lines.append)
+        self.assertEqual(summary['jobs'], 2 * 4)
+        self.assertEqual(summary['failed'], 0)
+        self.assertEqual(set(summary['sinks']), {'GroupMeBot', 'SlackBot', 'DiscordBot'})
+        self.assertEqual({sink: counts[0] for sink, counts in summary['sinks'].items()},
+                         dict.fromkeys(summary['sinks'], 2 * 4))
+        self.assertLessEqual(summary['p50'], summary['p99'])
+        self.assertTrue(lines[0].startswith('2 leagues, 8 jobs in'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import json
+import logging
+import os
+import unittest
+from unittest import mock
+from urllib.parse import urlparse
+
+
+import requests
+import requests_mock
+
+
+from ffb_bot import ffb_bot
+from ffb_bot.ffb_bot import (Metrics, bot_main, get_config, serve_metrics, span, trace_logger, )
+from ffb_bot.tests.fake_league import make_league
+
+
+class MetricsTestCase(unittest.TestCase):
+    '''Test the metrics surface and job tracing'''
+
+    def setUp(self):
+        patcher = mock.patch.object(ffb_bot, 'metrics', Metrics())
+        self.metrics = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_render(self):
+        '''Are counters and histograms rendered in the Prometheus format?'''
+        self.metrics.inc('jobs_total', function='get_final')
+        self.metrics.observe('job_seconds', 0.3, function='get_final')
+        text = self.metrics.render()
+        self.assertIn('jobs_total{function="get_final"} 1', text)
+        self.assertIn('job_seconds_bucket{function="get_final",le="0.25"} 0', text)
+        self.assertIn('job_seconds_bucket{function="get_final",le="0.5"} 1', text)
+        self.assertIn('job_seconds_count{function="get_final"} 1', text)
+
+    def test_endpoint(self):
+        '''Is /metrics served over http?'''
+        self.metrics.inc('jobs_total')
+        server = serve_metrics(0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        r = requests.get('http://127.0.0.1:%s/metrics' % server.server_port)
+        self.assertEqual(r.status_code, 200)
+        self.assertIn('jobs_total 1', r.text)
+
+    @requests_mock.Mocker()
+    @mock.patch.dict(os.environ, {"LEAGUE_ID": "123", "BOT_ID": "123456"}, clear=True)
+    def test_bot_main_instrumented(self, m):
+        '''Does a job record its duration, ESPN calls, sends and trace spans?'''
+        m.post("https://api.groupme.com/v3/bots/post", status_code=202)
+        ffb_bot.league_contexts.clear()
+        self.addCleanup(ffb_bot.league_contexts.clear)
+        spans = []
+        handler = logging.Handler()
+        handler.emit = lambda record: spans.append(json.loads(record.getMessage()))
+        trace_logger.addHandler(handler)
+        trace_logger.setLevel(logging.INFO)
+        self.addCleanup(trace_logger.setLevel, logging.NOTSET)
+        self.addCleanup(trace_logger.removeHandler, handler)
+        with mock.patch.object(ffb_bot, 'League', side_effect=lambda **kwargs: make_league(8, 3)):
+            bot_main('get_final', dict(get_config(), cache_path=':memory:'))
+        text = self.metrics.render()
+        self.assertIn('ffb_bot_jobs_total{function="get_final",status="ok"} 1', text)
+        self.assertIn('ffb_bot_job_seconds_count{function="get_final"} 1', text)
+        self.assertIn('ffb_bot_espn_requests_total{call="box_scores",status="ok"} 1', text)
+        self.assertIn('ffb_bot_sends_total{sink="GroupMeBot",status="202"} 1', text)
+        self.assertIn('ffb_bot_sends_total{sink="SlackBot",status="skipped"} 1', text)
+        job = spans[-1]
+        self.assertEqual(job['name'], 'job')
+        self.assertIsNone(job['parent_id'])
+        children = [s for s in spans if s['parent_id'] == job['span_id']]
+        self.assertIn('espn.box_scores', [s['name'] for s in children])
+        self.assertEqual({s['attrs']['sink'] for s in children if s['name'] == 'send'},
+                         {'GroupMeBot', 'SlackBot', 'DiscordBot'})
+        self.assertTrue(all(s['trace_id'] == job['trace_id'] for s in children))
+
+    def test_espn_span_attrs(self):
+        '''Are ESPN session cookies kept out of the trace?'''
+        records = []
+        handler = logging.Handler()
+        handler.emit = lambda record: records.append(record.getMessage())
+        trace_logger.addHandler(handler)
+        trace_logger.setLevel(logging.INFO)
+        self.addCleanup(trace_logger.setLevel, logging.NOTSET)
+        self.addCleanup(trace_logger.removeHandler, handler)
+        league = mock.Mock(__name__='League')
+        ffb_bot.espn_call(league, league_id=123, year=2021, espn_s2='SECRETCOOKIE', swid='{ABC}')
+        league.assert_called_once_with(league_id=123, year=2021, espn_s2='SECRETCOOKIE', swid='{ABC}')
+        self.assertEqual(json.loads(records[0])['attrs'], {'league_id': 123, 'year': 2021})
+        self.assertNotIn('SECRETCOOKIE', records[0])
+        self.assertNotIn('{ABC}', records[0])
+
+    def test_espn_host(self):
+        '''Do espn_api calls share the rate limit and breaker of EspnFetcher's requests to the same host?'''
+        league = make_league(4, 3)
+        league.base_url = 'http://127.0.0.1:8080/ffl'
+        with mock.patch.object(ffb_bot.get_http_client('espn'), 'call') as call:
+            ffb_bot.espn_call(mock.Mock(__name__='League'), league_id=123)
+            ffb_bot.espn_call(mock.Mock(__name__='League'), league_id=123, base_url=league.base_url)
+            ffb_bot.espn_call(league.box_scores, week=3)
+        self.assertEqual([c.args[0] for c in call.call_args_list],
+                         [urlparse(ffb_bot.ESPN_BASE_URL).netloc, '127.0.0.1:8080', '127.0.0.1:8080'])
+
+    def test_span_status(self):
+        '''Do failed spans record the exception?'''
+        with self.assertRaises(ValueError):
+            with span('job') as record:
+                raise ValueError()
+        self.assertEqual(record['status'], 'ValueError')
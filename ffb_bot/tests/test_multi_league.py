@@ -0,0 +1,72 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+
+from apscheduler.schedulers.background import BackgroundScheduler
+
+
+from ffb_bot import ffb_bot
+from ffb_bot.ffb_bot import (JOBS, add_jobs, get_config, load_league_configs, scheduled_job, )
+
+
+class MultiLeagueTestCase(unittest.TestCase):
+    '''Test multi league config loading and job registration'''
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'leagues.json')
+        with open(self.path, 'w') as f:
+            json.dump({"defaults": {"year": 2022, "timezone": "America/Chicago"},
+                       "leagues": [{"league_id": "123", "bot_id": "abc"},
+                                   {"league_id": "456", "name": "work", "year": 2021,
+                                    "slack_webhook_url": "https://hooks.slack.com/services/A/B/C"}]}, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    @mock.patch.dict(os.environ, {"LEAGUE_ID": "999", "RANDOM_PHRASE": "1"}, clear=True)
+    def test_load_league_configs(self):
+        '''Do leagues fall back to file defaults and then the environment?'''
+        first, second = load_league_configs(self.path)
+        self.assertEqual((first["name"], first["league_id"], first["year"]), ("123", "123", 2022))
+        self.assertEqual((second["name"], second["league_id"], second["year"]), ("work", "456", 2021))
+        self.assertEqual(first["timezone"], "America/Chicago")
+        self.assertEqual(first["random_phrase"], "1")
+        self.assertEqual(second["bot_id"], 1)
+
+    @mock.patch.dict(os.environ, {}, clear=True)
+    def test_add_jobs(self):
+        '''Does every league get its own set of jobs on one scheduler?'''
+        sched = BackgroundScheduler()
+        for config in load_league_configs(self.path):
+            add_jobs(sched, config, name=config["name"])
+        add_jobs(sched, get_config())
+        job_ids = {job.id for job in sched.get_jobs()}
+        self.assertEqual(len(job_ids), 3 * len(JOBS))
+        self.assertIn('work-final', job_ids)
+        self.assertIn('123-scoreboard2', job_ids)
+        self.assertIn('final', job_ids)
+        self.assertEqual(sched.get_job('work-final').args, ('work-final', 'work', 'get_final'))
+
+    @mock.patch.object(ffb_bot, 'bot_main')
+    def test_scheduled_job(self, bot_main):
+        '''Does a league job run with its league's config?'''
+        ffb_bot.league_configs['work'] = {'league_id': '456'}
+        self.addCleanup(ffb_bot.league_configs.pop, 'work')
+        scheduled_job('work-final', 'work', 'get_final')
+        bot_main.assert_called_once_with('get_final', {'league_id': '456'}, run_id=mock.ANY)
+
+    @mock.patch.dict(os.environ, {"LIVE_SCORING": "1", "LIVE_INTERVAL": "2"}, clear=True)
+    def test_live_scoring_jobs(self):
+        '''Does live scoring replace the fixed sunday score updates with polling?'''
+        sched = BackgroundScheduler()
+        add_jobs(sched, get_config())
+        job_ids = {job.id for job in sched.get_jobs()}
+        self.assertNotIn('scoreboard2', job_ids)
+        self.assertIn('live_scores', job_ids)
+        self.assertEqual(sched.get_job('live_scores').args, ('live_scores', None, 'get_score_changes'))
+        self.assertEqual(str(sched.get_job('live_scores').trigger.fields[-2]), '*/2')
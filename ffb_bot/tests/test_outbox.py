@@ -0,0 +1,186 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+
+import requests_mock
+from apscheduler.schedulers.background import BackgroundScheduler
+
+
+from ffb_bot import ffb_bot
+from ffb_bot.ffb_bot import (GroupMeBot, Outbox, SlackBot, SQLiteJobStore, add_jobs, add_outbox_retry, deliver,
+                             get_config, get_run_id, prune_jobs, )
+
+
+class OutboxTestCase(unittest.TestCase):
+    '''Test exactly once delivery through the outbox'''
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.outbox = Outbox(os.path.join(self.tmp_dir, 'outbox.sqlite3'))
+        self.slack_url = "https://hooks.slack.com/services/A1B2C3/ABC1ABC2/abcABC1abcABC2"
+        self.bots = [GroupMeBot("123456"), SlackBot(self.slack_url)]
+        self.renders = []
+
+    def tearDown(self):
+        self.outbox.conn.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def render(self):
+        self.renders.append(1)
+        return "Final scores"
+
+    @requests_mock.Mocker()
+    def test_run_delivered_once(self, m):
+        '''Does re-running the same run skip rendering and sending?'''
+        m.post("https://api.groupme.com/v3/bots/post", status_code=202)
+        m.post(self.slack_url, status_code=200)
+        deliver(self.bots, self.outbox, '123', 'final@1', self.render)
+        deliver(self.bots, Outbox(self.outbox.path), '123', 'final@1', self.render)
+        self.assertEqual(len(self.renders), 1)
+        self.assertEqual(m.call_count, 2)
+        deliver(self.bots, self.outbox, '123', 'final@2', self.render)
+        self.assertEqual(m.call_count, 4)
+
+    @requests_mock.Mocker()
+    def test_failed_sink_retried_alone(self, m):
+        '''Is only the failed sink sent again, with the stored text?'''
+        m.post("https://api.groupme.com/v3/bots/post", status_code=202)
+        m.post(self.slack_url, status_code=404)
+        deliver(self.bots, self.outbox, '123', 'final@1', self.render)
+        self.assertEqual(self.outbox.pending(60), [('123', 'final@1')])
+
+        m.post(self.slack_url, status_code=200)
+        results = deliver(self.bots, self.outbox, '123', 'final@1', lambda: "Changed")
+        self.assertEqual([type(bot).__name__ for bot, result in results], ['SlackBot'])
+        self.assertIn("Final scores", m.last_request.json()["text"])
+        self.assertEqual(self.outbox.pending(60), [])
+        self.assertEqual(len(self.renders), 1)
+
+    @requests_mock.Mocker()
+    def test_chunks_not_resent(self, m):
+        '''Does a retried split message only post the chunks the sink hasn't taken?'''
+        text = '\n'.join(['%s' % n * 600 for n in range(3)])
+        m.post("https://api.groupme.com/v3/bots/post", [{'status_code': 202}, {'status_code': 404}])
+        deliver(self.bots[:1], self.outbox, '123', 'final@1', lambda: text)
+        self.assertEqual(self.outbox.get('123', 'final@1')['GroupMeBot'][1:], ('pending', 1))
+
+        m.post("https://api.groupme.com/v3/bots/post", status_code=202)
+        deliver(self.bots[:1], self.outbox, '123', 'final@1', self.render)
+        self.assertEqual([r.json()["text"][0] for r in m.request_history], ['0', '1', '1', '2'])
+        self.assertEqual(self.outbox.get('123', 'final@1')['GroupMeBot'][1:], ('sent', 3))
+
+    def test_old_outbox(self):
+        '''Is an outbox written before chunk progress was recorded still readable?'''
+        path = os.path.join(self.tmp_dir, 'old.sqlite3')
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE TABLE outbox (league TEXT, run_id TEXT, sink TEXT, text TEXT, status TEXT, '
+                     'attempts INTEGER, last_error TEXT, created_at REAL, sent_at REAL, '
+                     'PRIMARY KEY (league, run_id, sink))')
+        conn.execute("INSERT INTO outbox VALUES ('123', 'final@1', 'SlackBot', 'Final scores', 'pending', "
+                     "1, NULL, 0, NULL)")
+        conn.commit()
+        conn.close()
+        outbox = Outbox(path)
+        self.addCleanup(outbox.conn.close)
+        self.assertEqual(outbox.get('123', 'final@1'), {'SlackBot': ('Final scores', 'pending', 0)})
+
+    def test_unconfigured_sinks_skipped(self):
+        '''Are sinks that aren't set up left out of the outbox?'''
+        deliver([GroupMeBot(1)], self.outbox, '123', 'final@1', self.render)
+        self.assertEqual(self.outbox.get('123', 'final@1'), {})
+
+
+class OutboxRetryTestCase(unittest.TestCase):
+    '''Test that failed sinks are retried while the bot keeps running'''
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.slack_url = "https://hooks.slack.com/services/A1B2C3/ABC1ABC2/abcABC1abcABC2"
+        self.env = mock.patch.dict(os.environ, {"SLACK_WEBHOOK_URL": self.slack_url,
+                                                "OUTBOX_PATH": os.path.join(self.tmp_dir, 'outbox.sqlite3')},
+                                   clear=True)
+        self.env.start()
+        self.config = get_config()
+        self.outbox = ffb_bot.get_outbox(self.config["outbox_path"])
+        self.league = ffb_bot.get_league_key(self.config)
+
+    def tearDown(self):
+        self.env.stop()
+        ffb_bot.outboxes.pop(self.config["outbox_path"]).conn.close()
+        shutil.rmtree(self.tmp_dir)
+
+    @requests_mock.Mocker()
+    def test_failed_sink_retried(self, m):
+        '''Does the retry job post what a sink failed to take, but not what a job is still posting?'''
+        m.post(self.slack_url, status_code=404)
+        deliver(ffb_bot.get_bots(self.config), self.outbox, self.league, 'final@1', lambda: "Final scores")
+        self.outbox.add(self.league, 'final@2', ['SlackBot'], "Sending now")
+
+        sched = BackgroundScheduler()
+        job = add_outbox_retry(sched, [self.config])
+        self.assertEqual(job.id, 'resume_outbox')
+        m.post(self.slack_url, status_code=200)
+        job.func(*job.args, **job.kwargs)
+        self.assertEqual(m.call_count, 2)
+        self.assertIn("Final scores", m.last_request.json()["text"])
+        self.assertEqual(self.outbox.pending(60), [(self.league, 'final@2')])
+
+    def test_no_outbox(self):
+        '''Is no retry job added when no league has an outbox?'''
+        self.assertIsNone(add_outbox_retry(BackgroundScheduler(), [dict(self.config, outbox_path=None)]))
+
+
+class JobStoreTestCase(unittest.TestCase):
+    '''Test persisted schedules and run ids'''
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'jobs.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def start(self, job_store):
+        sched = BackgroundScheduler(jobstores={'default': job_store})
+        job_ids = add_jobs(sched, get_config(), job_store=job_store)
+        prune_jobs(job_store, job_ids)
+        sched.start(paused=True)
+        self.addCleanup(lambda: sched.running and sched.shutdown(wait=False))
+        return sched
+
+    @mock.patch.dict(os.environ, {"END_DATE": "2099-01-01"}, clear=True)
+    def test_jobs_survive_restart(self):
+        '''Are unchanged jobs kept with their next run time across a restart?'''
+        sched = self.start(SQLiteJobStore(self.path))
+        next_run_time = sched.get_job('final').next_run_time
+        sched.shutdown(wait=False)
+
+        job_store = SQLiteJobStore(self.path)
+        signature = job_store.signature('final')
+        job_store.conn.execute('INSERT INTO jobs VALUES (?, NULL, ?, NULL)', ('old', b''))
+        sched = self.start(job_store)
+        self.assertEqual(job_store.signature('final'), signature)
+        self.assertEqual(sched.get_job('final').next_run_time, next_run_time)
+        self.assertEqual({job.id for job in sched.get_jobs()}, {job[0] for job in ffb_bot.JOBS})
+
+    @mock.patch.dict(os.environ, {"END_DATE": "2099-01-01"}, clear=True)
+    def test_run_id_from_fire_time(self):
+        '''Does a late run get the id of the fire time it belongs to?'''
+        sched = BackgroundScheduler()
+        add_jobs(sched, get_config())
+        trigger = ffb_bot.job_triggers['final']
+        now = datetime.now(timezone.utc)
+        fire_time = trigger.get_next_fire_time(None, now - timedelta(days=7))
+        self.assertEqual(get_run_id('final', misfire_grace_time=8*24*60*60),
+                         'final@%s' % fire_time.astimezone(timezone.utc).isoformat())
+        self.assertEqual(get_run_id('final', misfire_grace_time=8*24*60*60),
+                         get_run_id('final', misfire_grace_time=8*24*60*60))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+from unittest import mock
+
+
+from ffb_bot import ffb_bot
+from ffb_bot.ffb_bot import (PlayerIndex, ScoreWatcher, get_score_changes, get_win_probabilities, )
+from ffb_bot.tests.fake_league import (FakeLeague, make_league, make_player, )
+
+
+class PlayerIndexTestCase(unittest.TestCase):
+    '''Test the player id to matchup index'''
+
+    def setUp(self):
+        self.index = PlayerIndex()
+        self.leagues = {'a': make_league(6, 3, seed=1), 'b': make_league(6, 3, seed=1)}
+        self.box_scores = {name: league.box_scores(week=3) for name, league in self.leagues.items()}
+        for name, box_scores in self.box_scores.items():
+            self.index.update(name, box_scores)
+
+    def test_matchups_across_leagues(self):
+        '''Does a player id find its matchup, side and slot in every league?'''
+        box_score = self.box_scores['a'][1]
+        player = box_score.away_lineup[0]
+        key = (box_score.home_team.team_id, box_score.away_team.team_id)
+        self.assertEqual(self.index.matchups(player.playerId),
+                         {('a', key, 'away'): player.slot_position, ('b', key, 'away'): player.slot_position})
+
+    def test_only_changed_starters(self):
+        '''Are only matchups with a changed starter returned?'''
+        self.assertEqual(self.index.update('a', self.box_scores['a']), {})
+        box_score = self.box_scores['a'][2]
+        starter = box_score.home_lineup[0]
+        starter.points += 6
+        box_score.away_lineup[-1].points += 6
+        key = (box_score.home_team.team_id, box_score.away_team.team_id)
+        self.assertEqual(self.index.update('a', self.box_scores['a']), {key: [('home', starter, starter.points - 6)]})
+        self.assertEqual(self.index.update('a', self.box_scores['a']), {})
+        self.assertEqual(self.index.update('b', self.box_scores['b']), {})
+
+    def test_lineup_swap(self):
+        '''Is a bench swap indexed in place and a dropped starter removed?'''
+        box_score = self.box_scores['a'][0]
+        key = (box_score.home_team.team_id, box_score.away_team.team_id)
+        lineup = box_score.home_lineup
+        starter, bench = lineup[0], lineup[-1]
+        slot = starter.slot_position
+        starter.slot_position, bench.slot_position = 'BE', slot
+        changed = self.index.update('a', self.box_scores['a'])
+        self.assertEqual(list(changed), [key])
+        self.assertEqual([player for side, player, points in changed[key]], [starter, bench])
+        self.assertEqual(self.index.matchups(bench.playerId)[('a', key, 'home')], slot)
+        lineup.remove(bench)
+        self.assertEqual(self.index.update('a', self.box_scores['a']), {key: []})
+        self.assertNotIn(('a', key, 'home'), self.index.matchups(bench.playerId))
+
+    def test_new_week(self):
+        '''Are last week's lineups dropped from the index?'''
+        self.index.update('a', self.leagues['a'].box_scores(week=2))
+        box_score = self.box_scores['a'][0]
+        key = (box_score.home_team.team_id, box_score.away_team.team_id)
+        self.assertEqual(list(self.index.matchups(box_score.home_lineup[0].playerId)), [('b', key, 'home')])
+
+
+class PlayerImpactTestCase(unittest.TestCase):
+    '''Test that live polls only re-evaluate and alert matchups whose players changed'''
+
+    def setUp(self):
+        self.home = [make_player('Josh Allen', projected_points=20, playerId=1, slot_position='QB')]
+        self.away = [make_player('Patrick Mahomes', projected_points=22, playerId=2, slot_position='QB')]
+        self.league = FakeLeague(['Alpha', 'Bravo', 'Charlie', 'Delta'],
+                                 {1: [(0, 0, 1, 0), (2, 0, 3, 0)]}, current_week=1,
+                                 lineups={(1, 0): self.home, (1, 1): self.away,
+                                          (1, 2): [make_player('Derrick Henry', playerId=3)],
+                                          (1, 3): [make_player('Davante Adams', playerId=4)]})
+        self.watcher = ScoreWatcher(league='league')
+
+    def poll(self):
+        # team scores follow their starters like ESPN's do
+        self.league.week_scores[1][0] = (0, self.home[0].points, 1, self.away[0].points)
+        return get_score_changes(self.league, self.watcher)
+
+    def test_only_affected_matchups(self):
+        '''Is a poll where one player scored only re-simulating that player's game?'''
+        self.poll()
+        with mock.patch.object(ffb_bot, 'get_matchup_state', wraps=ffb_bot.get_matchup_state) as state:
+            self.assertEqual(self.poll(), '')
+            state.assert_not_called()
+            self.home[0].points = 6
+            self.home[0].game_played = 20
+            self.poll()
+            self.assertEqual([call.args[0].home_team.team_id for call in state.call_args_list], [1])
+
+    def test_player_impact(self):
+        '''Is a starter scoring in a close game posted with the game's score?'''
+        self.poll()
+        self.away[0].points = 4
+        self.away[0].game_played = 10
+        self.assertEqual(self.poll(), 'Live Update:\nPlayer impact: P. Mahomes +4.00 (BRAV): ALPH 0.00 - 4.00 BRAV')
+        self.home[0].points = 3
+        self.home[0].game_played = 10
+        self.away[0].points = 7
+        self.away[0].game_played = 25
+        self.assertEqual(self.poll(), 'Live Update:\nPlayer impact: J. Allen +3.00 (ALPH), P. Mahomes +3.00 (BRAV): '
+                                      'ALPH 3.00 - 7.00 BRAV')
+        self.home[0].points = 9
+        self.assertEqual(self.poll(), 'Live Update:\nLead change: ALPH 9.00 - 7.00 BRAV')
+
+    def test_not_close(self):
+        '''Is a starter scoring in a decided game left alone?'''
+        self.home[0].points = 40
+        self.home[0].game_played = 90
+        self.poll()
+        self.home[0].points = 46
+        self.assertEqual(self.poll(), '')
+
+    def test_probability_per_game(self):
+        '''Is a game's win probability the same whichever other games are simulated with it?'''
+        box_scores = self.league.box_scores(week=1)
+        self.assertEqual(get_win_probabilities(box_scores[:1]), {(1, 2): get_win_probabilities(box_scores)[(1, 2)]})
+
+
+if __name__ == '__main__':
+    unittest.main()
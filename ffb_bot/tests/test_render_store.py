@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+
+from ffb_bot import ffb_bot
+from ffb_bot.ffb_bot import (RenderStore, get_config, get_text, )
+from ffb_bot.tests.fake_league import make_league
+
+
+class RenderStoreTestCase(unittest.TestCase):
+    '''Test precomputed weekly artifacts'''
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'cache.sqlite3')
+        self.renders = RenderStore(self.path, 123, 2021)
+
+    def tearDown(self):
+        self.renders.conn.close()
+        ffb_bot.league_contexts.clear()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_content_addressed(self):
+        '''Is identical text stored once and looked up by week and name?'''
+        digests = self.renders.put(3, {'final': 'Final', 'standings': 'Same', 'trophies': 'Same'})
+        self.assertEqual(digests['standings'], digests['trophies'])
+        self.assertEqual(self.renders.conn.execute('SELECT COUNT(*) FROM artifacts').fetchone()[0], 2)
+        self.assertEqual(self.renders.get(3, 'trophies'), 'Same')
+        self.assertIsNone(self.renders.get(2, 'trophies'))
+
+        self.renders.invalidate(week=3)
+        self.assertIsNone(self.renders.get(3, 'final'))
+        self.assertEqual(self.renders.conn.execute('SELECT COUNT(*) FROM artifacts').fetchone()[0], 0)
+
+    @mock.patch.dict(os.environ, {"LEAGUE_ID": "123", "YEAR": "2021"}, clear=True)
+    def test_jobs_read_artifacts(self):
+        '''Do get_final and get_power_rankings post the rendered week without ESPN?'''
+        config = get_config()
+        config['cache_path'] = self.path
+        config['snapshot_dir'] = self.tmp_dir
+        league = make_league(8, 4)
+        with mock.patch.object(ffb_bot, 'League', return_value=league) as League:
+            self.assertEqual(get_text('render_week', config), '')
+            League.assert_called_once()
+            calls = league.espn_calls
+            ffb_bot.league_contexts.clear()
+
+            final = get_text('get_final', config)
+            power_rankings = get_text('get_power_rankings', config)
+            League.assert_called_once()
+        self.assertEqual(league.espn_calls, calls)
+        self.assertTrue(final.startswith('Final Score Update:'))
+        self.assertIn("This Week's Highlights", final)
+        self.assertEqual(power_rankings, self.renders.get(3, 'power_rankings'))
+
+    @mock.patch.dict(os.environ, {"LEAGUE_ID": "123", "YEAR": "2021"}, clear=True)
+    def test_stale_render(self):
+        '''Is an expired league refreshed before picking the render, not trusted for last week's?'''
+        config = get_config()
+        config['cache_path'] = self.path
+        league = make_league(8, 4)
+        with mock.patch.object(ffb_bot, 'League', return_value=league):
+            get_text('render_week', config)
+        ffb_bot.get_context(config).fetched_at = 0
+        with mock.patch.object(league, 'refresh', side_effect=lambda: vars(league).update(vars(make_league(8, 5)))):
+            final = get_text('get_final', config)
+            league.refresh.assert_called_once()
+        self.assertNotEqual(final, '\n\n'.join([self.renders.get(3, 'final'), self.renders.get(3, 'trophies')]))
+        self.assertTrue(final.startswith('Final Score Update:'))
+        self.assertEqual(final, '\n\n'.join([self.renders.get(4, 'final'), self.renders.get(4, 'trophies')]))
+
+    @mock.patch.dict(os.environ, {"LEAGUE_ID": "123", "YEAR": "2021"}, clear=True)
+    def test_command_does_not_render(self):
+        '''Does a chat command answer from the league without storing a render?'''
+        config = get_config()
+        config['cache_path'] = self.path
+        with mock.patch.object(ffb_bot, 'League', return_value=make_league(8, 4)):
+            text = ffb_bot.get_command_text('get_power_rankings', config)
+        ffb_bot.command_cache.values.clear()
+        self.assertTrue(text.startswith('Power Rankings:'))
+        self.assertIsNone(self.renders.get(3, 'power_rankings'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+
+
+from ffb_bot.ffb_bot import (ScoreWatcher, get_score_changes, )
+from ffb_bot.tests.fake_league import (FakeLeague, make_player, )
+
+
+class ScoreChangesTestCase(unittest.TestCase):
+    '''Test live score change detection'''
+
+    def setUp(self):
+        self.home = [make_player('Home Back', projected_points=20)]
+        self.away = [make_player('Away Back', projected_points=40)]
+        self.league = FakeLeague(['Alpha', 'Bravo', 'Charlie', 'Delta'],
+                                 {1: [(0, 10, 1, 5), (2, 0, 3, 0)]}, current_week=1,
+                                 lineups={(1, 0): self.home, (1, 1): self.away})
+        self.watcher = ScoreWatcher()
+
+    def poll(self, home_score, away_score):
+        self.league.week_scores[1][0] = (0, home_score, 1, away_score)
+        return get_score_changes(self.league, self.watcher)
+
+    def test_first_poll_is_baseline(self):
+        '''Does the first poll of a week post nothing?'''
+        self.assertEqual(self.poll(10, 5), '')
+        self.assertEqual(self.poll(10, 5), '')
+
+    def test_lead_change(self):
+        '''Is a lead change posted once?'''
+        self.poll(10, 5)
+        self.assertEqual(self.poll(10, 12), 'Live Update:\nLead change: ALPH 10.00 - 12.00 BRAV')
+        self.assertEqual(self.poll(10, 12), '')
+        self.assertEqual(self.poll(10, 14), '')
+
+    def test_close_and_final(self):
+        '''Are newly close games and final results posted?'''
+        self.poll(10, 5)
+        self.away[0].projected_points = 25
+        self.assertEqual(self.poll(10, 6), 'Live Update:\nClose game: ALPH 10.00 - 6.00 BRAV')
+        self.home[0].game_played = 100
+        self.away[0].game_played = 100
+        self.assertEqual(self.poll(30, 7), 'Live Update:\nFinal: ALPH 30.00 - 7.00 BRAV')
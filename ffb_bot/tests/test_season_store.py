@@ -0,0 +1,82 @@
+import unittest
+
+
+from ffb_bot.ffb_bot import (SeasonStore, get_power_rankings, get_season_stats, get_trophies, )
+from ffb_bot.tests.fake_league import make_league
+
+
+class SeasonStoreTestCase(unittest.TestCase):
+    '''Test SeasonStore against the per week implementations'''
+
+    def setUp(self):
+        self.league = make_league(12, 11, seed=7)
+        self.weeks = range(1, self.league.current_week)
+        self.store = SeasonStore.from_league(self.league, self.weeks)
+
+    def test_top_half_wins(self):
+        '''Do batched top half wins match the week by week tally?'''
+        totals = {t.team_id: 0 for t in self.league.teams}
+        for week in self.weeks:
+            scores = sorted([(home_score, home + 1) for home, home_score, away, away_score in
+                             self.league.week_scores[week]] +
+                            [(away_score, away + 1) for home, home_score, away, away_score in
+                             self.league.week_scores[week]], reverse=True)
+            for score, team_id in scores[:len(scores) // 2]:
+                totals[team_id] += 1
+        self.assertEqual(list(self.store.top_half_wins()), [totals[t.team_id] for t in self.league.teams])
+
+    def test_records(self):
+        '''Do records and points match the league's teams?'''
+        wins, losses, ties = self.store.records()
+        self.assertEqual(list(wins), [t.wins for t in self.league.teams])
+        self.assertEqual(list(losses), [t.losses for t in self.league.teams])
+        for t, points in zip(self.league.teams, self.store.points_for()):
+            self.assertAlmostEqual(points, sum(t.scores))
+        for t, points in zip(self.league.teams, self.store.points_against()):
+            self.assertAlmostEqual(points, sum(t.scores) - sum(t.mov))
+
+    def test_all_play(self):
+        '''Does every team play every other team every week?'''
+        wins, losses = self.store.all_play()
+        self.assertEqual(list(wins + losses), [11 * len(self.weeks)] * 12)
+        self.assertEqual(wins.sum(), losses.sum())
+
+    def test_power_rankings(self):
+        '''Do power rankings match espn_api's?'''
+        week = self.league.current_week - 1
+        expected = [(power, team.team_id) for power, team in self.league.power_rankings(week=week)]
+        self.assertEqual(self.store.power_rankings(week), expected)
+        self.assertEqual(SeasonStore.from_teams(self.league.teams, week).power_rankings(week), expected)
+        text = get_power_rankings(self.league, week=week).split('\n')
+        self.assertEqual(text[2].split(' (')[0], '1. %s' % self.league.power_rankings(week=week)[0][1].team_name)
+        self.assertEqual(self.league.power_ranking_calls, [week, week])
+
+    def test_trophies(self):
+        '''Are a week's high, low, closest and blowout found?'''
+        week = 3
+        (high_id, high), (low_id, low), closest, blowout = self.store.trophies(week)
+        scores = [(score, team) for home, home_score, away, away_score in self.league.week_scores[week]
+                  for team, score in ((home, home_score), (away, away_score))]
+        self.assertEqual((high, high_id), (max(scores)[0], max(scores)[1] + 1))
+        self.assertEqual((low, low_id), (min(scores)[0], min(scores)[1] + 1))
+        margins = [abs(home_score - away_score) for home, home_score, away, away_score in self.league.week_scores[week]]
+        self.assertAlmostEqual(closest[2], min(margins))
+        self.assertAlmostEqual(blowout[2], max(margins))
+
+    def test_trophies_text(self):
+        '''Are the trophies handed to the week's teams?'''
+        calls = len(self.league.box_score_calls)
+        text = get_trophies(self.league, week=3).split('\n\n')
+        (high_id, high), (low_id, low), closest, blowout = self.store.trophies(3)
+        self.assertTrue(text[1].startswith('✨✨%s was FAABulous this week! They were the highest scoring team with '
+                                           '%.2f points' % (self.league.teams[high_id - 1].team_name, high)))
+        self.assertTrue(text[2].startswith('%s was the lowest' % self.league.teams[low_id - 1].team_name))
+        self.assertEqual(text[3], '%s barely beat %s by a margin of %.2f.' % (
+            self.league.teams[closest[0] - 1].team_name, self.league.teams[closest[1] - 1].team_name, closest[2]))
+        self.assertEqual(self.league.box_score_calls[calls:], [3])
+
+    def test_season_stats(self):
+        '''Is every team listed in the season stats?'''
+        text = get_season_stats(self.league).split('\n')
+        self.assertEqual(text[0], 'Season Stats:')
+        self.assertEqual(len(text), 13)
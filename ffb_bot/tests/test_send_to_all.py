@@ -0,0 +1,88 @@
+import time
+import unittest
+
+
+import requests_mock
+
+
+from ffb_bot.ffb_bot import (DiscordBot, GroupMeBot, GroupMeException, MessageBatcher, SlackBot, send_to_all,
+                             split_message, )
+
+
+class SlowBot(object):
+    def __init__(self, delay):
+        self.delay = delay
+
+    def send_message(self, text):
+        time.sleep(self.delay)
+        return text
+
+
+class SendToAllTestCase(unittest.TestCase):
+    '''Test concurrent delivery to every sink'''
+
+    def setUp(self):
+        self.slack_url = "https://hooks.slack.com/services/A1B2C3/ABC1ABC2/abcABC1abcABC2"
+        self.discord_url = "https://discordapp.com/api/webhooks/123/abc"
+        self.bots = [GroupMeBot("123456"), SlackBot(self.slack_url), DiscordBot(self.discord_url)]
+
+    @requests_mock.Mocker()
+    def test_failure_does_not_stop_others(self, m):
+        '''Do the other sinks still get the message when one fails?'''
+        m.post("https://api.groupme.com/v3/bots/post", status_code=404)
+        m.post(self.slack_url, status_code=200)
+        m.post(self.discord_url, status_code=204)
+        results = send_to_all(self.bots, "This is a test.")
+        self.assertEqual([bot for bot, result in results], self.bots)
+        self.assertIsInstance(results[0][1], GroupMeException)
+        self.assertEqual(results[1][1].status_code, 200)
+        self.assertEqual(results[2][1].status_code, 204)
+
+    def test_latency_bounded_by_slowest(self):
+        '''Are sinks sent to concurrently?'''
+        start = time.time()
+        results = send_to_all([SlowBot(0.2), SlowBot(0.2), SlowBot(0.2)], "This is a test.")
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual([result for bot, result in results], ["This is a test."] * 3)
+
+    @requests_mock.Mocker()
+    def test_timeout_passed(self, m):
+        '''Is the per sink timeout used?'''
+        m.post(self.slack_url, status_code=200)
+        SlackBot(self.slack_url, timeout=3).send_message("This is a test.")
+        self.assertEqual(m.last_request.timeout, 3)
+
+    def test_split_message(self):
+        '''Is long text split between lines to fit the limit?'''
+        text = '\n'.join('%02d. Team Name (10 - 3)' % i for i in range(1, 17))
+        chunks = split_message(text, 100)
+        self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+        self.assertEqual('\n'.join(chunks), text)
+        self.assertEqual(split_message('short', 100), ['short'])
+        self.assertEqual(split_message('a' * 25, 10), ['a' * 10, 'a' * 10, 'a' * 5])
+
+    @requests_mock.Mocker()
+    def test_platform_limits(self, m):
+        '''Does every post stay under its platform's length limit?'''
+        m.post("https://api.groupme.com/v3/bots/post", status_code=202)
+        m.post(self.discord_url, status_code=204)
+        text = '\n'.join('Line %s ' % i + 'x' * 40 for i in range(100))
+        GroupMeBot("123456").send_message(text)
+        groupme = [r.json()["text"] for r in m.request_history]
+        self.assertEqual(len(groupme), 5)
+        self.assertTrue(all(len(chunk) <= 1000 for chunk in groupme))
+        DiscordBot(self.discord_url).send_message(text)
+        discord = [r.json()["content"] for r in m.request_history[len(groupme):]]
+        self.assertEqual(len(discord), 3)
+        self.assertTrue(all(len(chunk) <= 2000 and chunk.startswith('```') for chunk in discord))
+
+    def test_message_batcher(self):
+        '''Are messages submitted within the window sent as one post?'''
+        sent = []
+        batcher = MessageBatcher(0.1, send=lambda bots, text: sent.append((bots, text)))
+        batcher.submit('123', self.bots, "Final scores")
+        batcher.submit('123', self.bots, "Trophies")
+        batcher.submit('456', self.bots[:1], "Other league")
+        time.sleep(0.3)
+        self.assertEqual(sorted(sent, key=lambda tup: tup[1]),
+                         [(self.bots, "Final scores\n\nTrophies"), (self.bots[:1], "Other league")])
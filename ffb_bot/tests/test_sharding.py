@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+
+import requests_mock
+from apscheduler.executors.pool import ThreadPoolExecutor as SchedulerThreadPool
+from apscheduler.schedulers.background import BackgroundScheduler
+
+
+from ffb_bot import ffb_bot
+from ffb_bot.ffb_bot import (JOBS, LeaseStore, ShardWorker, add_lease_renewal, get_config, get_league_key,
+                             get_outbox, get_shard_owner, scheduled_job, )
+
+
+class ShardingTestCase(unittest.TestCase):
+    '''Test league sharding over workers with a sqlite lease store'''
+
+    @mock.patch.dict(os.environ, {}, clear=True)
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'leases.sqlite3')
+        self.configs = [dict(get_config(), league_id=str(n), name='league%s' % n) for n in range(12)]
+        self.now = 1000.0
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def make_worker(self, worker_id):
+        return ShardWorker(BackgroundScheduler(), LeaseStore(self.path, ttl=60), self.configs, worker_id=worker_id)
+
+    def rebalance(self, *workers):
+        # two rounds, one to hand leagues off and one to pick them up
+        for i in range(2):
+            held = [worker.rebalance(now=self.now) for worker in workers]
+        return held
+
+    def test_renewal_not_starved(self):
+        '''Are leases renewed while slow league jobs hold every scheduler thread?'''
+        sched = BackgroundScheduler(executors={'default': SchedulerThreadPool(1)})
+        worker = mock.Mock()
+        renewed = threading.Event()
+        worker.rebalance.side_effect = lambda: renewed.set()
+        release = threading.Event()
+        self.addCleanup(sched.shutdown, wait=False)
+        self.addCleanup(release.set)
+        add_lease_renewal(sched, worker, lease_ttl=3)
+        sched.add_job(release.wait, id='slow_league_job')
+        sched.start()
+        self.assertTrue(renewed.wait(5))
+        self.assertFalse(release.is_set())
+
+    def test_each_league_on_one_worker(self):
+        '''Is every league scheduled on exactly one worker?'''
+        a, b, c = self.make_worker('a'), self.make_worker('b'), self.make_worker('c')
+        held = self.rebalance(a, b, c)
+        self.assertEqual(sorted(sum(held, [])), sorted(config["name"] for config in self.configs))
+        self.assertTrue(all(held))
+        job_ids = [job.id for worker in (a, b, c) for job in worker.sched.get_jobs()]
+        self.assertEqual(len(job_ids), len(set(job_ids)))
+        self.assertEqual(len(job_ids), len(self.configs) * len(JOBS))
+
+    def test_rebalance_when_worker_dies(self):
+        '''Do a dead worker's leagues move only once its leases expire?'''
+        a, b = self.make_worker('a'), self.make_worker('b')
+        held_a, held_b = self.rebalance(a, b)
+        self.now += 30
+        self.assertEqual(a.rebalance(now=self.now), held_a)
+        self.now += 40
+        self.assertEqual(a.rebalance(now=self.now), sorted(held_a + held_b))
+        self.assertEqual(a.lease_store.owner(held_b[0], now=self.now), 'a')
+
+    def test_new_worker_takes_share(self):
+        '''Does a worker joining only take leagues over from the others?'''
+        a, b = self.make_worker('a'), self.make_worker('b')
+        before = dict(zip('ab', self.rebalance(a, b)))
+        c = self.make_worker('c')
+        after = dict(zip('abc', self.rebalance(a, b, c)))
+        self.assertTrue(after['c'])
+        self.assertTrue(set(after['a']) <= set(before['a']))
+        self.assertTrue(set(after['b']) <= set(before['b']))
+        self.assertEqual(after['c'], [name for name in sorted(before['a'] + before['b'])
+                                      if get_shard_owner(name, ['a', 'b', 'c']) == 'c'])
+
+    @requests_mock.Mocker()
+    def test_outbox_resumed_on_takeover(self, m):
+        '''Does a worker taking a league over send what the last owner never attempted?'''
+        slack_url = "https://hooks.slack.com/services/A1B2C3/ABC1ABC2/abcABC1abcABC2"
+        m.post(slack_url, status_code=200)
+        path = os.path.join(self.tmp_dir, 'outbox.sqlite3')
+        self.addCleanup(lambda: ffb_bot.outboxes.pop(path).conn.close())
+        self.configs = [dict(self.configs[0], outbox_path=path, slack_webhook_url=slack_url)]
+        outbox = get_outbox(path)
+        outbox.add(get_league_key(self.configs[0]), 'final@1', ['SlackBot'], "Final scores")
+
+        a = self.make_worker('a')
+        self.assertEqual(a.rebalance(now=self.now), ['league0'])
+        job = a.sched.get_job('league0-resume_outbox')
+        job.func(*job.args, **job.kwargs)
+        self.assertIn("Final scores", m.last_request.json()["text"])
+        self.assertEqual(outbox.pending(60), [])
+
+    @mock.patch.object(ffb_bot, 'bot_main')
+    def test_job_skipped_without_lease(self, bot_main):
+        '''Does a job that fires after its league moved away do nothing?'''
+        a = self.make_worker('a')
+        a.lease_store.acquire('league1', 'b')
+        self.addCleanup(setattr, ffb_bot, 'shard_worker', None)
+        ffb_bot.shard_worker = a
+        scheduled_job('league1-final', 'league1', 'get_final')
+        bot_main.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
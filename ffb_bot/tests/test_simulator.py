@@ -0,0 +1,111 @@
+import math
+import time
+import unittest
+from unittest import mock
+
+
+import numpy as np
+
+
+from ffb_bot import ffb_bot
+from ffb_bot.ffb_bot import (get_close_scores, get_playoff_odds, get_win_probabilities, is_close,
+                             simulate_matchups, simulate_playoff_odds, )
+from ffb_bot.tests.fake_league import (FakeLeague, make_league, make_player, )
+
+
+class SimulatorTestCase(unittest.TestCase):
+    '''Test the Monte Carlo win probability and playoff odds engine'''
+
+    def test_simulate_matchups(self):
+        '''Do simulated probabilities match the normal distribution they sample?'''
+        means = np.array([[100, 100], [110, 100], [90, 80]])
+        sds = np.array([[15, 15], [15, 15], [0, 0]])
+        probabilities = simulate_matchups(means, sds, simulations=20000)
+        expected = 0.5 * (1 + math.erf(10 / math.sqrt(2 * 15 ** 2) / math.sqrt(2)))
+        self.assertAlmostEqual(probabilities[0], 0.5, delta=0.02)
+        self.assertAlmostEqual(probabilities[1], expected, delta=0.02)
+        self.assertEqual(probabilities[2], 1.0)
+        self.assertEqual(list(simulate_matchups(means, sds)), list(simulate_matchups(means, sds)))
+
+    def test_close_by_probability(self):
+        '''Are only undecided games with no clear favourite close?'''
+        self.assertTrue(is_close(0.6, False))
+        self.assertTrue(is_close(0.3, False))
+        self.assertFalse(is_close(0.9, False))
+        self.assertFalse(is_close(0.5, True))
+
+        lineups = {(1, 0): [make_player('Home Back', projected_points=20)],
+                   (1, 1): [make_player('Away Back', projected_points=22)],
+                   (1, 2): [make_player('Other Back', projected_points=60)],
+                   (1, 3): [make_player('Last Back', projected_points=5)]}
+        league = FakeLeague(['Alpha', 'Bravo', 'Charlie', 'Delta'], {1: [(0, 0, 1, 0), (2, 0, 3, 0)]},
+                            current_week=1, lineups=lineups)
+        probabilities = get_win_probabilities(league.box_scores())
+        self.assertGreater(probabilities[(3, 4)], 0.95)
+        text = get_close_scores(league)
+        self.assertIn('Alpha vs Bravo', text)
+        self.assertIn('Win probability: ALPH', text)
+        self.assertNotIn('Charlie', text)
+
+    def test_close_scores_summarize_once(self):
+        '''Is every lineup summarized once for both the probabilities and the text?'''
+        league = make_league(8, 3, seed=2)
+        with mock.patch.object(ffb_bot, 'LineupSummary', wraps=ffb_bot.LineupSummary) as summary:
+            get_close_scores(league)
+        self.assertEqual(summary.call_count, 8)
+
+    def test_playoff_odds(self):
+        '''Do the playoff odds add up to the playoff spots, with or without a process pool?'''
+        league = make_league(8, 6, seed=4)
+        league.settings.reg_season_count = 10
+        for week in range(7, 11):
+            league.week_scores[week] = league.week_scores[week - 4]
+        for t in league.teams:
+            t.schedule += t.schedule[2:6]
+        text = get_playoff_odds(league, simulations=2000)
+        lines = text.split('\n')
+        self.assertEqual(lines[0], 'Playoff Odds:')
+        odds = [float(line.rsplit(' ', 1)[1].rstrip('%')) for line in lines[1:]]
+        self.assertEqual(len(odds), 8)
+        self.assertAlmostEqual(sum(odds), 400, delta=1)
+        self.assertEqual(get_playoff_odds(league, simulations=2000), text)
+        self.assertEqual(get_playoff_odds(league, simulations=2000, workers=2).split('\n')[0], 'Playoff Odds:')
+
+        league.current_week = 11
+        self.assertEqual(get_playoff_odds(league), '')
+
+    def test_bye_weeks(self):
+        '''Is a team on a bye left out of that week instead of playing itself?'''
+        league = FakeLeague(['Alpha', 'Bravo', 'Charlie'], {1: [(0, 0, 2, 0), (1, 0, None, 0)]}, current_week=1)
+        league.settings.reg_season_count = 2
+        league.settings.playoff_team_count = 1
+        alpha, bravo, charlie = league.teams
+        alpha.schedule = [charlie, bravo]
+        bravo.schedule = [bravo, alpha]
+        charlie.schedule = [alpha, charlie]
+        lines = get_playoff_odds(league).split('\n')[1:]
+        odds = {line.split(':')[0]: float(line.rsplit(' ', 1)[1].rstrip('%')) for line in lines}
+        self.assertAlmostEqual(sum(odds.values()), 100, delta=0.5)
+        self.assertLess(odds['Charlie'], 50)
+
+    def test_clinched_and_eliminated(self):
+        '''Does a team that can't be caught always make it?'''
+        schedule = [(np.array([[0, 1], [2, 3]]), np.full(4, 100.0), np.full(4, 20.0))]
+        odds = simulate_playoff_odds(schedule, [9, 5, 5, 0], [0, 0, 0, 0], 2, simulations=1000, workers=2)
+        self.assertEqual(odds[0], 1.0)
+        self.assertEqual(odds[3], 0.0)
+        self.assertAlmostEqual(sum(odds), 2.0)
+
+    def test_time_budget(self):
+        '''Do 10k simulations of a 12 team season finish well inside a job's budget?'''
+        league = make_league(12, 2, seed=5)
+        league.settings.reg_season_count = 14
+        for t in league.teams:
+            t.schedule = t.schedule * 7
+        start = time.time()
+        get_playoff_odds(league, simulations=10000)
+        self.assertLess(time.time() - start, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
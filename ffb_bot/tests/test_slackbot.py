@@ -4,7 +4,7 @@ import unittest
 import requests_mock
 
 
-from ffb-bot.ffb-bot import (SlackBot, SlackException, )
+from ffb_bot.ffb_bot import (SlackBot, SlackException, )
 
 
 class SlackTestCase(unittest.TestCase):
@@ -0,0 +1,64 @@
+import pickle
+import unittest
+from unittest import mock
+
+
+from ffb_bot import ffb_bot
+from ffb_bot.ffb_bot import (LeagueSnapshot, get_close_scores, get_power_rankings, get_scoreboard_short,
+                             get_standings, get_trophies, )
+from ffb_bot.tests.fake_league import make_league
+
+
+class LeagueSnapshotTestCase(unittest.TestCase):
+    '''Test the slotted league snapshot the builders read'''
+
+    def setUp(self):
+        self.league = make_league(8, 5, seed=7)
+        self.snapshot = LeagueSnapshot.from_league(make_league(8, 5, seed=7))
+
+    def test_same_text(self):
+        '''Do the builders say the same thing from a snapshot as from the League?'''
+        for builder in (get_scoreboard_short, get_close_scores, get_power_rankings):
+            self.assertEqual(builder(self.snapshot), builder(self.league))
+        self.assertEqual(get_standings(self.snapshot, False), get_standings(self.league, False))
+        self.assertEqual(get_trophies(self.snapshot, week=3).split('\n\n')[3],
+                         get_trophies(self.league, week=3).split('\n\n')[3])
+
+    def test_slotted(self):
+        '''Are teams, box scores and players held without instance dicts?'''
+        box_score = self.snapshot.box_scores(week=2)[0]
+        for obj in (self.snapshot, self.snapshot.teams[0], box_score, box_score.home_lineup[0]):
+            self.assertFalse(hasattr(obj, '__dict__'))
+        self.assertIs(box_score.home_team, self.snapshot.teams[box_score.home_team.team_id - 1])
+        self.assertEqual(box_score.home_lineup[0].playerId, self.league.box_scores(week=2)[0].home_lineup[0].playerId)
+
+    def test_pruned(self):
+        '''Is the League handle kept without its rosters, draft, members or player universe?'''
+        league = make_league(8, 5, seed=7)
+        league.members = [{'id': '{ABC}'}] * 8
+        league.player_map = {n: 'Player %s' % n for n in range(5000)}
+        snapshot = LeagueSnapshot.from_league(league)
+        self.assertIs(snapshot.espn_league.teams, snapshot.teams)
+        self.assertEqual((league.draft, league.members, league.player_map), ([], [], {}))
+
+    def test_bytes_round_trip(self):
+        '''Does a snapshot loaded from bytes give the same text without fetching?'''
+        data = self.snapshot.to_bytes()
+        self.assertLess(len(data), len(pickle.dumps(self.league.teams)))
+        with mock.patch.object(ffb_bot, 'League') as League:
+            restored = LeagueSnapshot.from_bytes(data, espn_s2='abc', swid='{def}')
+            self.assertEqual(get_power_rankings(restored), get_power_rankings(self.league))
+            self.assertEqual(get_standings(restored, False), get_standings(self.league, False))
+            League.assert_not_called()
+
+            League.return_value = mock.Mock(spec=['box_scores'])
+            League.return_value.box_scores.return_value = self.league.box_scores(week=2)
+            self.assertEqual(get_scoreboard_short(restored, week=2), get_scoreboard_short(self.league, week=2))
+            League.assert_called_once_with(league_id=None, year=None, espn_s2='abc', swid='{def}', fetch_league=False)
+            self.assertIs(League.return_value.settings, restored.settings)
+        with self.assertRaises(ValueError):
+            LeagueSnapshot.from_bytes(pickle.dumps(self.league.teams))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,7 +9,7 @@ setup(
 
     version='0.3.0',
 
-    install_requires=['requests>=2.0.0,<3.0.0', 'espn_api>=0.17.0', 'apscheduler>3.0.0'],
+    install_requires=['requests>=2.0.0,<3.0.0', 'espn_api>=0.17.0', 'apscheduler>3.0.0', 'numpy>=1.17.0'],
 
     test_suite='nose.collector',
 